@@ -0,0 +1,18 @@
+# Generated migration to add metrics field to Job
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clips', '0018_alter_clip_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='metrics',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
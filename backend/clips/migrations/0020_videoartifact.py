@@ -0,0 +1,33 @@
+# Generated migration to add VideoArtifact model
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clips', '0019_job_metrics'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VideoArtifact',
+            fields=[
+                ('artifact_id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=100)),
+                ('content_hash', models.CharField(db_index=True, max_length=64)),
+                ('storage_path', models.CharField(max_length=500)),
+                ('size', models.BigIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('video', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='artifacts', to='clips.video')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['video', 'name'], name='clips_video_video_i_6378f5_idx')],
+                'unique_together': {('video', 'name')},
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated migration to add StageCheckpoint model
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clips', '0020_videoartifact'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StageCheckpoint',
+            fields=[
+                ('checkpoint_id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('stage', models.CharField(max_length=50)),
+                ('fingerprint', models.CharField(max_length=64)),
+                ('components', models.JSONField(blank=True, default=dict)),
+                ('completed_at', models.DateTimeField(auto_now=True)),
+                ('video', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stage_checkpoints', to='clips.video')),
+            ],
+            options={
+                'ordering': ['-completed_at'],
+                'indexes': [models.Index(fields=['video', 'stage'], name='clips_stage_video_i_298b65_idx')],
+                'unique_together': {('video', 'stage')},
+            },
+        ),
+    ]
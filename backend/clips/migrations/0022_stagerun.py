@@ -0,0 +1,46 @@
+# Generated migration to add StageRun model
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clips', '0021_stagecheckpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StageRun',
+            fields=[
+                ('run_id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('video_id', models.UUIDField(blank=True, db_index=True, null=True)),
+                ('job_id', models.UUIDField(blank=True, null=True)),
+                ('organization_id', models.UUIDField(blank=True, null=True)),
+                ('stage', models.CharField(max_length=50)),
+                ('task_name', models.CharField(max_length=255)),
+                ('task_id', models.CharField(max_length=255)),
+                ('queue', models.CharField(blank=True, max_length=100, null=True)),
+                ('worker', models.CharField(blank=True, max_length=255, null=True)),
+                ('attempt', models.IntegerField(default=0)),
+                ('status', models.CharField(choices=[('success', 'Success'), ('failed', 'Failed'), ('retry', 'Retry'), ('skipped', 'Skipped')], default='success', max_length=20)),
+                ('queue_wait_seconds', models.FloatField(blank=True, null=True)),
+                ('wall_seconds', models.FloatField(default=0)),
+                ('cpu_seconds', models.FloatField(default=0)),
+                ('subprocess_cpu_seconds', models.FloatField(default=0)),
+                ('peak_rss_bytes', models.BigIntegerField(blank=True, null=True)),
+                ('read_bytes', models.BigIntegerField(default=0)),
+                ('write_bytes', models.BigIntegerField(default=0)),
+                ('started_at', models.DateTimeField()),
+                ('finished_at', models.DateTimeField()),
+            ],
+            options={
+                'ordering': ['-started_at'],
+                'indexes': [
+                    models.Index(fields=['stage', '-started_at'], name='clips_stage_stage_8a1a1f_idx'),
+                    models.Index(fields=['job_id'], name='clips_stage_job_id_e07b16_idx'),
+                ],
+            },
+        ),
+    ]
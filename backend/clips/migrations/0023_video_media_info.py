@@ -0,0 +1,18 @@
+# Generated migration to add media_info field to Video
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clips', '0022_stagerun'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='media_info',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated migration to add SourceCache model
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clips', '0023_video_media_info'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SourceCache',
+            fields=[
+                ('cache_id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('cache_key', models.CharField(max_length=255, unique=True)),
+                ('extractor', models.CharField(max_length=100)),
+                ('media_id', models.CharField(max_length=255)),
+                ('info', models.JSONField(blank=True, default=dict)),
+                ('storage_path', models.CharField(max_length=500)),
+                ('size', models.BigIntegerField(default=0)),
+                ('access_count', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_accessed', models.DateTimeField(auto_now=True)),
+                ('expires_at', models.DateTimeField()),
+            ],
+            options={
+                'indexes': [
+                    models.Index(fields=['extractor', 'media_id'], name='clips_sourc_extract_634251_idx'),
+                    models.Index(fields=['expires_at'], name='clips_sourc_expires_9d69ae_idx'),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated migration to add loudness field to Video
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clips', '0024_sourcecache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='loudness',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated migration to add encoder_profile field to Clip
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clips', '0025_video_loudness'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='clip',
+            name='encoder_profile',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
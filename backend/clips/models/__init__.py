@@ -17,6 +17,10 @@ from .caption import Caption
 from .billing_event import BillingEvent
 from .embedding_pattern import EmbeddingPattern
 from .embedding_cache import EmbeddingCache
+from .video_artifact import VideoArtifact
+from .stage_checkpoint import StageCheckpoint
+from .stage_run import StageRun
+from .source_cache import SourceCache
 
 __all__ = (
     "Video",
@@ -38,4 +42,8 @@ __all__ = (
     "BillingEvent",
     "EmbeddingPattern",
     "EmbeddingCache",
+    "VideoArtifact",
+    "StageCheckpoint",
+    "StageRun",
+    "SourceCache",
 )
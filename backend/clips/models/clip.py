@@ -38,6 +38,7 @@ class Clip(models.Model):
 
     # Versionamento
     version = models.IntegerField(default=1)
+    encoder_profile = models.JSONField(default=dict, blank=True)  # Perfil do libx264 usado no render (preset, crf, ...)
 
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
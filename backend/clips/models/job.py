@@ -38,6 +38,9 @@ class Job(models.Model):
     # Configuração do job
     configuration = models.JSONField(default=dict)  # language, target_ratios, max_clip_duration, num_clips, etc
 
+    # Métricas de execução
+    metrics = models.JSONField(default=dict, blank=True)  # timings por etapa/clip (render, upload, etc)
+
     # Erros
     error_code = models.CharField(max_length=50, null=True, blank=True)
     error_message = models.TextField(null=True, blank=True)
@@ -0,0 +1,36 @@
+"""
+Model para o cache de downloads de URLs externas (compartilhado entre jobs/orgs).
+"""
+
+import uuid
+from django.db import models
+
+
+class SourceCache(models.Model):
+    # Identificadores
+    cache_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    cache_key = models.CharField(max_length=255, unique=True)  # extractor:media_id:formato
+
+    # Origem
+    extractor = models.CharField(max_length=100)  # ex: Youtube, TikTok
+    media_id = models.CharField(max_length=255)
+    info = models.JSONField(default=dict, blank=True)  # Subconjunto do info do yt-dlp (title, ext, ...)
+
+    # Armazenamento
+    storage_path = models.CharField(max_length=500)  # Caminho no R2
+    size = models.BigIntegerField(default=0)  # Tamanho em bytes
+
+    # Uso
+    access_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_accessed = models.DateTimeField(auto_now=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["extractor", "media_id"]),
+            models.Index(fields=["expires_at"]),
+        ]
+
+    def __str__(self) -> str:
+        return f"SourceCache {self.cache_key}"
@@ -0,0 +1,31 @@
+"""
+Model para checkpoints de etapas do pipeline (fingerprint da última execução bem-sucedida).
+"""
+
+import uuid
+from django.db import models
+from .video import Video
+
+
+class StageCheckpoint(models.Model):
+    # Identificadores
+    checkpoint_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    video = models.ForeignKey(Video, on_delete=models.CASCADE, related_name="stage_checkpoints")
+
+    # Etapa
+    stage = models.CharField(max_length=50)  # download, normalize, transcribe, ...
+    fingerprint = models.CharField(max_length=64)  # sha256(entradas + config + versão do código)
+    components = models.JSONField(default=dict, blank=True)  # Componentes do fingerprint (debug)
+
+    # Timestamps
+    completed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["-completed_at"]
+        unique_together = ("video", "stage")
+        indexes = [
+            models.Index(fields=["video", "stage"]),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.stage} ({self.fingerprint[:12]}) for {self.video_id}"
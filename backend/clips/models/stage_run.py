@@ -0,0 +1,55 @@
+"""
+Model para métricas de execução de cada task do pipeline (uma linha por tentativa).
+"""
+
+import uuid
+from django.db import models
+
+
+class StageRun(models.Model):
+    STATUS_CHOICES = [
+        ("success", "Success"),
+        ("failed", "Failed"),
+        ("retry", "Retry"),
+        ("skipped", "Skipped"),
+    ]
+
+    # Identificadores
+    run_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    video_id = models.UUIDField(null=True, blank=True, db_index=True)  # FK para Video
+    job_id = models.UUIDField(null=True, blank=True)  # FK para Job
+    organization_id = models.UUIDField(null=True, blank=True)  # FK para Organization
+
+    # Task
+    stage = models.CharField(max_length=50)  # download, transcribe, render_clip, ...
+    task_name = models.CharField(max_length=255)
+    task_id = models.CharField(max_length=255)
+    queue = models.CharField(max_length=100, null=True, blank=True)  # routing key (ex: clip.business)
+    worker = models.CharField(max_length=255, null=True, blank=True)
+    attempt = models.IntegerField(default=0)  # request.retries
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="success")
+
+    # Tempos (segundos)
+    queue_wait_seconds = models.FloatField(null=True, blank=True)  # publicação/ETA -> início
+    wall_seconds = models.FloatField(default=0)
+    cpu_seconds = models.FloatField(default=0)  # user+sys do processo do worker
+    subprocess_cpu_seconds = models.FloatField(default=0)  # user+sys de filhos (ffmpeg, ffprobe, ...)
+
+    # Recursos
+    peak_rss_bytes = models.BigIntegerField(null=True, blank=True)
+    read_bytes = models.BigIntegerField(default=0)  # I/O de disco (inclui filhos)
+    write_bytes = models.BigIntegerField(default=0)
+
+    # Timestamps
+    started_at = models.DateTimeField()
+    finished_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ["-started_at"]
+        indexes = [
+            models.Index(fields=["stage", "-started_at"]),
+            models.Index(fields=["job_id"]),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.stage} {self.status} ({self.wall_seconds:.1f}s) for {self.video_id}"
@@ -48,6 +48,8 @@ class Video(models.Model):
     duration = models.FloatField(null=True, blank=True)  # Duração em segundos
     resolution = models.CharField(max_length=20, null=True, blank=True)  # Ex: 1920x1080
     thumbnail_storage_path = models.CharField(max_length=500, null=True, blank=True)  # Caminho no R2
+    media_info = models.JSONField(default=dict, blank=True)  # ffprobe por arquivo (original, normalized, ...)
+    loudness = models.JSONField(default=dict, blank=True)  # Medição EBU R128 (loudnorm) por arquivo
 
     # Job tracking
     task_id = models.CharField(max_length=255, blank=True, null=True)
@@ -0,0 +1,33 @@
+"""
+Model para artefatos de etapas do pipeline (endereçados por conteúdo no R2).
+"""
+
+import uuid
+from django.db import models
+from .video import Video
+
+
+class VideoArtifact(models.Model):
+    # Identificadores
+    artifact_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    video = models.ForeignKey(Video, on_delete=models.CASCADE, related_name="artifacts")
+
+    # Conteúdo
+    name = models.CharField(max_length=100)  # original, normalized, transcript, caption_0, ...
+    content_hash = models.CharField(max_length=64, db_index=True)  # sha256
+    storage_path = models.CharField(max_length=500)  # Caminho no R2
+    size = models.BigIntegerField(default=0)  # Tamanho em bytes
+
+    # Timestamps
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        unique_together = ("video", "name")
+        indexes = [
+            models.Index(fields=["video", "name"]),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.name} ({self.content_hash[:12]}) for {self.video_id}"
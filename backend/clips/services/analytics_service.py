@@ -77,9 +77,14 @@ class AnalyticsService:
 
             average_time = total_time / jobs.count()
 
+            # Distribuição por etapa (StageRun gravado pelos sinais do Celery)
+            from .stage_metrics_service import StageMetricsService
+            stages = StageMetricsService.get_stage_percentiles(days=30, organization_id=organization_id)
+
             return {
                 "average_processing_time_seconds": int(average_time),
                 "jobs_analyzed": jobs.count(),
+                "stages": stages,
             }
         except Exception as e:
             raise Exception(f"Erro ao obter performance: {e}")
@@ -0,0 +1,241 @@
+"""
+Camada de artefatos do pipeline na frente do R2StorageService.
+
+Cada etapa publica suas saídas (original, normalized, transcript, ASS, ...)
+endereçadas por sha256. Em outro worker/nó, `ensure_local` materializa o
+arquivo no caminho esperado em MEDIA_ROOT, buscando-o do R2 sob demanda para
+um cache local em disco com limite de tamanho (LRU).
+"""
+
+import hashlib
+import logging
+import os
+import shutil
+import uuid
+from django.conf import settings
+
+from ..models import VideoArtifact
+from .storage_service import R2StorageService
+
+logger = logging.getLogger(__name__)
+
+HASH_CHUNK_SIZE = 8 * 1024 * 1024
+
+
+class ArtifactService:
+    """Publica e recupera artefatos de etapas por hash de conteúdo."""
+
+    @staticmethod
+    def enabled() -> bool:
+        return bool(getattr(settings, "ARTIFACTS_ENABLED", True))
+
+    @staticmethod
+    def hash_file(file_path: str) -> str:
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def publish(video, name: str, file_path: str, storage: R2StorageService = None) -> VideoArtifact | None:
+        """
+        Publica `file_path` como artefato `name` do vídeo.
+
+        Args:
+            video: Instância de Video
+            name: Nome lógico do artefato (ex: normalized)
+            file_path: Caminho local do arquivo
+            storage: Instância opcional de R2StorageService
+
+        Returns:
+            VideoArtifact ou None se a camada estiver desabilitada
+        """
+        if not ArtifactService.enabled():
+            return None
+
+        content_hash = ArtifactService.hash_file(file_path)
+        existing = VideoArtifact.objects.filter(video=video, name=name).first()
+        if existing and existing.content_hash == content_hash:
+            return existing
+
+        storage = storage or R2StorageService()
+        storage_path = storage.upload_artifact(file_path, content_hash)
+
+        artifact, _ = VideoArtifact.objects.update_or_create(
+            video=video,
+            name=name,
+            defaults={
+                "content_hash": content_hash,
+                "storage_path": storage_path,
+                "size": os.path.getsize(file_path),
+            },
+        )
+        logger.info(f"[artifacts] Publicado {name} ({content_hash[:12]}) para video_id={video.video_id}")
+        return artifact
+
+    @staticmethod
+    def register(video, name: str, storage_path: str, content_hash: str, size: int) -> VideoArtifact | None:
+        """
+        Registra como artefato um objeto que já está no R2 (ex: upload do usuário), sem reenviá-lo.
+
+        Args:
+            video: Instância de Video
+            name: Nome lógico do artefato
+            storage_path: Chave do objeto existente no R2
+            content_hash: sha256 do conteúdo (calculado por quem leu os bytes)
+            size: Tamanho em bytes
+
+        Returns:
+            VideoArtifact ou None se a camada estiver desabilitada
+        """
+        if not ArtifactService.enabled():
+            return None
+
+        artifact, _ = VideoArtifact.objects.update_or_create(
+            video=video,
+            name=name,
+            defaults={
+                "content_hash": content_hash,
+                "storage_path": storage_path,
+                "size": int(size or 0),
+            },
+        )
+        logger.info(f"[artifacts] Registrado {name} ({content_hash[:12]}) em {storage_path} para video_id={video.video_id}")
+        return artifact
+
+    @staticmethod
+    def delete(video, name_prefix: str, storage: R2StorageService = None) -> int:
+        """
+        Remove os artefatos temporários do vídeo cujo nome começa com `name_prefix`.
+
+        O objeto no R2 (endereçado por hash) só é apagado se nenhum outro artefato
+        apontar para ele. Falhas são registradas e não propagam.
+
+        Args:
+            video: Instância de Video
+            name_prefix: Prefixo do nome lógico (ex: audio_shard_)
+            storage: Instância opcional de R2StorageService
+
+        Returns:
+            Número de artefatos removidos
+        """
+        artifacts = list(VideoArtifact.objects.filter(video=video, name__startswith=name_prefix))
+        removed = 0
+        for artifact in artifacts:
+            try:
+                artifact.delete()
+                removed += 1
+                if not VideoArtifact.objects.filter(storage_path=artifact.storage_path).exists():
+                    storage = storage or R2StorageService()
+                    storage.delete_file(artifact.storage_path)
+            except Exception as e:
+                logger.warning(f"[artifacts] Falha ao remover {artifact.name} de video_id={video.video_id}: {e}")
+
+        if removed:
+            logger.info(f"[artifacts] Removidos {removed} artefatos '{name_prefix}*' de video_id={video.video_id}")
+        return removed
+
+    @staticmethod
+    def ensure_local(video, name: str, local_path: str, storage: R2StorageService = None) -> str:
+        """
+        Garante que o artefato exista em `local_path` (busca no cache/R2 em caso de miss).
+
+        Returns:
+            `local_path`
+
+        Raises:
+            Exception: Se o arquivo não existir localmente nem estiver publicado
+        """
+        if os.path.exists(local_path):
+            return local_path
+
+        artifact = VideoArtifact.objects.filter(video=video, name=name).first() if ArtifactService.enabled() else None
+        if not artifact:
+            raise Exception(f"Artefato '{name}' não encontrado para video_id={video.video_id}")
+
+        cached_path = ArtifactService._cache_path(artifact.content_hash)
+        if os.path.exists(cached_path):
+            os.utime(cached_path)
+        else:
+            logger.info(f"[artifacts] Miss local de {name}; baixando {artifact.storage_path}")
+            storage = storage or R2StorageService()
+            tmp_path = f"{cached_path}.{uuid.uuid4().hex}.part"
+            os.makedirs(os.path.dirname(cached_path), exist_ok=True)
+            try:
+                storage.download_file(artifact.storage_path, tmp_path)
+                os.replace(tmp_path, cached_path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            ArtifactService.evict_cache()
+
+        ArtifactService._materialize(cached_path, local_path)
+        return local_path
+
+    @staticmethod
+    def try_ensure_local(video, name: str, local_path: str, storage: R2StorageService = None) -> bool:
+        """Como `ensure_local`, mas retorna False em vez de levantar exceção."""
+        try:
+            ArtifactService.ensure_local(video, name, local_path, storage=storage)
+            return True
+        except Exception as e:
+            logger.debug(f"[artifacts] '{name}' indisponível para video_id={video.video_id}: {e}")
+            return False
+
+    @staticmethod
+    def evict_cache(max_bytes: int = None) -> int:
+        """Remove entradas menos usadas até o cache caber no limite. Retorna bytes liberados."""
+        max_bytes = int(max_bytes or getattr(settings, "ARTIFACT_CACHE_MAX_BYTES", 50 * 1024 ** 3))
+        cache_dir = ArtifactService._cache_dir()
+        if not os.path.isdir(cache_dir):
+            return 0
+
+        entries = []
+        total = 0
+        for root, _, files in os.walk(cache_dir):
+            for name in files:
+                if name.endswith(".part"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+
+        freed = 0
+        for _, size, path in sorted(entries):
+            if total - freed <= max_bytes:
+                break
+            try:
+                os.remove(path)
+                freed += size
+            except FileNotFoundError:
+                pass
+
+        if freed:
+            logger.info(f"[artifacts] Cache local: {freed} bytes liberados")
+        return freed
+
+    @staticmethod
+    def _cache_dir() -> str:
+        return str(getattr(settings, "ARTIFACT_CACHE_DIR", None) or os.path.join(settings.MEDIA_ROOT, "artifact_cache"))
+
+    @staticmethod
+    def _cache_path(content_hash: str) -> str:
+        return os.path.join(ArtifactService._cache_dir(), content_hash[:2], content_hash)
+
+    @staticmethod
+    def _materialize(src: str, dst: str) -> None:
+        # Cópia (não hardlink): etapas sobrescrevem saídas in-place (ffmpeg -y) e
+        # corromperiam o blob do cache se compartilhassem o mesmo inode.
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        tmp_dst = f"{dst}.{uuid.uuid4().hex}.part"
+        try:
+            shutil.copyfile(src, tmp_dst)
+            os.replace(tmp_dst, dst)
+        finally:
+            if os.path.exists(tmp_dst):
+                os.remove(tmp_dst)
@@ -0,0 +1,303 @@
+"""
+Agendador de downloads de URLs externas (yt-dlp), coordenado via Redis.
+
+Cada plataforma (extractor do yt-dlp) tem um número máximo de downloads
+simultâneos e de inícios por minuto, compartilhados entre todos os workers.
+O proxy de cada download é sorteado do pool configurado com peso pela taxa de
+sucesso e throughput recentes daquele proxy na plataforma; proxies bloqueados
+(429, verificação anti-bot) ficam em quarentena por um tempo. O número de
+fragmentos paralelos do yt-dlp cresce quando há folga na plataforma e o proxy
+está saudável.
+"""
+
+import logging
+import os
+import random
+import time
+import uuid
+from urllib.parse import urlparse
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "download_sched"
+STATS_TTL = 86400 * 7
+
+# Peso das observações novas na média móvel (sucesso e throughput)
+EWMA_ALPHA = 0.3
+
+BLOCK_MARKERS = ("429", "too many requests", "not a bot", "rate limit", "403", "forbidden")
+
+
+class DownloadThrottledError(Exception):
+    """Sem vaga para a plataforma agora; a task deve ser reagendada."""
+
+    def __init__(self, extractor: str, retry_after: int):
+        super().__init__(f"Limite de downloads simultâneos/por minuto atingido para '{extractor}'")
+        self.extractor = extractor
+        self.retry_after = retry_after
+
+
+class DownloadSchedulerService:
+    """Vagas por plataforma, limite de taxa e rotação do pool de proxies."""
+
+    @staticmethod
+    def enabled() -> bool:
+        return bool(getattr(settings, "DOWNLOAD_SCHEDULER_ENABLED", True))
+
+    @staticmethod
+    def resolve_extractor(source_url: str) -> str:
+        """Nome do extractor do yt-dlp para a URL (ou o host, se nenhum reconhecer)."""
+        try:
+            from yt_dlp.extractor import gen_extractor_classes
+
+            for ie in gen_extractor_classes():
+                if ie.ie_key() != "Generic" and ie.suitable(source_url):
+                    return ie.ie_key().lower()
+        except Exception:
+            pass
+        host = (urlparse(source_url).hostname or "generic").lower()
+        return host[4:] if host.startswith("www.") else host
+
+    @staticmethod
+    def get_limits(extractor: str) -> dict:
+        config = getattr(settings, "DOWNLOAD_SCHEDULER_LIMITS", {}) or {}
+        return {**config.get("default", {}), **config.get(extractor, {})}
+
+    @staticmethod
+    def get_proxy_pool() -> list:
+        """Proxies configurados; `[None]` (conexão direta) quando não há nenhum."""
+        pool = list(getattr(settings, "DOWNLOAD_PROXY_POOL", None) or [])
+        if not pool and os.getenv("PROXY_URL"):
+            pool = [os.getenv("PROXY_URL")]
+        return pool or [None]
+
+    @staticmethod
+    def acquire(source_url: str, wait_seconds: float = None, force: bool = False) -> dict:
+        """
+        Reserva uma vaga de download para a plataforma da URL e escolhe o proxy.
+
+        Args:
+            source_url: URL externa
+            wait_seconds: Quanto esperar por uma vaga antes de desistir
+            force: Ignora os limites (usado após muitas reagendas)
+
+        Returns:
+            Lease: {extractor, slot_key, token, proxy, concurrent_fragments, ...}
+
+        Raises:
+            DownloadThrottledError: Se não houver vaga dentro de `wait_seconds`
+        """
+        extractor = DownloadSchedulerService.resolve_extractor(source_url)
+        lease = {
+            "extractor": extractor,
+            "slot_key": None,
+            "token": uuid.uuid4().hex,
+            "proxy": None,
+            "concurrent_fragments": 1,
+            "started": time.time(),
+            "bytes": {},
+            "renewed": time.monotonic(),
+        }
+        if not DownloadSchedulerService.enabled():
+            lease["proxy"] = DownloadSchedulerService.get_proxy_pool()[0]
+            return lease
+
+        limits = DownloadSchedulerService.get_limits(extractor)
+        if wait_seconds is None:
+            wait_seconds = float(getattr(settings, "DOWNLOAD_SCHEDULER_MAX_WAIT", 30))
+
+        deadline = time.monotonic() + max(0.0, wait_seconds)
+        while True:
+            slot_key = DownloadSchedulerService._try_acquire_slot(extractor, limits, lease["token"])
+            if slot_key or force:
+                break
+            if time.monotonic() >= deadline:
+                raise DownloadThrottledError(extractor, retry_after=int(limits.get("retry_after", 30)))
+            time.sleep(random.uniform(1.0, 3.0))
+
+        active = DownloadSchedulerService.active_count(extractor, limits)
+        lease["slot_key"] = slot_key
+        lease["proxy"] = DownloadSchedulerService._pick_proxy(extractor)
+        lease["concurrent_fragments"] = DownloadSchedulerService._concurrent_fragments(
+            extractor, lease["proxy"], active, limits
+        )
+        logger.info(
+            f"[download_sched] Vaga {extractor} ({active}/{limits.get('max_concurrent')}) | "
+            f"proxy={DownloadSchedulerService._proxy_label(lease['proxy'])} | "
+            f"fragmentos={lease['concurrent_fragments']}"
+        )
+        return lease
+
+    @staticmethod
+    def release(lease: dict, outcome: str, error_message: str = None) -> None:
+        """
+        Libera a vaga e atualiza as estatísticas do proxy.
+
+        Args:
+            lease: Retorno de `acquire`
+            outcome: "ok", "error" ou "source" (falha da fonte, não do proxy)
+            error_message: Mensagem do yt-dlp, usada para detectar bloqueio
+        """
+        if not lease:
+            return
+
+        slot_key = lease.get("slot_key")
+        if slot_key and cache.get(slot_key) == lease["token"]:
+            cache.delete(slot_key)
+        lease["slot_key"] = None
+
+        if not DownloadSchedulerService.enabled() or outcome == "source":
+            return
+
+        blocked = outcome != "ok" and any(m in (error_message or "").lower() for m in BLOCK_MARKERS)
+        elapsed = max(0.001, time.time() - lease["started"])
+        downloaded = sum(lease["bytes"].values())
+        DownloadSchedulerService._record_proxy_result(
+            lease["extractor"],
+            lease["proxy"],
+            success=outcome == "ok",
+            bytes_per_second=downloaded / elapsed if outcome == "ok" and downloaded else None,
+            blocked=blocked,
+        )
+
+    @staticmethod
+    def progress_hook(lease: dict):
+        """Hook do yt-dlp: contabiliza bytes (throughput) e renova o lease da vaga."""
+        renew_every = float(getattr(settings, "DOWNLOAD_SCHEDULER_RENEW_SECONDS", 60))
+
+        def hook(status: dict) -> None:
+            filename = status.get("filename") or ""
+            downloaded = status.get("downloaded_bytes") or status.get("total_bytes") or 0
+            if downloaded:
+                lease["bytes"][filename] = downloaded
+
+            slot_key = lease.get("slot_key")
+            if slot_key and time.monotonic() - lease["renewed"] >= renew_every:
+                cache.touch(slot_key, DownloadSchedulerService._lease_ttl())
+                lease["renewed"] = time.monotonic()
+
+        return hook
+
+    @staticmethod
+    def active_count(extractor: str, limits: dict = None) -> int:
+        limits = limits or DownloadSchedulerService.get_limits(extractor)
+        keys = [DownloadSchedulerService._slot_key(extractor, i) for i in range(int(limits.get("max_concurrent", 1)))]
+        return len(cache.get_many(keys))
+
+    @staticmethod
+    def get_proxy_stats(extractor: str) -> dict:
+        """Estatísticas atuais de cada proxy do pool na plataforma (para o admin/debug)."""
+        return {
+            DownloadSchedulerService._proxy_label(proxy): {
+                **DownloadSchedulerService._get_stats(extractor, proxy),
+                "cooling_down": bool(cache.get(DownloadSchedulerService._cooldown_key(extractor, proxy))),
+            }
+            for proxy in DownloadSchedulerService.get_proxy_pool()
+        }
+
+    @staticmethod
+    def _try_acquire_slot(extractor: str, limits: dict, token: str) -> str | None:
+        per_minute = int(limits.get("per_minute", 0) or 0)
+        if per_minute > 0:
+            window_key = f"{KEY_PREFIX}:rate:{extractor}:{int(time.time() // 60)}"
+            cache.add(window_key, 0, 120)
+            try:
+                started = cache.incr(window_key)
+            except ValueError:
+                started = 1
+            if started > per_minute:
+                return None
+
+        slots = list(range(int(limits.get("max_concurrent", 1))))
+        random.shuffle(slots)
+        for i in slots:
+            slot_key = DownloadSchedulerService._slot_key(extractor, i)
+            if cache.add(slot_key, token, DownloadSchedulerService._lease_ttl()):
+                return slot_key
+
+        if per_minute > 0:
+            # Não conseguiu vaga: devolve o início contado nesta janela
+            try:
+                cache.decr(window_key)
+            except ValueError:
+                pass
+        return None
+
+    @staticmethod
+    def _pick_proxy(extractor: str) -> str | None:
+        pool = DownloadSchedulerService.get_proxy_pool()
+        if len(pool) == 1:
+            return pool[0]
+
+        cooling = cache.get_many([DownloadSchedulerService._cooldown_key(extractor, p) for p in pool])
+        candidates = [p for p in pool if DownloadSchedulerService._cooldown_key(extractor, p) not in cooling] or pool
+
+        stats = {p: DownloadSchedulerService._get_stats(extractor, p) for p in candidates}
+        known_bps = [s["bps"] for s in stats.values() if s.get("bps")]
+        baseline_bps = sum(known_bps) / len(known_bps) if known_bps else 1.0
+
+        # Proxy novo começa otimista (sucesso 1.0, throughput médio) para ser explorado
+        weights = [
+            max(0.02, stats[p].get("success", 1.0)) ** 2 * (stats[p].get("bps") or baseline_bps) / baseline_bps
+            for p in candidates
+        ]
+        return random.choices(candidates, weights=weights, k=1)[0]
+
+    @staticmethod
+    def _concurrent_fragments(extractor: str, proxy: str | None, active: int, limits: dict) -> int:
+        max_fragments = int(getattr(settings, "DOWNLOAD_MAX_CONCURRENT_FRAGMENTS", 8))
+        max_concurrent = max(1, int(limits.get("max_concurrent", 1)))
+
+        # Folga na plataforma e proxy saudável -> mais fragmentos por download
+        headroom = 1.0 - (max(active, 1) - 1) / max_concurrent
+        success = DownloadSchedulerService._get_stats(extractor, proxy).get("success", 1.0)
+        return max(1, min(max_fragments, int(round(max_fragments * headroom * success))))
+
+    @staticmethod
+    def _record_proxy_result(extractor: str, proxy: str | None, success: bool, bytes_per_second: float = None, blocked: bool = False) -> None:
+        stats = DownloadSchedulerService._get_stats(extractor, proxy)
+        stats["success"] = (1 - EWMA_ALPHA) * stats.get("success", 1.0) + EWMA_ALPHA * (1.0 if success else 0.0)
+        if bytes_per_second:
+            previous = stats.get("bps")
+            stats["bps"] = bytes_per_second if not previous else (1 - EWMA_ALPHA) * previous + EWMA_ALPHA * bytes_per_second
+        stats["samples"] = int(stats.get("samples", 0)) + 1
+        stats["updated_at"] = time.time()
+        cache.set(DownloadSchedulerService._stats_key(extractor, proxy), stats, STATS_TTL)
+
+        if blocked:
+            cooldown = int(getattr(settings, "DOWNLOAD_PROXY_COOLDOWN_SECONDS", 600))
+            cache.set(DownloadSchedulerService._cooldown_key(extractor, proxy), 1, cooldown)
+            logger.warning(
+                f"[download_sched] Proxy {DownloadSchedulerService._proxy_label(proxy)} bloqueado em {extractor}; "
+                f"quarentena de {cooldown}s"
+            )
+
+    @staticmethod
+    def _get_stats(extractor: str, proxy: str | None) -> dict:
+        return dict(cache.get(DownloadSchedulerService._stats_key(extractor, proxy)) or {})
+
+    @staticmethod
+    def _lease_ttl() -> int:
+        return int(getattr(settings, "DOWNLOAD_SCHEDULER_LEASE_SECONDS", 900))
+
+    @staticmethod
+    def _slot_key(extractor: str, index: int) -> str:
+        return f"{KEY_PREFIX}:slot:{extractor}:{index}"
+
+    @staticmethod
+    def _stats_key(extractor: str, proxy: str | None) -> str:
+        return f"{KEY_PREFIX}:proxy:{extractor}:{DownloadSchedulerService._proxy_label(proxy)}"
+
+    @staticmethod
+    def _cooldown_key(extractor: str, proxy: str | None) -> str:
+        return f"{KEY_PREFIX}:cooldown:{extractor}:{DownloadSchedulerService._proxy_label(proxy)}"
+
+    @staticmethod
+    def _proxy_label(proxy: str | None) -> str:
+        # Sem credenciais nas chaves/logs
+        if not proxy:
+            return "direct"
+        parsed = urlparse(proxy)
+        return f"{parsed.hostname or proxy}:{parsed.port}" if parsed.port else (parsed.hostname or proxy)
@@ -0,0 +1,205 @@
+"""
+Registro de perfis do libx264 e escolha do perfil por job.
+
+Cada etapa (normalize, render) tem, por tier do plano, uma escada de perfis
+do mais caro ao mais rápido e um prazo alvo. O perfil escolhido é o primeiro
+da escada cujo tempo previsto (fila à frente + encode estimado pela duração
+da mídia) cabe no prazo; sob backlog, os jobs descem para presets mais rápidos.
+"""
+
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from ..models import StageRun
+
+logger = logging.getLogger(__name__)
+
+# encode_factor: segundos de encode por segundo de mídia (estimativa, com as threads padrão)
+ENCODER_PROFILES = {
+    "quality": {"preset": "slow", "crf": 21, "tune": None, "threads": None, "encode_factor": 1.0},
+    "balanced": {"preset": "medium", "crf": 22, "tune": None, "threads": None, "encode_factor": 0.55},
+    "fast": {"preset": "veryfast", "crf": 23, "tune": None, "threads": None, "encode_factor": 0.25},
+    "express": {"preset": "superfast", "crf": 24, "tune": None, "threads": None, "encode_factor": 0.15},
+}
+
+DEFAULT_POLICY = {
+    "render": {"ladder": ["quality"], "deadline_seconds": 900},
+    "normalize": {"ladder": ["fast"], "deadline_seconds": 1800},
+}
+
+# Task cuja duração típica estima quanto a fila à frente vai demorar (padrão por etapa;
+# o render informa a task conforme o modo: vídeo inteiro ou um clip por mensagem)
+STAGE_TASK_NAMES = {
+    "render": "clip_generation_task",
+    "normalize": "normalize_video_task",
+}
+
+QUEUE_DEPTH_CACHE_SECONDS = 15
+QUEUE_CONSUMERS_CACHE_SECONDS = 60
+INSPECT_TIMEOUT_SECONDS = 1.0
+TYPICAL_SECONDS_CACHE_SECONDS = 300
+
+
+class EncoderProfileService:
+    """Escolhe preset/CRF/threads/tune por job a partir de tier, fila e duração."""
+
+    @staticmethod
+    def get_profile(name: str) -> dict:
+        overrides = (getattr(settings, "ENCODER_PROFILES", {}) or {}).get(name, {})
+        base = ENCODER_PROFILES.get(name)
+        if base is None and not overrides:
+            raise KeyError(f"Perfil de encoder desconhecido: {name}")
+        return {**(base or {}), **overrides, "name": name}
+
+    @staticmethod
+    def get_policy(stage: str, tier: str) -> dict:
+        policies = (getattr(settings, "ENCODER_PROFILE_POLICY", {}) or {}).get(stage, {})
+        return {**DEFAULT_POLICY.get(stage, DEFAULT_POLICY["render"]), **(policies.get(tier) or {})}
+
+    @staticmethod
+    def select(
+        stage: str,
+        tier: str,
+        media_seconds: float,
+        queue: str = None,
+        parallelism: int = 1,
+        task_name: str = None,
+    ) -> dict:
+        """
+        Escolhe o perfil do job.
+
+        Args:
+            stage: "normalize" ou "render"
+            tier: Tier do plano (starter, business)
+            media_seconds: Segundos de mídia a codificar (soma dos clips no render)
+            queue: Fila Celery da etapa (para medir o backlog)
+            parallelism: Encodes simultâneos deste job
+            task_name: Task que ocupa a fila (padrão: STAGE_TASK_NAMES[stage])
+
+        Returns:
+            Perfil (name, preset, crf, tune, threads) + dados da decisão
+        """
+        policy = EncoderProfileService.get_policy(stage, tier)
+        ladder = list(policy.get("ladder") or DEFAULT_POLICY["render"]["ladder"])
+        deadline = float(policy.get("deadline_seconds") or 0)
+
+        depth, consumers = EncoderProfileService.get_queue_depth(queue) if queue else (0, 0)
+        typical = EncoderProfileService.get_typical_task_seconds(stage, task_name) if depth else 0.0
+        backlog_seconds = depth * typical / max(1, consumers)
+
+        chosen = None
+        predicted = 0.0
+        for name in ladder:
+            profile = EncoderProfileService.get_profile(name)
+            predicted = backlog_seconds + float(media_seconds or 0) * float(profile.get("encode_factor") or 1.0) / max(1, parallelism)
+            chosen = profile
+            if not deadline or predicted <= deadline:
+                break
+
+        result = {
+            "name": chosen["name"],
+            "preset": chosen.get("preset"),
+            "crf": chosen.get("crf"),
+            "tune": chosen.get("tune"),
+            "threads": chosen.get("threads"),
+            "tier": tier,
+            "queue_depth": depth,
+            "backlog_seconds": round(backlog_seconds, 1),
+            "predicted_seconds": round(predicted, 1),
+            "deadline_seconds": deadline or None,
+        }
+        if chosen["name"] != ladder[0]:
+            logger.info(
+                f"[encoder] {stage}/{tier}: '{ladder[0]}' -> '{chosen['name']}' "
+                f"(fila={depth}, backlog~{backlog_seconds:.0f}s, previsto~{predicted:.0f}s, prazo={deadline:.0f}s)"
+            )
+        return result
+
+    @staticmethod
+    def encoder_args(profile: dict | None, default: str) -> list:
+        """Argumentos do libx264 (-c:v/-preset/-crf/-tune) do perfil (ou do perfil padrão)."""
+        profile = profile or EncoderProfileService.get_profile(default)
+        args = [
+            "-c:v", "libx264",
+            "-preset", str(profile.get("preset") or "veryfast"),
+            "-crf", str(profile.get("crf") if profile.get("crf") is not None else 23),
+        ]
+        if profile.get("tune"):
+            args.extend(["-tune", str(profile["tune"])])
+        return args
+
+    @staticmethod
+    def get_queue_depth(queue: str) -> tuple:
+        """(mensagens aguardando, consumidores) da fila; zeros onde não foi possível medir."""
+        cache_key = f"encoder:queue_depth:{queue}"
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return tuple(cached)
+
+        depth, consumers = 0, 0
+        try:
+            from celery import current_app
+
+            with current_app.connection_for_read() as conn:
+                _, depth, broker_consumers = conn.default_channel.queue_declare(queue=queue, passive=True)
+                # Só o AMQP conta consumidores; o transporte virtual (Redis) sempre devolve 0
+                if broker_consumers and conn.transport.driver_type == "amqp":
+                    consumers = broker_consumers
+        except Exception as e:
+            logger.debug(f"[encoder] Não foi possível medir a fila {queue}: {e}")
+
+        configured = (getattr(settings, "ENCODER_QUEUE_CONSUMERS", {}) or {}).get(queue)
+        consumers = int(configured or 0) or consumers or EncoderProfileService.get_queue_consumers(queue)
+
+        cache.set(cache_key, [int(depth or 0), int(consumers or 0)], QUEUE_DEPTH_CACHE_SECONDS)
+        return int(depth or 0), int(consumers or 0)
+
+    @staticmethod
+    def get_queue_consumers(queue: str) -> int:
+        """Processos dos workers que consomem a fila (inspect: active_queues + max-concurrency); 0 se indisponível."""
+        cache_key = f"encoder:queue_consumers:{queue}"
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return int(cached)
+
+        consumers = 0
+        try:
+            from celery import current_app
+
+            inspect = current_app.control.inspect(timeout=INSPECT_TIMEOUT_SECONDS)
+            active_queues = inspect.active_queues() or {}
+            stats = inspect.stats() or {}
+            for worker, queues in active_queues.items():
+                if any(q.get("name") == queue for q in queues or []):
+                    pool = (stats.get(worker) or {}).get("pool") or {}
+                    consumers += int(pool.get("max-concurrency") or 1)
+        except Exception as e:
+            logger.debug(f"[encoder] Não foi possível inspecionar os workers de {queue}: {e}")
+
+        cache.set(cache_key, consumers, QUEUE_CONSUMERS_CACHE_SECONDS)
+        return consumers
+
+    @staticmethod
+    def get_typical_task_seconds(stage: str, task_name: str = None) -> float:
+        """Mediana do wall time das execuções recentes da task que ocupa a fila da etapa (StageRun)."""
+        task_name = task_name or STAGE_TASK_NAMES.get(stage, stage)
+        cache_key = f"encoder:typical_seconds:{stage}:{task_name}"
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return float(cached)
+
+        values = sorted(
+            StageRun.objects.filter(
+                task_name__endswith=task_name,
+                status="success",
+                wall_seconds__isnull=False,
+                started_at__gte=timezone.now() - timedelta(days=1),
+            ).order_by("-started_at").values_list("wall_seconds", flat=True)[:500]
+        )
+        typical = values[len(values) // 2] if values else float(getattr(settings, "ENCODER_DEFAULT_TASK_SECONDS", 60))
+
+        cache.set(cache_key, typical, TYPICAL_SECONDS_CACHE_SECONDS)
+        return float(typical)
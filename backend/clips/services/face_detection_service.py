@@ -0,0 +1,209 @@
+"""
+Detecção de rosto (MediaPipe) em paralelo, num pool de processos residente.
+
+A linha do tempo de amostras é dividida em shards contíguos; cada processo do
+pool mantém sua própria instância de `FaceDetection` (criada no primeiro shard e
+reaproveitada entre tasks) e lê os frames direto da pilha memory-mapped ou do
+vídeo. Os frames são reduzidos antes da inferência e os resultados voltam com
+o índice da amostra, reunidos na ordem da linha do tempo.
+
+O pool é do billiard (o mesmo do prefork do Celery), que pode ser criado dentro
+dos filhos daemônicos do prefork. Os processos são iniciados com spawn: nada de
+fork a partir de um worker com threads. Se o pool falhar, a detecção roda no
+próprio processo.
+"""
+
+import logging
+import math
+import os
+import threading
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Menor shard que compensa o envio para o pool
+MIN_SHARD_SAMPLES = 8
+# Shards por processo: equilibra janelas com custos diferentes sem fragmentar demais os seeks
+SHARDS_PER_WORKER = 2
+# Limite de espera pelos shards; um processo travado não segura o reframe para sempre
+POOL_TIMEOUT_SECONDS = 1800
+
+# Estado de cada processo do pool (e do próprio worker no caminho sequencial)
+_detector = None
+_detector_config = None
+
+
+def _init_detector(model_selection: int, min_confidence: float, detect_width: int) -> None:
+    global _detector, _detector_config
+    try:
+        import mediapipe as mp
+    except ImportError:
+        raise Exception("Instale: pip install opencv-python mediapipe")
+
+    _detector = mp.solutions.face_detection.FaceDetection(
+        model_selection=model_selection,
+        min_detection_confidence=min_confidence,
+    )
+    _detector_config = (model_selection, min_confidence, detect_width)
+
+
+def _detect_shard(source: dict, samples: list, config: tuple) -> list:
+    """
+    Roda o detector residente sobre um shard.
+
+    Args:
+        source: {"kind": "stack", "path", "fps", "count"} ou {"kind": "video", "path"}
+        samples: [(id da amostra, t em segundos)] em ordem de tempo
+        config: (model_selection, min_confidence, largura de inferência)
+
+    Returns:
+        [(id da amostra, centro x relativo do melhor rosto ou None)]
+    """
+    import cv2
+    import numpy as np
+
+    if _detector is None or _detector_config != tuple(config):
+        _init_detector(*config)
+    detect_width = config[2]
+
+    results = []
+    cap = None
+    frames = None
+    if source["kind"] == "stack":
+        frames = np.load(source["path"], mmap_mode="r")
+    else:
+        cap = cv2.VideoCapture(source["path"])
+        if not cap.isOpened():
+            raise Exception("Erro ao abrir vídeo para análise")
+
+    try:
+        for sample_id, t in samples:
+            if frames is not None:
+                i = min(int(source["count"]) - 1, max(0, int(round(float(t) * float(source["fps"])))))
+                frame = np.asarray(frames[i])
+            else:
+                cap.set(cv2.CAP_PROP_POS_MSEC, float(t) * 1000.0)
+                ret, frame = cap.read()
+                if not ret:
+                    results.append((sample_id, None))
+                    continue
+
+            height, width = frame.shape[:2]
+            if detect_width and width > detect_width:
+                # Coordenadas relativas não mudam com a escala: só reduz o custo da inferência
+                frame = cv2.resize(frame, (detect_width, max(1, int(height * detect_width / width))), interpolation=cv2.INTER_AREA)
+
+            detections = _detector.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)).detections
+            if not detections:
+                results.append((sample_id, None))
+                continue
+
+            best_detection = max(detections, key=lambda d: d.score[0])
+            bboxC = best_detection.location_data.relative_bounding_box
+            results.append((sample_id, float(bboxC.xmin + bboxC.width / 2)))
+    finally:
+        if cap is not None:
+            cap.release()
+
+    return results
+
+
+class FaceDetectionService:
+    """Pool de processos com detectores MediaPipe residentes, por worker."""
+
+    _pool = None
+    _pool_key = None
+    # Pool falhou neste processo: não tenta de novo (o detector passa a viver aqui)
+    _pool_disabled = False
+    _lock = threading.Lock()
+
+    @staticmethod
+    def get_config() -> tuple:
+        """(model_selection, min_confidence, largura de inferência)."""
+        return (
+            1,
+            float(getattr(settings, "REFRAME_MIN_DETECTION_CONFIDENCE", 0.6) or 0.6),
+            int(getattr(settings, "REFRAME_DETECT_WIDTH", 320) or 0),
+        )
+
+    @staticmethod
+    def get_workers() -> int:
+        configured = int(getattr(settings, "REFRAME_DETECT_WORKERS", 0))
+        return max(1, configured or (os.cpu_count() or 1))
+
+    @classmethod
+    def detect(cls, source: dict, times: list) -> list:
+        """
+        Centro x relativo (0-1) do melhor rosto em cada instante de `times`.
+
+        Args:
+            source: Pilha de frames ou vídeo (ver `_detect_shard`)
+            times: Instantes em segundos (qualquer ordem)
+
+        Returns:
+            Lista alinhada com `times`; None onde não houve detecção
+        """
+        samples = sorted(enumerate(float(t) for t in times), key=lambda s: s[1])
+        if not samples:
+            return []
+
+        config = cls.get_config()
+        workers = cls.get_workers()
+        num_shards = max(1, min(workers * SHARDS_PER_WORKER, len(samples) // MIN_SHARD_SAMPLES))
+
+        merged = None
+        if workers > 1 and num_shards > 1 and not cls._pool_disabled:
+            # Shards contíguos no tempo: cada processo faz seeks/leituras só para frente
+            size = math.ceil(len(samples) / num_shards)
+            shards = [samples[i:i + size] for i in range(0, len(samples), size)]
+            try:
+                pool = cls._get_pool(workers)
+                pending = pool.starmap_async(_detect_shard, [(source, shard, config) for shard in shards])
+                merged = []
+                for shard_results in pending.get(timeout=POOL_TIMEOUT_SECONDS):
+                    merged.extend(shard_results)
+            except Exception as e:
+                # Ex: processo do pool perdido (WorkerLostError), timeout, falta de recursos
+                logger.warning(f"[faces] Pool de detecção indisponível; seguindo em processo: {e}")
+                cls.shutdown()
+                cls._pool_disabled = True
+                merged = None
+
+        if merged is None:
+            merged = _detect_shard(source, samples, config)
+
+        centers = [None] * len(samples)
+        for sample_id, center in merged:
+            centers[sample_id] = center
+        return centers
+
+    @classmethod
+    def _get_pool(cls, workers: int):
+        import billiard
+        import django
+
+        with cls._lock:
+            if cls._pool is not None and cls._pool_key == workers:
+                return cls._pool
+            if cls._pool is not None:
+                cls._pool.terminate()
+
+            # billiard: aceita ser criado dentro de um filho daemônico do prefork.
+            # spawn: fork de um worker com threads (--pool=threads) não é seguro.
+            # O initializer é o próprio django.setup: importar este módulo antes disso
+            # carregaria os models com o registro de apps vazio
+            cls._pool = billiard.get_context("spawn").Pool(
+                processes=workers,
+                initializer=django.setup,
+            )
+            cls._pool_key = workers
+            logger.info(f"[faces] Pool de detecção iniciado com {workers} processos")
+            return cls._pool
+
+    @classmethod
+    def shutdown(cls) -> None:
+        with cls._lock:
+            if cls._pool is not None:
+                cls._pool.terminate()
+            cls._pool = None
+            cls._pool_key = None
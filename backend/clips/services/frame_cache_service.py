@@ -0,0 +1,363 @@
+"""
+Cache de frames em baixa resolução, compartilhado pelas etapas de análise.
+
+O vídeo normalizado é decodificado uma única vez pelo ffmpeg a uma taxa fixa
+(ex: 2 fps, 256 px de largura) e os frames (BGR, uint8) são gravados em uma
+pilha `.npy` N x H x W x 3 aberta via memory-map, com um índice JSON de
+timestamps ao lado. Thumbnail, detecção de rosto e thumbnails de clips leem
+da pilha em vez de cada um abrir o vídeo e fazer seeks aleatórios.
+
+A pilha é local ao nó (centenas de MB em vídeos longos): não vira artefato e
+é reconstruída a partir do normalizado num miss. Só o índice é publicado; ele
+também guarda os cortes de cena detectados sobre a pilha (SceneCutService),
+que assim ficam disponíveis em qualquer worker sem decodificar o vídeo.
+"""
+
+import json
+import logging
+import math
+import os
+import subprocess
+import time
+import uuid
+import numpy as np
+from django.conf import settings
+
+from ..models import Video, VideoArtifact
+from .artifact_service import ArtifactService
+from .media_probe_service import MediaProbeService
+
+logger = logging.getLogger(__name__)
+
+# Incrementar ao mudar o layout da pilha ou do índice (invalida pilhas existentes)
+FRAME_CACHE_SCHEMA_VERSION = 2
+
+FRAMES_FILENAME = "frames.npy"
+INDEX_FILENAME = "frames.json"
+LOCK_FILENAME = ".frames.lock"
+
+READ_CHUNK_FRAMES = 16
+
+
+class FrameCacheService:
+    """Constrói e lê a pilha de frames amostrados de um vídeo."""
+
+    @staticmethod
+    def enabled() -> bool:
+        return bool(getattr(settings, "FRAME_CACHE_ENABLED", True))
+
+    @staticmethod
+    def get_params() -> dict:
+        return {
+            "schema": FRAME_CACHE_SCHEMA_VERSION,
+            "fps": float(getattr(settings, "FRAME_CACHE_FPS", 2.0) or 2.0),
+            "width": int(getattr(settings, "FRAME_CACHE_WIDTH", 256) or 256),
+            "max_frames": int(getattr(settings, "FRAME_CACHE_MAX_FRAMES", 3600) or 3600),
+        }
+
+    @staticmethod
+    def ensure(video: Video, video_dir: str, source_path: str = None) -> dict | None:
+        """
+        Retorna a pilha do vídeo, construindo-a se ainda não existir.
+
+        Ordem: arquivo local -> decode do normalizado (a pilha não é publicada).
+        Se outro worker estiver construindo no mesmo diretório, espera por ele.
+
+        Args:
+            video: Instância de Video
+            video_dir: Diretório do vídeo em MEDIA_ROOT
+            source_path: Vídeo normalizado local (baixado do artefato se omitido)
+
+        Returns:
+            Pilha (ver `load`) ou None se o cache estiver desabilitado
+        """
+        if not FrameCacheService.enabled():
+            return None
+
+        stack = FrameCacheService.load(video, video_dir)
+        if stack is not None:
+            return stack
+
+        lock_path = os.path.join(video_dir, LOCK_FILENAME)
+        if not FrameCacheService._acquire_lock(lock_path):
+            stack = FrameCacheService._wait_for_build(video, video_dir, lock_path)
+            if stack is not None:
+                return stack
+            FrameCacheService._acquire_lock(lock_path, force=True)
+
+        try:
+            # Outro worker pode ter terminado entre o load e o lock
+            stack = FrameCacheService.load(video, video_dir)
+            if stack is not None:
+                return stack
+
+            source_path = source_path or os.path.join(video_dir, "video_normalized.mp4")
+            ArtifactService.ensure_local(video, "normalized", source_path)
+            FrameCacheService.build(video, source_path, video_dir)
+        finally:
+            try:
+                os.remove(lock_path)
+            except FileNotFoundError:
+                pass
+
+        stack = FrameCacheService.load(video, video_dir)
+        if stack is None:
+            raise Exception(f"Pilha de frames não pôde ser lida após a construção (video_id={video.video_id})")
+        return stack
+
+    @staticmethod
+    def load(video: Video, video_dir: str) -> dict | None:
+        """
+        Abre a pilha local existente em modo somente leitura.
+
+        Returns:
+            Dict com frames (memmap N x H x W x 3, BGR), path, timestamps (segundos),
+            fps, width, height, source_width, source_height, duration;
+            ou None se não houver pilha válida para o vídeo normalizado atual.
+        """
+        index = FrameCacheService.load_index(video, video_dir)
+        if index is None:
+            return None
+
+        frames_path = os.path.join(video_dir, FRAMES_FILENAME)
+        if not os.path.exists(frames_path):
+            return None
+
+        try:
+            frames = np.load(frames_path, mmap_mode="r")
+        except (OSError, ValueError) as e:
+            logger.warning(f"[frames] Pilha ilegível para video_id={video.video_id}: {e}")
+            return None
+
+        count = int(index.get("count") or 0)
+        if frames.ndim != 4 or frames.shape[0] < count:
+            return None
+
+        return {
+            "frames": frames[:count],
+            "path": frames_path,
+            "timestamps": np.asarray(index.get("timestamps") or [], dtype=np.float64),
+            "fps": float(index["fps"]),
+            "width": int(index["width"]),
+            "height": int(index["height"]),
+            "source_width": int(index["source_width"]),
+            "source_height": int(index["source_height"]),
+            "duration": float(index.get("duration") or 0),
+        }
+
+    @staticmethod
+    def load_index(video: Video, video_dir: str) -> dict | None:
+        """Só o índice (timestamps, resolução, cortes de cena), sem materializar a pilha."""
+        if not FrameCacheService.enabled():
+            return None
+
+        index_path = os.path.join(video_dir, INDEX_FILENAME)
+        if not os.path.exists(index_path):
+            # O índice publicado por outro nó basta para os cortes de cena; a pilha em si é local
+            if not ArtifactService.try_ensure_local(video, "frames_index", index_path):
+                return None
+
+        try:
+            with open(index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        return index if FrameCacheService._index_is_current(video, index) else None
+
+    @staticmethod
+    def build(video: Video, source_path: str, video_dir: str) -> dict:
+        """
+        Decodifica `source_path` uma vez e grava pilha + índice em `video_dir`.
+
+        A taxa é reduzida para vídeos longos de modo que a pilha tenha no
+        máximo FRAME_CACHE_MAX_FRAMES frames.
+
+        Returns:
+            Índice gravado
+        """
+        params = FrameCacheService.get_params()
+        metadata = MediaProbeService.probe(source_path, video=video, name="normalized")
+
+        src_w = int(metadata.get("width") or 0)
+        src_h = int(metadata.get("height") or 0)
+        duration = float(metadata.get("duration") or 0)
+        if not src_w or not src_h or duration <= 0:
+            raise Exception(f"Metadados inválidos para amostrar frames: {source_path}")
+
+        fps = min(params["fps"], params["max_frames"] / duration)
+        width = min(params["width"], src_w)
+        width -= width % 2
+        height = max(2, int(round(src_h * width / src_w / 2.0)) * 2)
+        capacity = int(math.ceil(duration * fps)) + 2
+
+        frames_path = os.path.join(video_dir, FRAMES_FILENAME)
+        index_path = os.path.join(video_dir, INDEX_FILENAME)
+        tmp_suffix = f".{uuid.uuid4().hex}.part"
+        tmp_frames = frames_path + tmp_suffix
+        tmp_index = index_path + tmp_suffix
+
+        ffmpeg_path = getattr(settings, "FFMPEG_PATH", "ffmpeg")
+        cmd = [
+            ffmpeg_path,
+            "-nostdin", "-hide_banner", "-loglevel", "error",
+            "-i", source_path,
+            "-map", "0:v:0",
+            "-vf", f"fps={fps:.6f},scale={width}:{height}:flags=area",
+            "-f", "rawvideo",
+            "-pix_fmt", "bgr24",
+            "pipe:1",
+        ]
+
+        frame_bytes = width * height * 3
+        started = time.monotonic()
+        count = 0
+        stack = None
+        proc = None
+        try:
+            # Capacidade estimada pela duração; frames não escritos no fim ficam esparsos
+            # no disco e são ignorados via `count` do índice.
+            stack = np.lib.format.open_memmap(tmp_frames, mode="w+", dtype=np.uint8, shape=(capacity, height, width, 3))
+            proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+            while count < capacity:
+                data = proc.stdout.read(frame_bytes * READ_CHUNK_FRAMES)
+                n = len(data) // frame_bytes
+                if n:
+                    n = min(n, capacity - count)
+                    stack[count:count + n] = np.frombuffer(data[: n * frame_bytes], dtype=np.uint8).reshape(n, height, width, 3)
+                    count += n
+                if len(data) < frame_bytes * READ_CHUNK_FRAMES:
+                    break
+
+            proc.stdout.close()
+            stderr = proc.stderr.read().decode("utf-8", errors="replace")
+            if proc.wait() != 0 and not count:
+                raise Exception(f"ffmpeg falhou ao amostrar frames: {stderr.strip()[-500:]}")
+            if not count:
+                raise Exception(f"Nenhum frame amostrado de {source_path}")
+
+            stack.flush()
+
+            from .scene_cut_service import SceneCutService
+
+            timestamps = [round(i / fps, 3) for i in range(count)]
+            scene_params = SceneCutService.get_params()
+            scene_cuts = SceneCutService.detect(stack[:count], timestamps, scene_params)
+            stack = None
+
+            index = {
+                **params,
+                "fps": fps,
+                "width": width,
+                "height": height,
+                "count": count,
+                "source_width": src_w,
+                "source_height": src_h,
+                "duration": duration,
+                "source_hash": FrameCacheService._source_hash(video),
+                "timestamps": timestamps,
+                "scene_params": scene_params,
+                "scene_cuts": [[round(float(a), 3), round(float(b), 3)] for a, b in scene_cuts],
+            }
+            with open(tmp_index, "w", encoding="utf-8") as f:
+                json.dump(index, f)
+
+            os.replace(tmp_frames, frames_path)
+            os.replace(tmp_index, index_path)
+        finally:
+            if proc and proc.poll() is None:
+                proc.kill()
+                proc.wait()
+            stack = None
+            for path in (tmp_frames, tmp_index):
+                if os.path.exists(path):
+                    os.remove(path)
+
+        # Só o índice (timestamps + cortes de cena) sobe: a pilha é barata de refazer e cara de transferir
+        ArtifactService.publish(video, "frames_index", index_path)
+
+        logger.info(
+            f"[frames] {count} frames {width}x{height} @ {fps:.2f} fps ({len(index['scene_cuts'])} cortes) amostrados em "
+            f"{time.monotonic() - started:.1f}s para video_id={video.video_id}"
+        )
+        return index
+
+    @staticmethod
+    def frame_at(stack: dict, seconds: float):
+        """Frame (BGR) mais próximo de `seconds` na pilha."""
+        timestamps = stack["timestamps"]
+        if not len(timestamps):
+            return None
+        i = int(np.searchsorted(timestamps, seconds))
+        if i >= len(timestamps) or (i > 0 and seconds - timestamps[i - 1] <= timestamps[i] - seconds):
+            i -= 1
+        return np.asarray(stack["frames"][max(0, i)])
+
+    @staticmethod
+    def frame_indices(stack: dict, every_seconds: float) -> range:
+        """Índices dos frames da pilha espaçados de `every_seconds`."""
+        stride = max(1, int(round(float(every_seconds) * stack["fps"])))
+        return range(0, len(stack["timestamps"]), stride)
+
+    @staticmethod
+    def scale_box(stack: dict, box: dict) -> dict:
+        """Converte um retângulo em coordenadas do vídeo normalizado para a pilha."""
+        sx = stack["width"] / max(1, stack["source_width"])
+        sy = stack["height"] / max(1, stack["source_height"])
+        x = int(round(int(box.get("x") or 0) * sx))
+        y = int(round(int(box.get("y") or 0) * sy))
+        w = max(1, min(stack["width"] - x, int(round(int(box.get("width") or stack["source_width"]) * sx))))
+        h = max(1, min(stack["height"] - y, int(round(int(box.get("height") or stack["source_height"]) * sy))))
+        return {"x": x, "y": y, "width": w, "height": h}
+
+    @staticmethod
+    def _index_is_current(video: Video, index: dict) -> bool:
+        params = FrameCacheService.get_params()
+        if index.get("schema") != params["schema"] or int(index.get("max_frames") or 0) != params["max_frames"]:
+            return False
+        # fps/width gravados podem ser menores que os configurados (vídeos longos/pequenos)
+        if float(index.get("fps") or 0) > params["fps"] + 1e-6 or int(index.get("width") or 0) > params["width"]:
+            return False
+        source_hash = FrameCacheService._source_hash(video)
+        return not source_hash or index.get("source_hash") == source_hash
+
+    @staticmethod
+    def _source_hash(video: Video) -> str | None:
+        """Hash do artefato normalizado de onde a pilha foi amostrada."""
+        return (
+            VideoArtifact.objects.filter(video=video, name="normalized")
+            .values_list("content_hash", flat=True)
+            .first()
+        )
+
+    @staticmethod
+    def _acquire_lock(lock_path: str, force: bool = False) -> bool:
+        os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+        if force:
+            with open(lock_path, "w") as f:
+                f.write(str(os.getpid()))
+            return True
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, "w") as f:
+            f.write(str(os.getpid()))
+        return True
+
+    @staticmethod
+    def _wait_for_build(video: Video, video_dir: str, lock_path: str) -> dict | None:
+        """Espera outro worker terminar a pilha; None se o lock sumir sem pilha ou expirar."""
+        timeout = float(getattr(settings, "FRAME_CACHE_WAIT_SECONDS", 600) or 600)
+        logger.info(f"[frames] Pilha em construção por outro worker; aguardando video_id={video.video_id}")
+        while True:
+            try:
+                # Prazo contado da criação do lock: um worker que morreu não segura os outros
+                if time.time() - os.path.getmtime(lock_path) > timeout:
+                    break
+            except FileNotFoundError:
+                return FrameCacheService.load(video, video_dir)
+            time.sleep(2)
+        logger.warning(f"[frames] Lock da pilha expirou após {timeout:.0f}s; reconstruindo video_id={video.video_id}")
+        return None
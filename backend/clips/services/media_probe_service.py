@@ -0,0 +1,342 @@
+"""
+Serviço único de ffprobe para o pipeline.
+
+Cada arquivo é sondado uma única vez (`-show_format -show_streams`); o
+resultado normalizado fica no Redis, chaveado por (caminho ou chave R2,
+tamanho, mtime/ETag), e em `Video.media_info[name]` para que outras etapas e
+workers reutilizem sem rodar ffprobe de novo.
+
+A medição de loudness (passada de análise do loudnorm, EBU R128) não tem
+decode próprio: vai num ramo do filtergraph de quem já decodifica o áudio (a
+extração para a transcrição) e fica em `Video.loudness[name]`.
+"""
+
+import hashlib
+import json
+import logging
+import math
+import os
+import subprocess
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from ..models import Video
+
+logger = logging.getLogger(__name__)
+
+# Incrementar ao mudar o formato retornado por `_parse` (invalida o cache)
+PROBE_SCHEMA_VERSION = 2
+LOUDNESS_SCHEMA_VERSION = 2
+
+LOUDNESS_FIELDS = ("input_i", "input_tp", "input_lra", "input_thresh", "target_offset")
+
+
+class MediaProbeService:
+    """Sonda arquivos de mídia com ffprobe e cacheia o resultado."""
+
+    @staticmethod
+    def probe(file_path: str, video: Video = None, name: str = None) -> dict:
+        """
+        Retorna os metadados de um arquivo local.
+
+        Args:
+            file_path: Caminho local do arquivo
+            video: Instância de Video para persistir em `media_info` (opcional)
+            name: Nome lógico do arquivo no vídeo (ex: original, normalized)
+
+        Returns:
+            Dict com duration, width, height, fps, codecs, has_audio, ...
+
+        Raises:
+            Exception: Se o arquivo não existir ou o ffprobe falhar
+        """
+        try:
+            st = os.stat(file_path)
+        except FileNotFoundError:
+            raise Exception(f"Arquivo não encontrado para ffprobe: {file_path}")
+
+        return MediaProbeService._cached_probe(
+            source=os.path.abspath(file_path),
+            size=st.st_size,
+            stamp=str(st.st_mtime_ns),
+            target=file_path,
+            video=video,
+            name=name,
+        )
+
+    @staticmethod
+    def probe_object(key: str, video: Video = None, name: str = None, storage=None) -> dict:
+        """
+        Retorna os metadados de um objeto no R2 sem baixá-lo (ffprobe via URL assinada).
+
+        Args:
+            key: Chave no R2
+            video: Instância de Video para persistir em `media_info` (opcional)
+            name: Nome lógico do arquivo no vídeo
+            storage: Instância opcional de R2StorageService
+        """
+        from .storage_service import R2StorageService
+
+        storage = storage or R2StorageService()
+        info = storage.get_object_info(key)
+        if not info:
+            raise Exception(f"Objeto não encontrado no R2: {key}")
+
+        return MediaProbeService._cached_probe(
+            source=f"r2://{key}",
+            size=info["size"],
+            stamp=info["etag"],
+            target=lambda: storage.get_signed_url(key, expiration=600),
+            video=video,
+            name=name,
+        )
+
+    @staticmethod
+    def loudness_analysis_filter() -> str:
+        """
+        Passada de análise do loudnorm (EBU R128) para um ramo de um filtergraph que
+        já decodifica o áudio (ex: extração para a transcrição). O JSON sai no stderr
+        no nível info; ver `parse_loudnorm`.
+        """
+        target = MediaProbeService.loudness_target()
+        return f"loudnorm=I={target['I']}:TP={target['TP']}:LRA={target['LRA']}:print_format=json"
+
+    @staticmethod
+    def parse_loudnorm(stderr: str) -> dict | None:
+        """
+        Extrai a medição do JSON impresso pelo loudnorm.
+
+        Os valores (input_i, input_tp, input_lra, input_thresh, target_offset)
+        são exatamente os parâmetros da segunda passada.
+
+        Returns:
+            Dict com a medição e o alvo usado (`target`), ou None se não houver JSON
+        """
+        stderr = stderr or ""
+        end = stderr.rfind("}")
+        start = stderr.rfind("{", 0, end + 1)
+        if start < 0 or end < start:
+            return None
+        try:
+            data = json.loads(stderr[start:end + 1])
+        except ValueError:
+            return None
+
+        measurement = {}
+        for key in LOUDNESS_FIELDS:
+            try:
+                value = float(data.get(key))
+            except (TypeError, ValueError):
+                value = None
+            # Silêncio total mede -inf (não serializável no JSONField)
+            measurement[key] = value if value is not None and math.isfinite(value) else None
+        return {**measurement, "target": MediaProbeService.loudness_target()}
+
+    @staticmethod
+    def store_loudness(video: Video, name: str, measurement: dict, content_hash: str = None) -> None:
+        """
+        Grava a medição em `Video.loudness[name]`, para o render (e re-renders) reutilizarem.
+
+        Args:
+            video: Instância de Video
+            name: Nome lógico do arquivo medido (ex: normalized, audio)
+            measurement: Retorno de `parse_loudnorm`
+            content_hash: sha256 do artefato medido (identifica o arquivo em qualquer worker)
+        """
+        entry = {"content_hash": content_hash, "version": LOUDNESS_SCHEMA_VERSION, "measurement": measurement}
+        MediaProbeService._persist(video, name, entry, field="loudness")
+
+    @staticmethod
+    def stored_loudness(video: Video, names: list, content_hashes: dict = None) -> dict | None:
+        """
+        Primeira medição válida entre `names` (mesmo alvo e, se informado, mesmo conteúdo).
+
+        Args:
+            video: Instância de Video
+            names: Nomes lógicos em ordem de preferência
+            content_hashes: {name: sha256 atual do artefato}
+
+        Returns:
+            Medição ou None
+        """
+        target = MediaProbeService.loudness_target()
+        for name in names:
+            entry = (video.loudness or {}).get(name) or {}
+            measurement = entry.get("measurement") or {}
+            if entry.get("version") != LOUDNESS_SCHEMA_VERSION or measurement.get("target") != target:
+                continue
+            expected = (content_hashes or {}).get(name)
+            if expected and entry.get("content_hash") and entry["content_hash"] != expected:
+                continue
+            return measurement
+        return None
+
+    @staticmethod
+    def loudnorm_filter(measurement: dict | None) -> str | None:
+        """
+        None se o loudness já está dentro da tolerância; loudnorm de duas passadas
+        (linear) com a medição; de uma passada quando não há medição.
+        """
+        target = (measurement or {}).get("target") or MediaProbeService.loudness_target()
+        base = f"loudnorm=I={target['I']}:TP={target['TP']}:LRA={target['LRA']}"
+        if measurement is None:
+            return base
+
+        input_i = measurement.get("input_i")
+        if input_i is None:
+            # Silêncio: nada a normalizar
+            return None
+
+        tolerance = float(getattr(settings, "LOUDNESS_TOLERANCE_LU", 1.0))
+        input_tp = measurement.get("input_tp")
+        if abs(input_i - target["I"]) <= tolerance and (input_tp is None or input_tp <= target["TP"]):
+            return None
+
+        if any(measurement.get(key) is None for key in LOUDNESS_FIELDS):
+            return base
+        return (
+            f"{base}"
+            f":measured_I={measurement['input_i']}"
+            f":measured_TP={measurement['input_tp']}"
+            f":measured_LRA={measurement['input_lra']}"
+            f":measured_thresh={measurement['input_thresh']}"
+            f":offset={measurement['target_offset']}"
+            ":linear=true"
+        )
+
+    @staticmethod
+    def loudness_target() -> dict:
+        return {
+            "I": float(getattr(settings, "LOUDNESS_TARGET_I", -16.0)),
+            "TP": float(getattr(settings, "LOUDNESS_TARGET_TP", -1.5)),
+            "LRA": float(getattr(settings, "LOUDNESS_TARGET_LRA", 11.0)),
+        }
+
+    @staticmethod
+    def resolution(metadata: dict) -> str:
+        """Formata largura x altura (ex: 1920x1080)."""
+        return f"{int(metadata.get('width') or 0)}x{int(metadata.get('height') or 0)}"
+
+    @staticmethod
+    def _cached_probe(source: str, size: int, stamp: str, target, video: Video = None, name: str = None) -> dict:
+        identity = {"source": source, "size": size, "stamp": stamp}
+        cache_key = MediaProbeService._cache_key(identity)
+
+        metadata = cache.get(cache_key)
+        if metadata is None and video is not None and name:
+            entry = (video.media_info or {}).get(name) or {}
+            if {k: entry.get(k) for k in identity} == identity and entry.get("version") == PROBE_SCHEMA_VERSION:
+                metadata = entry.get("probe")
+
+        if metadata is None:
+            metadata = MediaProbeService._run_ffprobe(target() if callable(target) else target)
+        else:
+            logger.debug(f"[probe] Cache hit para {source}")
+
+        cache.set(cache_key, metadata, int(getattr(settings, "MEDIA_PROBE_CACHE_TTL", 86400 * 7)))
+        if video is not None and name:
+            entry = {**identity, "version": PROBE_SCHEMA_VERSION, "probe": metadata}
+            MediaProbeService._persist(video, name, entry)
+        return metadata
+
+    @staticmethod
+    def _persist(video: Video, name: str, entry: dict, field: str = "media_info") -> None:
+        if (getattr(video, field) or {}).get(name) == entry:
+            return
+
+        # Etapas paralelas gravam entradas diferentes (original, normalized): relê o
+        # campo com a linha travada e mescla, em vez de sobrescrever com a cópia em memória
+        with transaction.atomic():
+            current = (
+                Video.objects.select_for_update()
+                .filter(video_id=video.video_id)
+                .values_list(field, flat=True)
+                .first()
+            )
+            values = dict(current or {})
+            values[name] = entry
+            Video.objects.filter(video_id=video.video_id).update(**{field: values})
+        setattr(video, field, values)
+
+    @staticmethod
+    def _cache_key(identity: dict) -> str:
+        digest = hashlib.sha1(json.dumps(identity, sort_keys=True).encode("utf-8")).hexdigest()
+        return f"media_probe:v{PROBE_SCHEMA_VERSION}:{digest}"
+
+    @staticmethod
+    def _run_ffprobe(target: str) -> dict:
+        ffprobe_path = getattr(settings, "FFMPEG_PATH", "ffmpeg").replace("ffmpeg", "ffprobe")
+        timeout = int(getattr(settings, "MEDIA_PROBE_TIMEOUT", 30))
+
+        cmd = [
+            ffprobe_path,
+            "-v", "error",
+            "-print_format", "json",
+            "-show_format",
+            "-show_streams",
+            target,
+        ]
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True, check=True, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            raise Exception(f"Timeout no ffprobe (mais de {timeout}s)")
+        except subprocess.CalledProcessError as e:
+            raise Exception(f"ffprobe falhou: {e.stderr or e}")
+
+        return MediaProbeService._parse(json.loads(result.stdout or "{}"))
+
+    @staticmethod
+    def _parse(data: dict) -> dict:
+        fmt = data.get("format", {}) or {}
+        streams = data.get("streams", []) or []
+
+        v = next((s for s in streams if s.get("codec_type") == "video"), None)
+        a = next((s for s in streams if s.get("codec_type") == "audio"), None)
+
+        duration = fmt.get("duration") or (v or {}).get("duration") or 0
+        try:
+            duration = float(duration)
+        except (TypeError, ValueError):
+            duration = 0.0
+
+        return {
+            "duration": duration,
+            # Duração de cada stream (None quando o container não informa, ex: mkv)
+            "video_duration": MediaProbeService._parse_duration(v),
+            "audio_duration": MediaProbeService._parse_duration(a),
+            "format_name": fmt.get("format_name"),
+            "bit_rate": int(fmt["bit_rate"]) if str(fmt.get("bit_rate") or "").isdigit() else None,
+            "has_video": bool(v),
+            "video_codec": (v or {}).get("codec_name"),
+            "pix_fmt": (v or {}).get("pix_fmt"),
+            "fps": MediaProbeService._parse_fps(v),
+            "width": int((v or {}).get("width") or 0),
+            "height": int((v or {}).get("height") or 0),
+            "has_audio": bool(a),
+            "audio_codec": (a or {}).get("codec_name"),
+            "audio_sample_rate": int((a or {}).get("sample_rate") or 0) or None,
+            "audio_channels": (a or {}).get("channels"),
+        }
+
+    @staticmethod
+    def _parse_duration(stream: dict | None) -> float | None:
+        try:
+            return float((stream or {})["duration"])
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def _parse_fps(stream: dict | None) -> float | None:
+        if not stream:
+            return None
+        # avg_frame_rate vem como "30000/1001" etc.
+        fr = stream.get("avg_frame_rate") or stream.get("r_frame_rate")
+        if not fr or fr == "0/0":
+            return None
+        try:
+            num, den = fr.split("/")
+            den_f = float(den)
+            return float(num) / den_f if den_f else None
+        except Exception:
+            return None
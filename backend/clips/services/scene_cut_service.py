@@ -0,0 +1,152 @@
+"""
+Índice de cortes de cena por vídeo, calculado sobre a pilha de frames amostrados.
+
+A detecção é vetorizada em NumPy: histograma de cor (8 níveis por canal) de
+cada frame, distância L1 entre frames consecutivos e comparação com a mediana
+local (movimento de câmera eleva a distância de vários frames; um corte eleva
+só a de um). O resultado é um array compacto de pares [t_antes, t_depois] —
+último frame amostrado do plano anterior e primeiro do seguinte — gravado no
+índice da pilha, e reaproveitado por select (ajuste das bordas dos clips),
+reframe (reinício da trajetória) e thumbnails (fuga de frames de transição)
+sem decodificar o vídeo de novo.
+"""
+
+import logging
+import numpy as np
+from django.conf import settings
+
+from ..models import Video
+from .frame_cache_service import FrameCacheService
+
+logger = logging.getLogger(__name__)
+
+HIST_LEVELS = 8
+HIST_BINS = HIST_LEVELS ** 3
+# Frames processados por vez (a pilha é memory-mapped; evita carregá-la inteira)
+CHUNK_FRAMES = 256
+# Subamostragem espacial antes do histograma
+PIXEL_STRIDE = 4
+
+
+class SceneCutService:
+    """Detecta e consulta cortes de cena a partir da pilha de frames."""
+
+    @staticmethod
+    def get_params() -> dict:
+        return {
+            "threshold": float(getattr(settings, "SCENE_CUT_THRESHOLD", 0.35) or 0.35),
+            "local_ratio": float(getattr(settings, "SCENE_CUT_LOCAL_RATIO", 2.0) or 0.0),
+            "local_window": int(getattr(settings, "SCENE_CUT_LOCAL_WINDOW", 8) or 8),
+            "min_shot_seconds": float(getattr(settings, "SCENE_MIN_SHOT_SECONDS", 1.0) or 0.0),
+        }
+
+    @staticmethod
+    def detect(frames, timestamps, params: dict = None) -> np.ndarray:
+        """
+        Detecta cortes na sequência de frames amostrados.
+
+        Args:
+            frames: Array/memmap N x H x W x 3 (uint8)
+            timestamps: Instantes (segundos) de cada frame
+            params: Parâmetros (padrão: `get_params()`)
+
+        Returns:
+            Array K x 2 de pares [t_antes, t_depois]
+        """
+        params = params or SceneCutService.get_params()
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        n = min(len(frames), len(timestamps))
+        if n < 2:
+            return np.empty((0, 2))
+
+        hists = np.empty((n, HIST_BINS), dtype=np.float32)
+        shift = 8 - int(np.log2(HIST_LEVELS))
+        for start in range(0, n, CHUNK_FRAMES):
+            chunk = np.asarray(frames[start:min(n, start + CHUNK_FRAMES), ::PIXEL_STRIDE, ::PIXEL_STRIDE])
+            q = (chunk >> shift).astype(np.int32)
+            idx = (q[..., 0] * HIST_LEVELS * HIST_LEVELS + q[..., 1] * HIST_LEVELS + q[..., 2]).reshape(len(chunk), -1)
+            # bincount por frame num único passo: desloca os bins de cada frame
+            offsets = (np.arange(len(chunk)) * HIST_BINS)[:, None]
+            counts = np.bincount((idx + offsets).ravel(), minlength=len(chunk) * HIST_BINS)
+            hists[start:start + len(chunk)] = counts.reshape(len(chunk), HIST_BINS) / idx.shape[1]
+
+        # Distância entre frames consecutivos em [0, 1]
+        diff = 0.5 * np.abs(np.diff(hists, axis=0)).sum(axis=1)
+
+        k = max(1, params["local_window"])
+        windows = np.lib.stride_tricks.sliding_window_view(np.pad(diff, k, mode="edge"), 2 * k + 1)
+        local = np.median(windows, axis=1)
+
+        candidates = np.flatnonzero((diff >= params["threshold"]) & (diff >= params["local_ratio"] * local))
+
+        # Planos mais curtos que o mínimo: fica o corte mais forte
+        kept = []
+        for i in candidates[np.argsort(-diff[candidates], kind="stable")]:
+            t = timestamps[i + 1]
+            if all(abs(t - timestamps[j + 1]) >= params["min_shot_seconds"] for j in kept):
+                kept.append(int(i))
+        kept.sort()
+
+        return np.array([[timestamps[i], timestamps[i + 1]] for i in kept], dtype=np.float64).reshape(-1, 2)
+
+    @staticmethod
+    def get(video: Video, video_dir: str, build: bool = False) -> np.ndarray | None:
+        """
+        Cortes do vídeo, lidos do índice da pilha de frames.
+
+        Args:
+            video: Instância de Video
+            video_dir: Diretório do vídeo em MEDIA_ROOT
+            build: Constrói a pilha (um único decode) se ela ainda não existir
+
+        Returns:
+            Array K x 2 de pares [t_antes, t_depois] ou None se indisponível
+        """
+        index = FrameCacheService.load_index(video, video_dir)
+        if index is None and build:
+            FrameCacheService.ensure(video, video_dir)
+            index = FrameCacheService.load_index(video, video_dir)
+        if index is None:
+            return None
+
+        if index.get("scene_params") == SceneCutService.get_params():
+            return np.asarray(index.get("scene_cuts") or [], dtype=np.float64).reshape(-1, 2)
+
+        # Parâmetros mudaram: recalcula sobre a pilha (sem decodificar)
+        stack = FrameCacheService.load(video, video_dir)
+        if stack is None:
+            return None
+        return SceneCutService.detect(stack["frames"], stack["timestamps"])
+
+    @staticmethod
+    def cuts_between(cuts, start: float, end: float) -> np.ndarray:
+        """Cortes cujo intervalo cai em (start, end)."""
+        if cuts is None or not len(cuts):
+            return np.empty((0, 2))
+        cuts = np.asarray(cuts, dtype=np.float64).reshape(-1, 2)
+        return cuts[(cuts[:, 1] > start) & (cuts[:, 0] < end)]
+
+    @staticmethod
+    def stable_time(cuts, t: float, start: float = 0.0, end: float = None, margin: float = 0.5) -> float:
+        """
+        Instante próximo de `t` longe de transições (para escolher frames de thumbnail).
+
+        Se `t` cai a menos de `margin` de um corte, é puxado para dentro do plano
+        que o contém (ou para o meio dele, se o plano for curto).
+        """
+        end = float(end) if end is not None else float("inf")
+        inside = SceneCutService.cuts_between(cuts, start, end)
+        if not len(inside):
+            return t
+
+        if not np.any((inside[:, 0] - margin <= t) & (t <= inside[:, 1] + margin)):
+            return t
+
+        # Plano que contém t: do fim do corte anterior ao início do seguinte
+        shot_start = max([start] + [b for a, b in inside if (a + b) / 2 <= t])
+        shot_end = min([end] + [a for a, b in inside if (a + b) / 2 > t])
+        if shot_end == float("inf"):
+            return t
+        if shot_end - shot_start <= 2 * margin:
+            return (shot_start + shot_end) / 2
+        return min(max(t, shot_start + margin), shot_end - margin)
@@ -0,0 +1,174 @@
+"""
+Cache de downloads de URLs externas, compartilhado entre jobs e organizações.
+
+A chave é extractor + media ID do yt-dlp (mais a assinatura do seletor de
+formato). O arquivo baixado fica uma única vez no R2 (`source_cache/...`) com
+TTL; jobs seguintes para o mesmo vídeo baixam do R2 em vez de passar de novo
+pelo yt-dlp/proxy.
+"""
+
+import hashlib
+import logging
+import os
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from django.utils import timezone
+
+from ..models import SourceCache
+from .storage_service import R2StorageService
+
+logger = logging.getLogger(__name__)
+
+# Campos do info do yt-dlp preservados para jobs que usam o cache
+INFO_FIELDS = ("id", "extractor_key", "title", "ext", "duration", "uploader", "webpage_url")
+
+
+class SourceCacheService:
+    """Resolve, armazena e recupera downloads de URLs externas por media ID."""
+
+    @staticmethod
+    def enabled() -> bool:
+        return bool(getattr(settings, "SOURCE_CACHE_ENABLED", True))
+
+    @staticmethod
+    def ttl() -> timedelta:
+        return timedelta(hours=int(getattr(settings, "SOURCE_CACHE_TTL_HOURS", 72)))
+
+    @staticmethod
+    def build_key(extractor: str, media_id: str, format_selector: str) -> str:
+        format_sig = hashlib.sha1((format_selector or "").encode("utf-8")).hexdigest()[:12]
+        return f"{(extractor or '').lower()}:{media_id}:{format_sig}"
+
+    @staticmethod
+    def key_from_url(source_url: str, format_selector: str) -> str | None:
+        """
+        Resolve a chave só pela URL (sem rede), via `_VALID_URL` dos extractors do yt-dlp.
+
+        URLs curtas/redirecionadas podem gerar um ID diferente do canônico;
+        nesse caso a busca cai no alias gravado em `store`.
+        """
+        try:
+            from yt_dlp.extractor import gen_extractor_classes
+        except ImportError:
+            return None
+
+        for ie in gen_extractor_classes():
+            if ie.ie_key() == "Generic":
+                continue
+            try:
+                if ie.suitable(source_url):
+                    media_id = ie.get_temp_id(source_url)
+                    return SourceCacheService.build_key(ie.ie_key(), media_id, format_selector) if media_id else None
+            except Exception:
+                continue
+        return None
+
+    @staticmethod
+    def key_from_info(info: dict, format_selector: str) -> str | None:
+        extractor = info.get("extractor_key") or info.get("extractor")
+        media_id = info.get("id")
+        if not extractor or not media_id:
+            return None
+        return SourceCacheService.build_key(extractor, media_id, format_selector)
+
+    @staticmethod
+    def get(cache_key: str | None) -> SourceCache | None:
+        """Retorna a entrada válida para a chave (ou alias), removendo-a se expirada."""
+        if not cache_key or not SourceCacheService.enabled():
+            return None
+
+        cache_key = cache.get(SourceCacheService._alias_key(cache_key)) or cache_key
+        entry = SourceCache.objects.filter(cache_key=cache_key).first()
+        if not entry:
+            return None
+
+        if entry.expires_at <= timezone.now():
+            SourceCacheService._delete(entry)
+            return None
+        return entry
+
+    @staticmethod
+    def fetch(entry: SourceCache, local_path: str, storage: R2StorageService = None) -> str:
+        """
+        Baixa o arquivo cacheado do R2 para `local_path` e renova o TTL.
+
+        Returns:
+            `local_path`
+        """
+        storage = storage or R2StorageService()
+        storage.download_file(entry.storage_path, local_path)
+
+        SourceCache.objects.filter(cache_id=entry.cache_id).update(
+            access_count=F("access_count") + 1,
+            last_accessed=timezone.now(),
+            expires_at=timezone.now() + SourceCacheService.ttl(),
+        )
+        logger.info(f"[source_cache] Hit {entry.cache_key} ({entry.size} bytes) -> {local_path}")
+        return local_path
+
+    @staticmethod
+    def store(
+        cache_key: str,
+        file_path: str,
+        info: dict,
+        aliases: list = None,
+        storage: R2StorageService = None,
+    ) -> SourceCache | None:
+        """
+        Publica o arquivo baixado no R2 e registra a entrada.
+
+        Args:
+            cache_key: Chave canônica (extractor:media_id:formato)
+            file_path: Arquivo baixado pelo yt-dlp
+            info: info do yt-dlp
+            aliases: Outras chaves que devem apontar para esta (ex: ID da URL curta)
+            storage: Instância opcional de R2StorageService
+        """
+        if not cache_key or not SourceCacheService.enabled():
+            return None
+
+        storage = storage or R2StorageService()
+        storage_path = storage.upload_source_cache(file_path, cache_key)
+
+        entry, _ = SourceCache.objects.update_or_create(
+            cache_key=cache_key,
+            defaults={
+                "extractor": (info.get("extractor_key") or info.get("extractor") or "").lower(),
+                "media_id": str(info.get("id") or ""),
+                "info": {k: info.get(k) for k in INFO_FIELDS if info.get(k) is not None},
+                "storage_path": storage_path,
+                "size": os.path.getsize(file_path),
+                "expires_at": timezone.now() + SourceCacheService.ttl(),
+            },
+        )
+
+        ttl_seconds = int(SourceCacheService.ttl().total_seconds())
+        for alias in aliases or []:
+            if alias and alias != cache_key:
+                cache.set(SourceCacheService._alias_key(alias), cache_key, ttl_seconds)
+
+        logger.info(f"[source_cache] Armazenado {cache_key} em {storage_path}")
+        return entry
+
+    @staticmethod
+    def purge_expired(limit: int = 500) -> int:
+        """Remove do R2 e do banco as entradas expiradas. Retorna quantas foram removidas."""
+        removed = 0
+        for entry in SourceCache.objects.filter(expires_at__lte=timezone.now())[:limit]:
+            SourceCacheService._delete(entry)
+            removed += 1
+        return removed
+
+    @staticmethod
+    def _delete(entry: SourceCache) -> None:
+        try:
+            R2StorageService().delete_file(entry.storage_path)
+        except Exception as e:
+            logger.warning(f"[source_cache] Falha ao remover {entry.storage_path} do R2: {e}")
+        entry.delete()
+
+    @staticmethod
+    def _alias_key(cache_key: str) -> str:
+        return f"source_cache:alias:{cache_key}"
@@ -0,0 +1,246 @@
+"""
+Coleta de métricas por etapa (StageRun) a partir dos sinais do Celery.
+
+`core/celery.py` conecta `before_task_publish` (marca o horário de
+enfileiramento), `task_prerun` (snapshot de rusage/IO) e `task_postrun`
+(grava o StageRun). Os contadores são do processo do worker, então os valores
+são precisos no pool prefork (uma task por processo por vez).
+"""
+
+import inspect
+import logging
+import resource
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.utils import timezone
+
+from ..models import Job, Video, StageRun
+
+logger = logging.getLogger(__name__)
+
+ENQUEUED_AT_HEADER = "enqueued_at"
+
+
+class StageMetricsService:
+    """Mede e persiste tempo/recursos de cada execução de task."""
+
+    _inflight: dict = {}
+
+    @staticmethod
+    def enabled() -> bool:
+        return bool(getattr(settings, "STAGE_METRICS_ENABLED", True))
+
+    @staticmethod
+    def mark_enqueued(headers: dict) -> None:
+        """Anota o horário de publicação nos headers da mensagem."""
+        if headers is not None and ENQUEUED_AT_HEADER not in headers:
+            headers[ENQUEUED_AT_HEADER] = time.time()
+
+    @classmethod
+    def start(cls, task_id: str) -> None:
+        """Snapshot dos contadores no início da task."""
+        if not cls.enabled():
+            return
+        cls._reset_peak_rss()
+        cls._inflight[task_id] = {
+            "started": time.time(),
+            "monotonic": time.monotonic(),
+            "self": resource.getrusage(resource.RUSAGE_SELF),
+            "children": resource.getrusage(resource.RUSAGE_CHILDREN),
+            "io": cls._read_proc_io(),
+        }
+
+    @classmethod
+    def finish(cls, task, task_id: str, args, kwargs, state: str, retval) -> StageRun | None:
+        """Calcula os deltas e grava o StageRun. Nunca propaga exceções."""
+        snapshot = cls._inflight.pop(task_id, None)
+        if snapshot is None or not cls.enabled():
+            return None
+
+        try:
+            wall = time.monotonic() - snapshot["monotonic"]
+            usage_self = resource.getrusage(resource.RUSAGE_SELF)
+            usage_children = resource.getrusage(resource.RUSAGE_CHILDREN)
+            io = cls._read_proc_io()
+
+            request = task.request
+            video_id = cls._resolve_video_id(task, args, kwargs)
+            job = None
+            organization_id = None
+            if video_id:
+                job = Job.objects.filter(video_id=video_id).order_by("-created_at").values("job_id", "organization_id").first()
+                organization_id = job["organization_id"] if job else (
+                    Video.objects.filter(video_id=video_id).values_list("organization_id", flat=True).first()
+                )
+
+            return StageRun.objects.create(
+                video_id=video_id,
+                job_id=job["job_id"] if job else None,
+                organization_id=organization_id,
+                stage=cls._resolve_stage(task.name),
+                task_name=task.name,
+                task_id=str(task_id),
+                queue=(getattr(request, "delivery_info", None) or {}).get("routing_key"),
+                worker=getattr(request, "hostname", None),
+                attempt=int(getattr(request, "retries", 0) or 0),
+                status=cls._resolve_status(state, retval),
+                queue_wait_seconds=cls._queue_wait(request, snapshot["started"]),
+                wall_seconds=round(wall, 3),
+                cpu_seconds=round(cls._cpu(usage_self) - cls._cpu(snapshot["self"]), 3),
+                subprocess_cpu_seconds=round(cls._cpu(usage_children) - cls._cpu(snapshot["children"]), 3),
+                peak_rss_bytes=cls._read_peak_rss(usage_self),
+                read_bytes=max(0, io.get("read_bytes", 0) - snapshot["io"].get("read_bytes", 0)),
+                write_bytes=max(0, io.get("write_bytes", 0) - snapshot["io"].get("write_bytes", 0)),
+                started_at=timezone.now() - timedelta(seconds=wall),
+                finished_at=timezone.now(),
+            )
+        except Exception as e:
+            logger.warning(f"[stage_metrics] Falha ao gravar StageRun de {task.name} ({task_id}): {e}")
+            return None
+
+    @staticmethod
+    def get_stage_percentiles(days: int = 7, organization_id=None, stage: str = None) -> dict:
+        """
+        Agrega p50/p95 por etapa das execuções concluídas com sucesso.
+
+        Args:
+            days: Janela em dias
+            organization_id: Filtra por organização (opcional)
+            stage: Filtra por etapa (opcional)
+
+        Returns:
+            {stage: {count, wall_seconds: {p50, p95}, queue_wait_seconds: {...}, ...}}
+        """
+        query = StageRun.objects.filter(
+            status="success",
+            started_at__gte=timezone.now() - timedelta(days=days),
+        )
+        if organization_id:
+            query = query.filter(organization_id=organization_id)
+        if stage:
+            query = query.filter(stage=stage)
+
+        fields = [
+            "queue_wait_seconds",
+            "wall_seconds",
+            "cpu_seconds",
+            "subprocess_cpu_seconds",
+            "peak_rss_bytes",
+            "read_bytes",
+            "write_bytes",
+        ]
+        rows = {}
+        for values in query.values_list("stage", *fields).iterator():
+            columns = rows.setdefault(values[0], {name: [] for name in fields})
+            for name, value in zip(fields, values[1:]):
+                if value is not None:
+                    columns[name].append(value)
+
+        result = {}
+        for stage_name, columns in sorted(rows.items()):
+            result[stage_name] = {"count": len(columns["wall_seconds"])}
+            for name, series in columns.items():
+                series.sort()
+                result[stage_name][name] = {
+                    "p50": StageMetricsService._percentile(series, 50),
+                    "p95": StageMetricsService._percentile(series, 95),
+                }
+        return result
+
+    @staticmethod
+    def _percentile(sorted_values: list, pct: float):
+        if not sorted_values:
+            return None
+        # Interpolação linear entre os vizinhos (mesmo critério do numpy.percentile)
+        k = (len(sorted_values) - 1) * pct / 100.0
+        lo = int(k)
+        hi = min(lo + 1, len(sorted_values) - 1)
+        value = sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+        return round(value, 3)
+
+    @staticmethod
+    def _resolve_stage(task_name: str) -> str:
+        from ..tasks.pipeline import PIPELINE_STAGES
+
+        short_name = task_name.rsplit(".", 1)[-1]
+        for stage, spec in PIPELINE_STAGES.items():
+            if spec["task"][1] == short_name:
+                return stage
+        return short_name[:-5] if short_name.endswith("_task") else short_name
+
+    @staticmethod
+    def _resolve_video_id(task, args, kwargs) -> str | None:
+        try:
+            bound = inspect.signature(task.run).bind_partial(*(args or ()), **(kwargs or {}))
+            video_id = bound.arguments.get("video_id")
+        except (TypeError, ValueError):
+            video_id = (kwargs or {}).get("video_id")
+        return str(video_id) if video_id else None
+
+    @staticmethod
+    def _resolve_status(state: str, retval) -> str:
+        if state == "RETRY":
+            return "retry"
+        if state != "SUCCESS":
+            return "failed"
+        if isinstance(retval, dict):
+            if retval.get("error") or retval.get("status") == "failed":
+                return "failed"
+            if retval.get("status") == "skipped":
+                return "skipped"
+        return "success"
+
+    @staticmethod
+    def _queue_wait(request, started: float) -> float | None:
+        enqueued_at = getattr(request, ENQUEUED_AT_HEADER, None)
+        if not enqueued_at:
+            return None
+
+        ready_at = float(enqueued_at)
+        eta = getattr(request, "eta", None)
+        if eta:
+            try:
+                from datetime import datetime
+                eta_ts = (eta if isinstance(eta, datetime) else datetime.fromisoformat(str(eta))).timestamp()
+                ready_at = max(ready_at, eta_ts)
+            except (TypeError, ValueError):
+                pass
+        return round(max(0.0, started - ready_at), 3)
+
+    @staticmethod
+    def _cpu(usage) -> float:
+        return usage.ru_utime + usage.ru_stime
+
+    @staticmethod
+    def _read_proc_io() -> dict:
+        # Inclui o I/O de filhos já coletados (ffmpeg/ffprobe via subprocess)
+        try:
+            with open("/proc/self/io") as f:
+                return {
+                    key.strip(): int(value)
+                    for key, value in (line.split(":", 1) for line in f if ":" in line)
+                }
+        except (OSError, ValueError):
+            return {}
+
+    @staticmethod
+    def _reset_peak_rss() -> None:
+        # "5" em clear_refs zera o VmHWM do processo (Linux >= 4.0)
+        try:
+            with open("/proc/self/clear_refs", "w") as f:
+                f.write("5")
+        except OSError:
+            pass
+
+    @staticmethod
+    def _read_peak_rss(usage_self) -> int | None:
+        try:
+            with open("/proc/self/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        return int(line.split()[1]) * 1024
+        except (OSError, ValueError, IndexError):
+            pass
+        # Fallback: pico do processo inteiro (KB no Linux)
+        return int(usage_self.ru_maxrss) * 1024 if usage_self else None
@@ -7,14 +7,53 @@ Convenção de nomes de arquivos:
 - Clips: clips/{organization_id}/{video_id}/{clip_id}/clip.mp4
 - Transcrições: transcripts/{organization_id}/{video_id}/transcript.json
 - Legendas ASS: captions/{organization_id}/{video_id}/{clip_id}/caption.ass
+- Artefatos do pipeline: artifacts/{sha256[:2]}/{sha256}
+- Cache de URLs externas: source_cache/{sha1(chave)[:2]}/{sha1(chave)}{ext}
+
+Arquivos acima de `multipart_threshold` sobem/descem em partes paralelas
+(TransferConfig por operação em settings.R2_TRANSFER_CONFIG). O estado do
+multipart é persistido (cache para uploads, `.part.json` para downloads),
+então uma transferência interrompida continua de onde parou.
+
+Uploads multipart são abortados quando o erro é definitivo. Os que ficam
+sem estado (TTL do cache expirado, worker perdido) dependem de uma regra de
+lifecycle no bucket: "Abort incomplete multipart uploads" após
+UPLOAD_STATE_TTL (7 dias), para que as partes órfãs não sigam cobradas.
 """
 
+import hashlib
+import json
+import math
 import os
 import boto3
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Optional, Tuple
+from boto3.s3.transfer import TransferConfig
 from django.conf import settings
+from django.core.cache import cache
 from botocore.exceptions import ClientError
 
+MIN_PART_SIZE = 5 * 1024 * 1024  # mínimo do S3/R2 (exceto a última parte)
+MAX_PARTS = 10000
+UPLOAD_STATE_TTL = 86400 * 7
+# Erros do multipart que um retry não resolve: o upload é abortado e recomeça do zero
+TERMINAL_MULTIPART_ERRORS = {
+    "AccessDenied",
+    "EntityTooLarge",
+    "EntityTooSmall",
+    "InvalidArgument",
+    "InvalidPart",
+    "InvalidPartOrder",
+    "NoSuchBucket",
+    "NoSuchUpload",
+}
+
+DEFAULT_TRANSFER_CONFIG = {
+    "multipart_threshold": 64 * 1024 * 1024,
+    "part_size": 16 * 1024 * 1024,
+    "max_concurrency": 8,
+}
+
 
 class R2StorageService:
     """Serviço para gerenciar uploads/downloads em Cloudflare R2."""
@@ -56,13 +95,14 @@ class R2StorageService:
             Caminho no R2 (storage_path)
         """
         key = f"videos/{organization_id}/{video_id}/{original_filename}"
-        return self._upload_file(file_path, key)
+        return self._upload_file(file_path, key, operation="video")
 
     def upload_thumbnail(
         self,
         file_path: str,
         organization_id: str,
         video_id: str,
+        filename: str = "thumbnail.jpg",
     ) -> str:
         """
         Faz upload de thumbnail para R2.
@@ -71,12 +111,13 @@ class R2StorageService:
             file_path: Caminho local do arquivo
             organization_id: ID da organização
             video_id: ID do vídeo
+            filename: Nome do arquivo (clips usam um nome por clip)
 
         Returns:
             Caminho no R2 (storage_path)
         """
-        key = f"thumbnails/{organization_id}/{video_id}/thumbnail.jpg"
-        return self._upload_file(file_path, key)
+        key = f"thumbnails/{organization_id}/{video_id}/{filename}"
+        return self._upload_file(file_path, key, operation="thumbnail")
 
     def upload_clip(
         self,
@@ -98,7 +139,7 @@ class R2StorageService:
             Caminho no R2 (storage_path)
         """
         key = f"clips/{organization_id}/{video_id}/{clip_id}/clip.mp4"
-        return self._upload_file(file_path, key)
+        return self._upload_file(file_path, key, operation="clip")
 
     def upload_transcript(
         self,
@@ -142,13 +183,119 @@ class R2StorageService:
         key = f"captions/{organization_id}/{video_id}/{clip_id}/caption.ass"
         return self._upload_file(file_path, key)
 
-    def _upload_file(self, file_path: str, key: str) -> str:
+    def upload_artifact(self, file_path: str, content_hash: str) -> str:
+        """
+        Faz upload de artefato endereçado por conteúdo (idempotente).
+
+        Args:
+            file_path: Caminho local do arquivo
+            content_hash: sha256 do conteúdo
+
+        Returns:
+            Caminho no R2 (storage_path)
+        """
+        key = f"artifacts/{content_hash[:2]}/{content_hash}"
+        if self.file_exists(key):
+            return key
+        return self._upload_file(file_path, key, operation="artifact")
+
+    def upload_source_cache(self, file_path: str, cache_key: str) -> str:
+        """
+        Faz upload de um download de URL externa para o cache compartilhado.
+
+        Args:
+            file_path: Caminho local do arquivo
+            cache_key: Chave do cache (extractor:media_id:formato)
+
+        Returns:
+            Caminho no R2 (storage_path)
+        """
+        key_hash = hashlib.sha1(cache_key.encode("utf-8")).hexdigest()
+        ext = os.path.splitext(file_path)[1] or ".mp4"
+        key = f"source_cache/{key_hash[:2]}/{key_hash}{ext}"
+        return self._upload_file(file_path, key, operation="video")
+
+    def get_transfer_config(self, operation: str = "default", **overrides) -> TransferConfig:
+        """
+        Monta o TransferConfig de uma operação.
+
+        Combina DEFAULT_TRANSFER_CONFIG, settings.R2_TRANSFER_CONFIG["default"],
+        settings.R2_TRANSFER_CONFIG[operation] e `overrides` (nessa ordem).
+
+        Args:
+            operation: Nome da operação (video, clip, artifact, download, ...)
+            **overrides: multipart_threshold, part_size, max_concurrency
+
+        Returns:
+            TransferConfig
+        """
+        configured = getattr(settings, "R2_TRANSFER_CONFIG", None) or {}
+        options = {
+            **DEFAULT_TRANSFER_CONFIG,
+            **(configured.get("default") or {}),
+            **(configured.get(operation) or {}),
+            **{k: v for k, v in overrides.items() if v is not None},
+        }
+        return TransferConfig(
+            multipart_threshold=int(options["multipart_threshold"]),
+            multipart_chunksize=max(MIN_PART_SIZE, int(options["part_size"])),
+            max_concurrency=max(1, int(options["max_concurrency"])),
+        )
+
+    def upload_fileobj(
+        self,
+        fileobj,
+        key: str,
+        content_type: str = None,
+        transfer_config: TransferConfig = None,
+    ) -> str:
+        """
+        Faz upload de um objeto file-like (ex: stdout de um processo) para R2.
+
+        O conteúdo é lido em partes conforme o TransferConfig, sem precisar do
+        arquivo inteiro em disco ou memória.
+
+        Args:
+            fileobj: Objeto com `read()` em modo binário
+            key: Chave no R2 (path)
+            content_type: Content-Type opcional
+            transfer_config: TransferConfig (padrão: operação "stream")
+
+        Returns:
+            Caminho no R2 (key)
+
+        Raises:
+            Exception: Se upload falhar
+        """
+        try:
+            self.client.upload_fileobj(
+                fileobj,
+                self.bucket_name,
+                key,
+                ExtraArgs={"ContentType": content_type} if content_type else None,
+                Config=transfer_config or self.get_transfer_config("stream"),
+            )
+            return key
+        except ClientError as e:
+            raise Exception(f"Erro ao fazer upload para R2: {e}") from e
+
+    def _upload_file(
+        self,
+        file_path: str,
+        key: str,
+        operation: str = "default",
+        transfer_config: TransferConfig = None,
+    ) -> str:
         """
         Faz upload de arquivo local para R2.
 
+        Acima do `multipart_threshold`, usa multipart retomável.
+
         Args:
             file_path: Caminho local do arquivo
             key: Chave no R2 (path)
+            operation: Nome da operação para o TransferConfig
+            transfer_config: TransferConfig explícito (sobrepõe `operation`)
 
         Returns:
             Caminho no R2 (key)
@@ -156,7 +303,12 @@ class R2StorageService:
         Raises:
             Exception: Se upload falhar
         """
+        config = transfer_config or self.get_transfer_config(operation)
         try:
+            size = os.path.getsize(file_path)
+            if size >= config.multipart_threshold:
+                return self._resumable_multipart_upload(file_path, key, size, config)
+
             with open(file_path, "rb") as f:
                 self.client.put_object(
                     Bucket=self.bucket_name,
@@ -169,27 +321,237 @@ class R2StorageService:
         except FileNotFoundError as e:
             raise Exception(f"Arquivo não encontrado: {file_path}") from e
 
-    def download_file(self, key: str, local_path: str) -> None:
+    def _resumable_multipart_upload(self, file_path: str, key: str, size: int, config: TransferConfig) -> str:
+        # Estado (upload_id, part_size) fica no cache, chaveado pela identidade do arquivo:
+        # um retry da task reaproveita as partes já enviadas (list_parts).
+        st = os.stat(file_path)
+        identity = f"{self.bucket_name}|{key}|{os.path.abspath(file_path)}|{size}|{st.st_mtime_ns}"
+        state_key = f"r2:multipart:{hashlib.sha1(identity.encode('utf-8')).hexdigest()}"
+
+        state = cache.get(state_key)
+        done = {}
+        if state:
+            try:
+                done = self._list_uploaded_parts(key, state["upload_id"])
+                print(f"[R2StorageService] Retomando multipart de {key}: {len(done)} parte(s) já enviadas")
+            except ClientError:
+                self._abort_multipart_upload(key, state["upload_id"])
+                state = None
+                done = {}
+
+        if not state:
+            part_size = max(config.multipart_chunksize, math.ceil(size / MAX_PARTS))
+            upload = self.client.create_multipart_upload(Bucket=self.bucket_name, Key=key)
+            state = {"upload_id": upload["UploadId"], "part_size": part_size}
+            cache.set(state_key, state, UPLOAD_STATE_TTL)
+
+        upload_id = state["upload_id"]
+        part_size = state["part_size"]
+        num_parts = max(1, math.ceil(size / part_size))
+        missing = [n for n in range(1, num_parts + 1) if n not in done]
+
+        try:
+            with ThreadPoolExecutor(max_workers=config.max_concurrency) as pool:
+                futures = {
+                    pool.submit(self._upload_part, file_path, key, upload_id, n, part_size): n
+                    for n in missing
+                }
+                for future in as_completed(futures):
+                    done[futures[future]] = future.result()
+
+            self.client.complete_multipart_upload(
+                Bucket=self.bucket_name,
+                Key=key,
+                UploadId=upload_id,
+                MultipartUpload={"Parts": [{"PartNumber": n, "ETag": done[n]} for n in sorted(done)]},
+            )
+        except ClientError as e:
+            # Erros transitórios mantêm o estado para o retry retomar; definitivos liberam as partes
+            if e.response.get("Error", {}).get("Code") in TERMINAL_MULTIPART_ERRORS:
+                self._abort_multipart_upload(key, upload_id)
+                cache.delete(state_key)
+            raise
+        cache.delete(state_key)
+        return key
+
+    def _abort_multipart_upload(self, key: str, upload_id: str) -> None:
+        try:
+            self.client.abort_multipart_upload(Bucket=self.bucket_name, Key=key, UploadId=upload_id)
+            print(f"[R2StorageService] Multipart de {key} abortado ({upload_id})")
+        except ClientError as e:
+            # NoSuchUpload: já concluído/abortado; o resto fica para a regra de lifecycle
+            print(f"[R2StorageService] Não foi possível abortar multipart de {key}: {e}")
+
+    def _upload_part(self, file_path: str, key: str, upload_id: str, part_number: int, part_size: int) -> str:
+        with open(file_path, "rb") as f:
+            f.seek((part_number - 1) * part_size)
+            data = f.read(part_size)
+        response = self.client.upload_part(
+            Bucket=self.bucket_name,
+            Key=key,
+            UploadId=upload_id,
+            PartNumber=part_number,
+            Body=data,
+        )
+        return response["ETag"]
+
+    def _list_uploaded_parts(self, key: str, upload_id: str) -> dict:
+        parts = {}
+        paginator = self.client.get_paginator("list_parts")
+        for page in paginator.paginate(Bucket=self.bucket_name, Key=key, UploadId=upload_id):
+            for part in page.get("Parts", []):
+                parts[part["PartNumber"]] = part["ETag"]
+        return parts
+
+    def download_file(self, key: str, local_path: str, operation: str = "download", transfer_config: TransferConfig = None) -> None:
         """
         Faz download de arquivo do R2 para local.
 
+        Acima do `multipart_threshold`, baixa intervalos em paralelo para
+        `{local_path}.part`, registrando as partes concluídas em
+        `{local_path}.part.json`; uma nova chamada continua de onde parou
+        (desde que o ETag do objeto não tenha mudado).
+
         Args:
             key: Chave no R2
             local_path: Caminho local para salvar
+            operation: Nome da operação para o TransferConfig
+            transfer_config: TransferConfig explícito (sobrepõe `operation`)
 
         Raises:
             Exception: Se download falhar
         """
+        config = transfer_config or self.get_transfer_config(operation)
         try:
             os.makedirs(os.path.dirname(local_path), exist_ok=True)
+            info = self.get_object_info(key)
+            if info and info["size"] >= config.multipart_threshold:
+                self._resumable_ranged_download(key, local_path, info, config)
+                return
+
             self.client.download_file(
                 self.bucket_name,
                 key,
                 local_path,
+                Config=config,
             )
         except ClientError as e:
             raise Exception(f"Erro ao fazer download do R2: {e}") from e
 
+    def _resumable_ranged_download(self, key: str, local_path: str, info: dict, config: TransferConfig) -> None:
+        part_path = f"{local_path}.part"
+        state_path = f"{part_path}.json"
+        size = info["size"]
+
+        state = None
+        if os.path.exists(part_path) and os.path.exists(state_path):
+            try:
+                with open(state_path) as f:
+                    state = json.load(f)
+            except (OSError, ValueError):
+                state = None
+            if state and (state.get("etag") != info["etag"] or state.get("size") != size):
+                state = None
+
+        if state:
+            print(f"[R2StorageService] Retomando download de {key}: {len(state['done'])} parte(s) já baixadas")
+        else:
+            state = {"etag": info["etag"], "size": size, "part_size": config.multipart_chunksize, "done": []}
+            with open(part_path, "wb") as f:
+                f.truncate(size)
+            self._write_download_state(state_path, state)
+
+        part_size = state["part_size"]
+        num_parts = max(1, math.ceil(size / part_size))
+        done = set(state["done"])
+        missing = [n for n in range(num_parts) if n not in done]
+
+        fd = os.open(part_path, os.O_WRONLY)
+        try:
+            def _fetch(index: int) -> int:
+                start = index * part_size
+                end = min(start + part_size, size) - 1
+                data = self.read_range(key, start, end)
+                if len(data) != end - start + 1:
+                    raise Exception(f"Intervalo incompleto do R2 ({key} bytes={start}-{end})")
+                os.pwrite(fd, data, start)
+                return index
+
+            with ThreadPoolExecutor(max_workers=config.max_concurrency) as pool:
+                for future in as_completed([pool.submit(_fetch, n) for n in missing]):
+                    done.add(future.result())
+                    state["done"] = sorted(done)
+                    self._write_download_state(state_path, state)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+        os.replace(part_path, local_path)
+        os.remove(state_path)
+
+    @staticmethod
+    def _write_download_state(state_path: str, state: dict) -> None:
+        tmp_path = f"{state_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, state_path)
+
+    def read_range(self, key: str, start: int, end: int) -> bytes:
+        """
+        Lê os bytes [start, end] (inclusivo) de um objeto no R2.
+
+        Raises:
+            Exception: Se a leitura falhar
+        """
+        try:
+            response = self.client.get_object(Bucket=self.bucket_name, Key=key, Range=f"bytes={start}-{end}")
+            return response["Body"].read()
+        except ClientError as e:
+            raise Exception(f"Erro ao ler intervalo do R2: {e}") from e
+
+    def iter_object_chunks(self, key: str, size: int = None, chunk_size: int = None, read_ahead: int = None):
+        """
+        Itera o conteúdo de um objeto em ordem, via GETs com Range em paralelo.
+
+        Mantém até `read_ahead` intervalos em voo, para que o consumidor (ex:
+        stdin do ffmpeg) processe um chunk enquanto os próximos chegam.
+
+        Args:
+            key: Chave no R2
+            size: Tamanho do objeto (evita um HEAD extra)
+            chunk_size: Bytes por GET (padrão: settings.INGEST_STREAM_CHUNK_BYTES)
+            read_ahead: GETs simultâneos (padrão: settings.INGEST_STREAM_READ_AHEAD)
+
+        Yields:
+            bytes de cada intervalo, em ordem
+        """
+        from collections import deque
+        from concurrent.futures import ThreadPoolExecutor
+
+        if size is None:
+            info = self.get_object_info(key)
+            if not info:
+                raise Exception(f"Objeto não encontrado no R2: {key}")
+            size = info["size"]
+
+        chunk_size = int(chunk_size or getattr(settings, "INGEST_STREAM_CHUNK_BYTES", 8 * 1024 * 1024))
+        read_ahead = max(1, int(read_ahead or getattr(settings, "INGEST_STREAM_READ_AHEAD", 4)))
+        ranges = iter([(start, min(start + chunk_size, size) - 1) for start in range(0, size, chunk_size)])
+
+        with ThreadPoolExecutor(max_workers=read_ahead) as pool:
+            pending = deque()
+            for start, end in ranges:
+                pending.append(pool.submit(self.read_range, key, start, end))
+                if len(pending) >= read_ahead:
+                    break
+
+            while pending:
+                data = pending.popleft().result()
+                next_range = next(ranges, None)
+                if next_range:
+                    pending.append(pool.submit(self.read_range, key, *next_range))
+                yield data
+
     def get_public_url(self, key: str) -> str:
         """
         Gera URL pública fixa para acessar arquivo no R2.
@@ -305,3 +667,21 @@ class R2StorageService:
             if e.response["Error"]["Code"] == "404":
                 return False
             raise Exception(f"Erro ao verificar arquivo no R2: {e}") from e
+
+    def get_object_info(self, key: str) -> Optional[dict]:
+        """
+        Retorna tamanho e ETag de um objeto no R2.
+
+        Args:
+            key: Chave no R2
+
+        Returns:
+            {"size": int, "etag": str} ou None se não existir
+        """
+        try:
+            head = self.client.head_object(Bucket=self.bucket_name, Key=key)
+            return {"size": int(head.get("ContentLength") or 0), "etag": (head.get("ETag") or "").strip('"')}
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey"):
+                return None
+            raise Exception(f"Erro ao consultar arquivo no R2: {e}") from e
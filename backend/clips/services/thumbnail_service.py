@@ -0,0 +1,210 @@
+"""
+Escolha da melhor thumbnail entre K frames candidatos, lidos da pilha de frames.
+
+Os candidatos de uma janela (o vídeo inteiro ou um clip) são espaçados no
+tempo, longe de cortes de cena, e pontuados em lote com NumPy: nitidez
+(variância do Laplaciano), exposição (brilho médio, contraste e pixels
+estourados) e presença de rosto. Thumbnail do vídeo e de todos os clips saem
+da mesma pilha, sem abrir o vídeo de novo para escolher.
+
+A pilha tem resolução de análise; o frame escolhido é gravado a partir do
+vídeo normalizado (um único seek do ffmpeg) quando ele está disponível.
+"""
+
+import logging
+import os
+import subprocess
+import numpy as np
+from django.conf import settings
+
+from .frame_cache_service import FrameCacheService
+from .scene_cut_service import SceneCutService
+
+logger = logging.getLogger(__name__)
+
+SCORE_WEIGHTS = {
+    "sharpness": 0.45,
+    "brightness": 0.2,
+    "contrast": 0.1,
+    "face": 0.25,
+    "clipped": 0.3,
+}
+
+# Trecho da janela ignorado nas bordas (início/fim costumam ter transições e fades)
+EDGE_FRACTION = 0.1
+CUT_MARGIN_SECONDS = 0.5
+
+
+class ThumbnailService:
+    """Pontua frames candidatos e grava a thumbnail escolhida."""
+
+    @staticmethod
+    def get_candidate_count() -> int:
+        return max(1, int(getattr(settings, "THUMBNAIL_CANDIDATES", 12) or 12))
+
+    @staticmethod
+    def candidate_times(start: float, end: float, cuts=None, k: int = None) -> np.ndarray:
+        """K instantes espaçados em [start, end], sem os que caem perto de cortes."""
+        k = k or ThumbnailService.get_candidate_count()
+        span = max(0.0, end - start)
+        times = np.linspace(start + span * EDGE_FRACTION, end - span * EDGE_FRACTION, k)
+
+        inside = SceneCutService.cuts_between(cuts, start, end)
+        if len(inside):
+            near = (
+                (times[:, None] >= inside[:, 0] - CUT_MARGIN_SECONDS)
+                & (times[:, None] <= inside[:, 1] + CUT_MARGIN_SECONDS)
+            ).any(axis=1)
+            if not near.all():
+                times = times[~near]
+            else:
+                times = np.array([SceneCutService.stable_time(cuts, (start + end) / 2, start, end)])
+        return times
+
+    @staticmethod
+    def score(frames: np.ndarray, faces=None) -> np.ndarray:
+        """
+        Pontua um lote de frames BGR (K x H x W x 3).
+
+        Args:
+            frames: Candidatos (mesmo tamanho)
+            faces: Presença de rosto por candidato (opcional)
+
+        Returns:
+            Array com a pontuação de cada candidato (maior é melhor)
+        """
+        frames = np.asarray(frames, dtype=np.float32)
+        gray = frames[..., 0] * 0.114 + frames[..., 1] * 0.587 + frames[..., 2] * 0.299
+
+        laplacian = (
+            gray[:, :-2, 1:-1] + gray[:, 2:, 1:-1] + gray[:, 1:-1, :-2] + gray[:, 1:-1, 2:]
+            - 4.0 * gray[:, 1:-1, 1:-1]
+        )
+        sharpness = laplacian.reshape(len(frames), -1).var(axis=1)
+        sharpness = sharpness / max(float(sharpness.max()), 1e-6)
+
+        mean = gray.reshape(len(frames), -1).mean(axis=1) / 255.0
+        brightness = 1.0 - np.minimum(1.0, np.abs(mean - 0.45) / 0.45)
+        contrast = np.minimum(1.0, gray.reshape(len(frames), -1).std(axis=1) / 64.0)
+        clipped = ((gray < 12) | (gray > 245)).reshape(len(frames), -1).mean(axis=1)
+
+        face = np.zeros(len(frames)) if faces is None else np.asarray(faces, dtype=np.float64)
+
+        return (
+            SCORE_WEIGHTS["sharpness"] * sharpness
+            + SCORE_WEIGHTS["brightness"] * brightness
+            + SCORE_WEIGHTS["contrast"] * contrast
+            + SCORE_WEIGHTS["face"] * face
+            - SCORE_WEIGHTS["clipped"] * clipped
+        )
+
+    @staticmethod
+    def best_frame(stack: dict, times, faces=None, crop_xs=None, crop_box: dict = None) -> tuple:
+        """
+        Melhor candidato da pilha entre `times`.
+
+        Args:
+            stack: Pilha (FrameCacheService.load)
+            times: Instantes candidatos (segundos)
+            faces: Presença de rosto por candidato (opcional)
+            crop_xs: x do recorte por candidato, em coordenadas do vídeo normalizado
+            crop_box: Recorte (width/height/y) em coordenadas do vídeo normalizado
+
+        Returns:
+            (instante escolhido, frame BGR)
+        """
+        frames = []
+        for i, t in enumerate(times):
+            frame = FrameCacheService.frame_at(stack, t)
+            if crop_box:
+                box = FrameCacheService.scale_box(
+                    stack, {**crop_box, "x": crop_xs[i] if crop_xs is not None else crop_box.get("x")}
+                )
+                frame = frame[box["y"]:box["y"] + box["height"], box["x"]:box["x"] + box["width"]]
+            frames.append(frame)
+
+        # Recortes na borda podem perder 1px no arredondamento: iguala antes de empilhar
+        h = min(f.shape[0] for f in frames)
+        w = min(f.shape[1] for f in frames)
+        batch = np.stack([f[:h, :w] for f in frames])
+
+        scores = ThumbnailService.score(batch, faces)
+        best = int(np.argmax(scores))
+        return float(times[best]), batch[best]
+
+    @staticmethod
+    def save(
+        frame,
+        output_path: str,
+        source_path: str = None,
+        ts: float = None,
+        crop_box: dict = None,
+        max_dim: int = None,
+        quality: int = 85,
+    ) -> str:
+        """
+        Grava a thumbnail do instante escolhido em resolução cheia.
+
+        Args:
+            frame: Frame da pilha (fallback se o vídeo não puder ser lido)
+            output_path: Caminho do JPEG
+            source_path: Vídeo normalizado local (opcional)
+            ts: Instante escolhido (segundos)
+            crop_box: Recorte (x/y/width/height) em coordenadas do vídeo normalizado
+            max_dim: Maior lado máximo
+            quality: Qualidade JPEG (0-100)
+
+        Returns:
+            `output_path`
+        """
+        if source_path and ts is not None and os.path.exists(source_path):
+            try:
+                return ThumbnailService._extract(source_path, ts, output_path, crop_box, max_dim, quality)
+            except Exception as e:
+                logger.warning(f"[thumbnail] Extração em resolução cheia falhou; usando o frame da pilha: {e}")
+        return ThumbnailService.write(frame, output_path, max_dim=max_dim, quality=quality)
+
+    @staticmethod
+    def _extract(source_path: str, ts: float, output_path: str, crop_box: dict = None, max_dim: int = None, quality: int = 85) -> str:
+        filters = []
+        if crop_box:
+            filters.append(
+                f"crop={int(crop_box['width'])}:{int(crop_box['height'])}:{max(0, int(crop_box.get('x') or 0))}:{max(0, int(crop_box.get('y') or 0))}"
+            )
+        if max_dim:
+            filters.append(f"scale='min({max_dim},iw)':'min({max_dim},ih)':force_original_aspect_ratio=decrease")
+
+        # -q:v do mjpeg vai de 2 (melhor) a 31
+        qscale = max(2, min(31, int(round((100 - quality) / 5.0)) + 1))
+
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        cmd = [
+            getattr(settings, "FFMPEG_PATH", "ffmpeg"),
+            "-nostdin", "-hide_banner", "-loglevel", "error",
+            "-ss", f"{max(0.0, float(ts)):.3f}",
+            "-i", source_path,
+            "-frames:v", "1",
+            *(["-vf", ",".join(filters)] if filters else []),
+            "-q:v", str(qscale),
+            "-y",
+            output_path,
+        ]
+        subprocess.run(cmd, capture_output=True, text=True, check=True, timeout=60)
+        if not os.path.exists(output_path) or not os.path.getsize(output_path):
+            raise Exception(f"ffmpeg não gerou {output_path}")
+        return output_path
+
+    @staticmethod
+    def write(frame, output_path: str, max_dim: int = None, quality: int = 85) -> str:
+        import cv2
+
+        if max_dim:
+            height, width = frame.shape[:2]
+            ratio = min(max_dim / width, max_dim / height, 1.0)
+            if ratio < 1.0:
+                frame = cv2.resize(frame, (int(width * ratio), int(height * ratio)), interpolation=cv2.INTER_AREA)
+
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        if not cv2.imwrite(output_path, np.ascontiguousarray(frame), [cv2.IMWRITE_JPEG_QUALITY, quality]):
+            raise Exception(f"Falha ao gravar thumbnail em {output_path}")
+        return output_path
@@ -0,0 +1,120 @@
+"""
+Registro de modelos Whisper residentes no processo do worker.
+
+Mantém os modelos carregados entre tasks (chave: modelo, device, dtype) com
+limite de modelos residentes e despejo LRU, evitando `whisper.load_model`
+a cada vídeo.
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class WhisperModelService:
+    """Cache LRU de modelos Whisper por processo."""
+
+    _models: "OrderedDict[tuple, object]" = OrderedDict()
+    _lock = threading.Lock()
+    _stats = {"loads": 0, "hits": 0, "evictions": 0}
+
+    @staticmethod
+    def resolve_key(model_size: str = None) -> tuple:
+        """
+        Resolve a chave (modelo, device, dtype) para a configuração atual.
+
+        Args:
+            model_size: Nome do modelo (padrão: settings.WHISPER_MODEL)
+
+        Returns:
+            Tupla (model_size, device, dtype)
+        """
+        import torch
+
+        model_size = model_size or getattr(settings, "WHISPER_MODEL", None) or "small"
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+        use_fp16 = bool(getattr(settings, "WHISPER_FP16", True)) if device == "cuda" else False
+        dtype = "fp16" if use_fp16 else "fp32"
+        return model_size, device, dtype
+
+    @classmethod
+    def get_model(cls, model_size: str = None):
+        """
+        Retorna o modelo residente, carregando-o apenas em caso de miss.
+
+        Args:
+            model_size: Nome do modelo (padrão: settings.WHISPER_MODEL)
+
+        Returns:
+            Tupla (model, key)
+        """
+        try:
+            import whisper
+        except ImportError:
+            raise Exception("Instale: pip install openai-whisper torch")
+
+        key = cls.resolve_key(model_size)
+
+        with cls._lock:
+            model = cls._models.get(key)
+            if model is not None:
+                cls._models.move_to_end(key)
+                cls._stats["hits"] += 1
+                return model, key
+
+            model_name, device, _ = key
+            logger.info(f"Carregando Whisper modelo '{model_name}' em '{device}'...")
+            model = whisper.load_model(model_name, device=device)
+            cls._stats["loads"] += 1
+
+            cls._models[key] = model
+            cls._evict_locked()
+            return model, key
+
+    @classmethod
+    def warm(cls, model_sizes: list = None) -> None:
+        """Pré-carrega modelos (usado no `worker_process_init`)."""
+        names = model_sizes or [getattr(settings, "WHISPER_MODEL", None) or "small"]
+        for name in names:
+            try:
+                cls.get_model(name)
+            except Exception as e:
+                logger.warning(f"[whisper] Falha ao pré-carregar modelo '{name}': {e}")
+
+    @classmethod
+    def discard(cls, key: tuple) -> None:
+        """Remove um modelo do cache (ex: após OOM na GPU)."""
+        with cls._lock:
+            cls._models.pop(key, None)
+        cls._release_device_memory(key)
+
+    @classmethod
+    def get_stats(cls) -> dict:
+        """Retorna contadores de loads/hits/evictions e modelos residentes."""
+        with cls._lock:
+            return {
+                **cls._stats,
+                "resident": [list(k) for k in cls._models.keys()],
+            }
+
+    @classmethod
+    def _evict_locked(cls) -> None:
+        max_resident = max(1, int(getattr(settings, "WHISPER_MAX_RESIDENT_MODELS", 1) or 1))
+        while len(cls._models) > max_resident:
+            key, _ = cls._models.popitem(last=False)
+            cls._stats["evictions"] += 1
+            logger.info(f"[whisper] Modelo despejado do cache: {key}")
+            cls._release_device_memory(key)
+
+    @staticmethod
+    def _release_device_memory(key: tuple) -> None:
+        if key[1] != "cuda":
+            return
+        try:
+            import torch
+            torch.cuda.empty_cache()
+        except Exception:
+            pass
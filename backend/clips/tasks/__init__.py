@@ -1,21 +1,25 @@
 from .download_video_task import download_video_task
+from .acquire_audio_task import acquire_audio_task
 from .extract_thumbnail_task import extract_thumbnail_task
 from .normalize_video_task import normalize_video_task
-from .transcribe_video_task import transcribe_video_task
+from .transcribe_video_task import transcribe_video_task, transcribe_shard_task, merge_transcript_shards_task
 from .analyze_semantic_task import analyze_semantic_task
 from .embed_classify_task import embed_classify_task
 from .select_clips_task import select_clips_task
 from .reframe_video_task import reframe_video_task
 from .clip_scoring_task import clip_scoring_task
 from .caption_clips_task import caption_clips_task
-from .clip_generation_task import clip_generation_task
+from .clip_generation_task import clip_generation_task, render_clip_task, finalize_clip_generation_task
 from .post_to_social_task import post_to_social_task
 
 __all__ = (
     "download_video_task",
+    "acquire_audio_task",
     "extract_thumbnail_task",
     "normalize_video_task",
     "transcribe_video_task",
+    "transcribe_shard_task",
+    "merge_transcript_shards_task",
     "analyze_semantic_task",
     "embed_classify_task",
     "select_clips_task",
@@ -23,5 +27,7 @@ __all__ = (
     "clip_scoring_task",
     "caption_clips_task",
     "clip_generation_task",
+    "render_clip_task",
+    "finalize_clip_generation_task",
     "post_to_social_task",
 )
@@ -0,0 +1,127 @@
+import logging
+import os
+import shutil
+from celery import shared_task
+from django.conf import settings
+
+from ..models import Video
+from ..services.artifact_service import ArtifactService
+from ..services.download_scheduler_service import DownloadSchedulerService, DownloadThrottledError
+from .pipeline import advance_pipeline, is_stage_dispatched
+from .download_video_task import (
+    NonRetryableDownloadError,
+    _apply_download_lease,
+    _find_downloaded_media_file,
+    _yt_dlp_error,
+)
+
+logger = logging.getLogger(__name__)
+
+AUDIO_EXTENSIONS = (".m4a", ".mp4", ".webm", ".opus", ".ogg", ".mp3", ".aac")
+
+
+@shared_task(bind=True, max_retries=2)
+def acquire_audio_task(self, video_id: str) -> dict:
+    """
+    Baixa só a faixa de áudio de uma URL externa e libera a transcrição.
+
+    Roda em paralelo ao download_video_task. Se o vídeo normalizado chegar
+    antes, a transcrição já terá sido disparada por ele e o áudio é descartado.
+    Falhas aqui não falham o vídeo: o caminho normal (normalize -> transcribe)
+    continua valendo.
+    """
+    download_dir = None
+    try:
+        video = Video.objects.get(video_id=video_id)
+        if not video.source_url:
+            return {"video_id": str(video.video_id), "status": "skipped"}
+        if is_stage_dispatched(video_id, "transcribe"):
+            logger.info(f"[audio] Transcrição já disparada para video_id={video_id}; áudio dispensado")
+            return {"video_id": str(video.video_id), "status": "skipped"}
+
+        video_dir = os.path.join(settings.MEDIA_ROOT, f"videos/{video_id}")
+        download_dir = os.path.join(video_dir, "_yt_dlp_audio")
+        shutil.rmtree(download_dir, ignore_errors=True)
+        os.makedirs(download_dir, exist_ok=True)
+
+        downloaded_path, info = _download_audio(video.source_url, download_dir)
+
+        ext = os.path.splitext(downloaded_path)[1] or ".m4a"
+        audio_path = os.path.join(video_dir, f"audio_source{ext}")
+        shutil.move(downloaded_path, audio_path)
+
+        # Sem o vídeo ainda, a duração vem do yt-dlp (usada no sharding da transcrição).
+        # update() em vez de save(): o download_video_task grava a mesma linha em paralelo.
+        duration = info.get("duration")
+        if duration:
+            Video.objects.filter(video_id=video.video_id, duration__isnull=True).update(duration=float(duration))
+
+        if is_stage_dispatched(video_id, "transcribe"):
+            logger.info(f"[audio] Vídeo normalizado chegou antes; descartando áudio de video_id={video_id}")
+            os.remove(audio_path)
+            return {"video_id": str(video.video_id), "status": "skipped"}
+
+        ArtifactService.publish(video, "audio", audio_path)
+        logger.info(f"[audio] Áudio pronto para video_id={video_id}: {audio_path}")
+
+        dispatched = advance_pipeline(str(video.video_id), "audio")
+        return {"video_id": str(video.video_id), "status": "audio_ready", "dispatched": dispatched}
+
+    except Video.DoesNotExist:
+        return {"error": "Video not found", "status": "failed"}
+    except DownloadThrottledError as e:
+        # Plataforma sem vaga: o download completo já está na fila e cobre a transcrição
+        logger.info(f"[audio] {e}; seguindo sem áudio antecipado para video_id={video_id}")
+        return {"video_id": str(video_id), "status": "skipped", "detail": "throttled"}
+    except Exception as e:
+        if not isinstance(e, NonRetryableDownloadError) and self.request.retries < self.max_retries:
+            raise self.retry(exc=e, countdown=2 ** self.request.retries)
+
+        logger.warning(f"[audio] Falha ao baixar áudio de video_id={video_id}; seguindo pelo vídeo normalizado: {e}")
+        return {"video_id": str(video_id), "status": "skipped", "detail": str(e)}
+
+    finally:
+        if download_dir:
+            shutil.rmtree(download_dir, ignore_errors=True)
+
+
+def _download_audio(source_url: str, download_dir: str) -> tuple:
+    try:
+        import yt_dlp
+    except ImportError:
+        raise Exception("yt-dlp não está instalado. Adicione à requirements.txt")
+
+    ydl_opts = {
+        "format": getattr(settings, "AUDIO_FIRST_FORMAT", "ba[ext=m4a]/ba"),
+        "outtmpl": os.path.join(download_dir, "audio.%(ext)s"),
+        "noplaylist": True,
+        "retries": 3,
+        "fragment_retries": 3,
+        "socket_timeout": 30,
+        "consoletitle": False,
+        "quiet": True,
+        "no_warnings": True,
+    }
+
+    # Sem espera: se a plataforma estiver no limite, o áudio antecipado não compensa
+    lease = DownloadSchedulerService.acquire(source_url, wait_seconds=0)
+    _apply_download_lease(ydl_opts, lease)
+
+    outcome, error_message = "error", None
+    try:
+        logger.info(f"[audio] Baixando faixa de áudio via yt-dlp: {source_url}")
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            info = ydl.extract_info(source_url, download=True)
+        outcome = "ok"
+    except yt_dlp.utils.DownloadError as e:
+        error = _yt_dlp_error(str(e), source_url)
+        outcome = "source" if isinstance(error, NonRetryableDownloadError) else "error"
+        error_message = str(e)
+        raise error
+    finally:
+        DownloadSchedulerService.release(lease, outcome, error_message)
+
+    audio_path = _find_downloaded_media_file(download_dir, extensions=AUDIO_EXTENSIONS)
+    if not audio_path:
+        raise Exception("Arquivo de áudio não encontrado após download")
+    return audio_path, info or {}
@@ -4,8 +4,9 @@ from celery import shared_task
 from django.conf import settings
 import google.generativeai as genai
 
-from ..models import Video, Transcript, Organization
-from .job_utils import update_job_status, get_plan_tier
+from ..models import Video, Transcript
+from .job_utils import update_job_status
+from .pipeline import advance_pipeline, skip_if_fresh
 
 logger = logging.getLogger(__name__)
 
@@ -17,7 +18,8 @@ def analyze_semantic_task(self, video_id: str) -> dict:
     video = None
     try:
         video = Video.objects.get(video_id=video_id)
-        org = Organization.objects.get(organization_id=video.organization_id)
+        if skip_if_fresh(video_id, "analyze"):
+            return {"video_id": str(video.video_id), "status": "skipped"}
         
         video.status = "analyzing"
         video.current_step = "analyzing"
@@ -50,11 +52,7 @@ def analyze_semantic_task(self, video_id: str) -> dict:
         
         update_job_status(str(video.video_id), "embedding", progress=50, current_step="embedding")
 
-        from .embed_classify_task import embed_classify_task
-        embed_classify_task.apply_async(
-            args=[str(video.video_id)],
-            queue=f"video.classify.{get_plan_tier(org.plan)}",
-        )
+        advance_pipeline(str(video.video_id), "analyze")
 
         return {
             "video_id": str(video.video_id),
@@ -4,6 +4,7 @@ from celery import shared_task
 from django.conf import settings
 
 from ..models import Video, Transcript, Organization
+from ..services.artifact_service import ArtifactService
 from .job_utils import get_plan_tier, update_job_status
 
 logger = logging.getLogger(__name__)
@@ -50,6 +51,8 @@ def caption_clips_task(self, video_id: str) -> dict:
                 output_file=ass_path,
             )
 
+            ArtifactService.publish(video, f"caption_{idx}", ass_path)
+
             caption_files.append({
                 "index": idx,
                 "ass_file": ass_path,
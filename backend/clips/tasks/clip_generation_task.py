@@ -1,14 +1,21 @@
+import json
 import logging
 import os
 import uuid
 import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from celery import shared_task
 from django.conf import settings
 from django.utils import timezone
 
-from ..models import Video, Clip, Transcript, Organization
-from .job_utils import update_job_status
+from ..models import Video, Clip, Transcript, Organization, VideoArtifact
+from .job_utils import get_plan_tier, update_job_status, record_job_metrics
+from .pipeline import advance_pipeline
 from ..services.storage_service import R2StorageService
+from ..services.artifact_service import ArtifactService
+from ..services.media_probe_service import MediaProbeService
+from ..services.encoder_profile_service import EncoderProfileService
 
 logger = logging.getLogger(__name__)
 
@@ -31,7 +38,7 @@ def clip_generation_task(self, video_id: str) -> dict:
 
         selected_clips = transcript.selected_clips or []
         caption_files = transcript.caption_files or []
-        reframe_data = transcript.reframe_data or {}
+        reframe_data = transcript.reframe_data or _load_reframe_data(video)
         
         crop_config = reframe_data.get("crops", {}).get("9:16")
         
@@ -42,134 +49,652 @@ def clip_generation_task(self, video_id: str) -> dict:
         os.makedirs(output_dir, exist_ok=True)
 
         input_path = os.path.join(output_dir, "video_normalized.mp4")
-        if not os.path.exists(input_path):
+        if not ArtifactService.try_ensure_local(video, "normalized", input_path):
             raise Exception("Vídeo normalizado não encontrado")
 
         storage = R2StorageService()
         generated_clips = []
 
         total_clips = len(selected_clips)
-        
-        for idx, clip in enumerate(selected_clips):
-            progress = 85 + int((idx / total_clips) * 10)
-            update_job_status(str(video.video_id), "rendering", progress=progress, current_step=f"rendering_clip_{idx+1}")
+        render_jobs = []
 
+        for idx, clip in enumerate(selected_clips):
             clip_uuid = uuid.uuid4()
             start_time = float(clip.get("start_time", 0))
             end_time = float(clip.get("end_time", 0))
+            # Folga no fim (0 quando o select alinhou o fim a um corte de cena)
+            tail = float(clip.get("tail_seconds", 1.0))
 
             try:
                 if video.duration and float(video.duration) > 0:
-                    end_time = min(end_time + 1.0, float(video.duration))
+                    end_time = min(end_time + tail, float(video.duration))
                 else:
-                    end_time = end_time + 1.0
+                    end_time = end_time + tail
             except Exception:
-                end_time = end_time + 1.0
-            hook_title = clip.get("title") or clip.get("hook_title", f"Clip {idx + 1}")
-            
+                end_time = end_time + tail
+
             matched_caption = next((c for c in caption_files if c.get("index") == idx), None)
-            ass_file = matched_caption.get("ass_file") if matched_caption else None
-
-            clip_filename = f"clip_{clip_uuid}.mp4"
-            clip_path = os.path.join(output_dir, clip_filename)
-
-            _render_clip(
-                input_path=input_path,
-                output_path=clip_path,
-                start_time=start_time,
-                end_time=end_time,
-                crop_config=crop_config,
-                ass_file=ass_file
-            )
+            if matched_caption and matched_caption.get("ass_file"):
+                ArtifactService.try_ensure_local(video, f"caption_{idx}", matched_caption["ass_file"])
+
+            render_jobs.append({
+                "index": idx,
+                "clip": clip,
+                "clip_uuid": clip_uuid,
+                "start_time": start_time,
+                "end_time": end_time,
+                "ass_file": matched_caption.get("ass_file") if matched_caption else None,
+                "crop_trajectory": _match_crop_trajectory(reframe_data, idx, start_time),
+                "thumbnail_storage_path": _match_clip_thumbnail(reframe_data, idx, start_time),
+                "output_path": os.path.join(output_dir, f"clip_{clip_uuid}.mp4"),
+            })
 
-            file_size = os.path.getsize(clip_path)
-            clip_storage_path = storage.upload_clip(
-                file_path=clip_path,
-                organization_id=str(video.organization_id),
-                video_id=str(video.video_id),
-                clip_id=str(clip_uuid),
-            )
+        has_audio = _has_audio_stream(input_path, video=video)
+        tier = get_plan_tier(org.plan)
+        queue = f"video.clip.{tier}"
+        fanout = _should_fanout(render_jobs)
+
+        if fanout:
+            # Os clips só rodam juntos se houver workers livres na fila para todos eles
+            _, consumers = EncoderProfileService.get_queue_depth(queue)
+            parallelism = min(len(render_jobs), consumers or _get_render_concurrency(queue, len(render_jobs)))
+        else:
+            parallelism = _get_render_concurrency(queue, len(render_jobs))
+
+        # Perfil do encoder por job: sob backlog na fila do tier, cai para presets mais rápidos.
+        # O backlog é estimado pela task que enche a fila: um clip por mensagem no fan-out,
+        # o vídeo inteiro no render local.
+        encoder_profile = EncoderProfileService.select(
+            "render",
+            tier,
+            media_seconds=sum(job["end_time"] - job["start_time"] for job in render_jobs),
+            queue=queue,
+            parallelism=parallelism,
+            task_name="render_clip_task" if fanout else "clip_generation_task",
+        )
+        # Loudness medido na extração de áudio da transcrição: o render já recodifica o
+        # áudio, então a correção (loudnorm linear de duas passadas) sai sem decode extra
+        audio_filter = _clip_audio_filter(video) if has_audio else None
+        for job in render_jobs:
+            job["encoder_profile"] = encoder_profile
+            job["audio_filter"] = audio_filter
+
+        # Fan-out (jobs grandes): cada clip vira uma subtask independente em video.clip.{tier};
+        # o chord finaliza o vídeo quando todos terminarem (ou esgotarem retries).
+        if fanout:
+            _dispatch_clip_fanout(video, render_jobs, crop_config, has_audio, queue)
+            return {
+                "video_id": str(video.video_id),
+                "status": "rendering",
+                "clips_dispatched": len(render_jobs),
+            }
+
+        if bool(getattr(settings, "CLIP_BATCH_RENDER", True)):
+            batches = _plan_render_batches(render_jobs)
+        else:
+            batches = [[job] for job in render_jobs]
+
+        # K encodes em paralelo (threads do libx264 divididas pelo orçamento de cores)
+        # e uploads para o R2 num pool separado enquanto os próximos clips ainda codificam.
+        concurrency = _get_render_concurrency(queue, len(batches))
+        encoder_threads = encoder_profile.get("threads") or _get_encoder_threads(concurrency)
+        upload_workers = max(1, int(getattr(settings, "CLIP_UPLOAD_WORKERS", 4) or 4))
+
+        render_pool = ThreadPoolExecutor(max_workers=concurrency)
+        upload_pool = ThreadPoolExecutor(max_workers=upload_workers)
+        clip_timings = []
+        upload_futures = []
+        rendered = 0
+
+        try:
+            render_futures = {
+                render_pool.submit(
+                    _timed_render_batch, input_path, batch, crop_config, has_audio, encoder_threads
+                ): batch
+                for batch in batches
+            }
+
+            for future in as_completed(render_futures):
+                batch = render_futures[future]
+                render_seconds = future.result()
+
+                for job in batch:
+                    job["render_seconds"] = render_seconds
+                    job["batch_size"] = len(batch)
+                    upload_futures.append(upload_pool.submit(_upload_rendered_clip, storage, video, job))
+
+                rendered += len(batch)
+                progress = 85 + int((rendered / total_clips) * 10)
+                update_job_status(
+                    str(video.video_id), "rendering", progress=progress,
+                    current_step=f"rendering_clip_{rendered}",
+                )
+
+            for future in as_completed(upload_futures):
+                job = future.result()
+                generated_clips.append(_create_clip_record(video, job))
+                clip_timings.append({
+                    "clip_id": str(job["clip_uuid"]),
+                    "index": job["index"],
+                    "render_seconds": round(job["render_seconds"], 3),
+                    "upload_seconds": round(job["upload_seconds"], 3),
+                    "batch_size": job["batch_size"],
+                })
+        except Exception:
+            # Espera os uploads em andamento antes de limpar o que já foi para o R2
+            render_pool.shutdown(wait=True, cancel_futures=True)
+            upload_pool.shutdown(wait=True, cancel_futures=True)
+            _discard_partial_render(storage, render_jobs)
+            raise
+        finally:
+            render_pool.shutdown(wait=True, cancel_futures=True)
+            upload_pool.shutdown(wait=True, cancel_futures=True)
+
+        record_job_metrics(str(video.video_id), "render", {
+            "mode": "local",
+            "concurrency": concurrency,
+            "encoder_threads": encoder_threads,
+            "encoder_profile": encoder_profile,
+            "upload_workers": upload_workers,
+            "clips": sorted(clip_timings, key=lambda t: t["index"]),
+        })
+
+        return _mark_rendering_done(video, generated_clips)
 
-            transcript_text = clip.get("text", "")
-            
-            score_0_100 = float(clip.get("score", 0) or 0)
-            engagement_score = round(score_0_100 / 10.0, 2) 
-            
-            Clip.objects.create(
-                clip_id=clip_uuid,
-                video=video,
-                title=hook_title,
-                start_time=start_time,
-                end_time=end_time,
-                duration=end_time - start_time,
-                storage_path=clip_storage_path,
-                file_size=file_size,
-                transcript=transcript_text,
-                engagement_score=engagement_score,
-                confidence_score=0
-            )
+    except Video.DoesNotExist:
+        return {"error": "Video not found", "status": "failed"}
+    except Exception as e:
+        logger.error(f"Erro na renderização final: {e}", exc_info=True)
+        if video:
+            video.status = "failed"
+            video.error_message = str(e)
+            video.save()
 
-            generated_clips.append({
-                "clip_id": str(clip_uuid),
-                "url": clip_storage_path,
-            })
+        if self.request.retries < self.max_retries:
+            raise self.retry(exc=e, countdown=2 ** self.request.retries)
 
-            if os.path.exists(clip_path):
-                os.remove(clip_path)
+        return {"error": str(e), "status": "failed"}
 
-        video.last_successful_step = "rendering"
-        video.status = "done"
-        video.current_step = "done"
-        video.completed_at = timezone.now()
-        video.save()
-        
-        update_job_status(str(video.video_id), "done", progress=100, current_step="done")
+
+@shared_task(bind=True, max_retries=3)
+def render_clip_task(self, video_id: str, job: dict, crop_config: dict = None, has_audio: bool = True) -> dict:
+    try:
+        video = Video.objects.get(video_id=video_id)
+
+        # Idempotência: se a linha já existe (ex: retry após o insert), não renderiza de novo.
+        existing = Clip.objects.filter(clip_id=job["clip_uuid"]).first()
+        if existing:
+            return {"index": job["index"], "clip_id": str(existing.clip_id), "url": existing.storage_path}
+
+        input_path = os.path.join(settings.MEDIA_ROOT, f"videos/{video_id}", "video_normalized.mp4")
+        if not ArtifactService.try_ensure_local(video, "normalized", input_path):
+            raise Exception("Vídeo normalizado não encontrado")
+
+        if job.get("ass_file"):
+            ArtifactService.try_ensure_local(video, f"caption_{job['index']}", job["ass_file"])
+
+        threads = (job.get("encoder_profile") or {}).get("threads") or getattr(settings, "CLIP_FANOUT_ENCODER_THREADS", None)
+        render_seconds = _timed_render_batch(input_path, [job], crop_config, has_audio, threads)
+        job["render_seconds"] = render_seconds
+        job["batch_size"] = 1
+
+        job = _upload_rendered_clip(R2StorageService(), video, job)
+        created = _create_clip_record(video, job)
+
+        total = int(job.get("total_clips") or 0)
+        if total:
+            done = Clip.objects.filter(video=video).count()
+            update_job_status(
+                str(video.video_id), "rendering", progress=85 + int((min(done, total) / total) * 10),
+                current_step=f"rendering_clip_{done}",
+            )
 
         return {
-            "video_id": str(video.video_id),
-            "status": "done",
-            "clips_count": len(generated_clips),
+            **created,
+            "index": job["index"],
+            "render_seconds": round(job["render_seconds"], 3),
+            "upload_seconds": round(job["upload_seconds"], 3),
         }
 
+    except Video.DoesNotExist:
+        return {"index": job.get("index"), "error": "Video not found"}
+    except Exception as e:
+        logger.error(f"Erro no render do clip {job.get('index')} ({video_id}): {e}", exc_info=True)
+        if os.path.exists(job.get("output_path") or ""):
+            try:
+                os.remove(job["output_path"])
+            except OSError:
+                pass
+
+        if self.request.retries < self.max_retries:
+            raise self.retry(exc=e, countdown=2 ** self.request.retries)
+
+        # Não propaga: o finalizador decide com base nos clips que deram certo.
+        return {"index": job.get("index"), "error": str(e)}
+
+
+@shared_task(bind=True, max_retries=3)
+def finalize_clip_generation_task(self, results: list, video_id: str) -> dict:
+    video = None
+    try:
+        video = Video.objects.get(video_id=video_id)
+
+        results = sorted(results or [], key=lambda r: r.get("index") or 0)
+        generated_clips = [r for r in results if not r.get("error")]
+        failed = [r for r in results if r.get("error")]
+
+        record_job_metrics(str(video.video_id), "render", {
+            "mode": "fanout",
+            "clips": [
+                {
+                    "clip_id": r["clip_id"],
+                    "index": r["index"],
+                    "render_seconds": r.get("render_seconds"),
+                    "upload_seconds": r.get("upload_seconds"),
+                    "batch_size": 1,
+                }
+                for r in generated_clips
+            ],
+            "failed": [{"index": r.get("index"), "error": r.get("error")} for r in failed],
+        })
+
+        if not generated_clips:
+            raise Exception(f"Nenhum clip renderizado ({len(failed)} falhas)")
+
+        if failed:
+            logger.warning(f"[render] {len(failed)} clip(s) falharam para video_id={video_id}")
+
+        return _mark_rendering_done(video, generated_clips)
+
     except Video.DoesNotExist:
         return {"error": "Video not found", "status": "failed"}
     except Exception as e:
-        logger.error(f"Erro na renderização final: {e}", exc_info=True)
+        logger.error(f"Erro ao finalizar renderização {video_id}: {e}", exc_info=True)
         if video:
             video.status = "failed"
             video.error_message = str(e)
             video.save()
-
-        if self.request.retries < self.max_retries:
-            raise self.retry(exc=e, countdown=2 ** self.request.retries)
+            update_job_status(str(video.video_id), "failed", current_step="rendering")
 
         return {"error": str(e), "status": "failed"}
 
 
-def _render_clip(
+def _mark_rendering_done(video: Video, generated_clips: list) -> dict:
+    video.last_successful_step = "rendering"
+    video.status = "done"
+    video.current_step = "done"
+    video.completed_at = timezone.now()
+    video.save()
+
+    update_job_status(str(video.video_id), "done", progress=100, current_step="done")
+
+    # Etapa terminal: apenas grava o checkpoint de "clip".
+    advance_pipeline(str(video.video_id), "clip")
+
+    return {
+        "video_id": str(video.video_id),
+        "status": "done",
+        "clips_count": len(generated_clips),
+    }
+
+
+def _dispatch_clip_fanout(video: Video, render_jobs: list, crop_config: dict, has_audio: bool, queue: str) -> None:
+    from celery import chord
+
+    header = []
+    for job in render_jobs:
+        payload = {
+            **job,
+            "clip_uuid": str(job["clip_uuid"]),
+            "total_clips": len(render_jobs),
+        }
+        header.append(
+            render_clip_task.s(str(video.video_id), payload, crop_config, has_audio).set(queue=queue)
+        )
+
+    logger.info(f"[render] {len(header)} clips disparados em {queue} para video_id={video.video_id}")
+    chord(header)(finalize_clip_generation_task.s(str(video.video_id)).set(queue=queue))
+
+
+def _discard_partial_render(storage: R2StorageService, render_jobs: list) -> None:
+    """
+    Desfaz uma renderização local que falhou no meio: remove os clips já enviados
+    ao R2 e as linhas Clip criadas nesta tentativa. O retry gera novos UUIDs e
+    renderiza tudo de novo, então sem isso ficariam objetos órfãos e clips duplicados.
+    """
+    clip_ids = [job["clip_uuid"] for job in render_jobs]
+    Clip.objects.filter(clip_id__in=clip_ids).delete()
+
+    for job in render_jobs:
+        if job.get("storage_path"):
+            try:
+                storage.delete_file(job["storage_path"])
+            except Exception as e:
+                logger.warning(f"[render] Não foi possível remover {job['storage_path']} do R2: {e}")
+        if os.path.exists(job["output_path"]):
+            try:
+                os.remove(job["output_path"])
+            except OSError:
+                pass
+
+
+def _load_reframe_data(video: Video) -> dict:
+    # Reframe persiste o resultado como artefato (a linha da transcrição pode ter sido recriada).
+    path = os.path.join(settings.MEDIA_ROOT, f"videos/{video.video_id}", "reframe.json")
+    ArtifactService.try_ensure_local(video, "reframe", path)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f) or {}
+    except (OSError, ValueError):
+        return {}
+
+
+def _match_reframe_entry(reframe_data: dict, index: int, start_time: float) -> dict:
+    """Entrada do clip no reframe por janela (mesmo índice e início); {} se não houver."""
+    for entry in reframe_data.get("clips") or []:
+        if entry.get("index") == index and abs(float(entry.get("start_time", 0)) - start_time) < 0.5:
+            return entry
+    return {}
+
+
+def _match_crop_trajectory(reframe_data: dict, index: int, start_time: float) -> list | None:
+    """Keyframes do recorte do clip (reframe por janela); None para o recorte fixo do vídeo."""
+    return _match_reframe_entry(reframe_data, index, start_time).get("keyframes") or None
+
+
+def _match_clip_thumbnail(reframe_data: dict, index: int, start_time: float) -> str | None:
+    """storage_path da thumbnail escolhida pelo reframe para o clip, se houver."""
+    return (_match_reframe_entry(reframe_data, index, start_time).get("thumbnail") or {}).get("storage_path")
+
+
+def _crop_x_expression(keyframes: list) -> str:
+    """Expressão do ffmpeg para o x do crop, linear por partes entre os keyframes [t, x]."""
+    expr = str(int(keyframes[-1][1]))
+    if len(keyframes) == 1:
+        return expr
+    for (t0, x0), (t1, x1) in reversed(list(zip(keyframes, keyframes[1:]))):
+        if t1 <= t0:
+            continue
+        segment = f"{int(x0)}+({int(x1) - int(x0)})*(t-{t0:.3f})/{t1 - t0:.3f}"
+        expr = f"if(lt(t\\,{t1:.3f})\\,{segment}\\,{expr})"
+    first_t, first_x = keyframes[0]
+    return f"if(lt(t\\,{float(first_t):.3f})\\,{int(first_x)}\\,{expr})"
+
+
+def _should_fanout(render_jobs: list) -> bool:
+    """Fan-out por job: só quando o render local prenderia um worker por tempo demais."""
+    if not bool(getattr(settings, "CLIP_RENDER_FANOUT", True)) or len(render_jobs) < 2:
+        return False
+
+    clip_seconds = sum(job["end_time"] - job["start_time"] for job in render_jobs)
+    min_seconds = float(getattr(settings, "CLIP_FANOUT_MIN_CLIP_SECONDS", 900) or 0)
+    min_clips = int(getattr(settings, "CLIP_FANOUT_MIN_CLIPS", 12) or 0)
+    return bool((min_seconds and clip_seconds >= min_seconds) or (min_clips and len(render_jobs) >= min_clips))
+
+
+def _get_render_concurrency(queue: str, num_batches: int) -> int:
+    cpu_count = os.cpu_count() or 1
+    per_queue = getattr(settings, "CLIP_RENDER_CONCURRENCY", {}) or {}
+    configured = int(per_queue.get(queue) or per_queue.get("default") or 1)
+    return max(1, min(configured, cpu_count, num_batches or 1))
+
+
+def _get_encoder_threads(concurrency: int) -> int:
+    cpu_count = os.cpu_count() or 1
+    return max(1, cpu_count // max(1, concurrency))
+
+
+def _timed_render_batch(
     input_path: str,
-    output_path: str,
-    start_time: float,
-    end_time: float,
+    batch: list,
+    crop_config: dict,
+    has_audio: bool,
+    threads: int,
+) -> float:
+    started = time.monotonic()
+    _render_batch(input_path, batch, crop_config=crop_config, has_audio=has_audio, threads=threads)
+    return time.monotonic() - started
+
+
+def _upload_rendered_clip(storage: R2StorageService, video: Video, job: dict) -> dict:
+    started = time.monotonic()
+    job["file_size"] = os.path.getsize(job["output_path"])
+    job["storage_path"] = storage.upload_clip(
+        file_path=job["output_path"],
+        organization_id=str(video.organization_id),
+        video_id=str(video.video_id),
+        clip_id=str(job["clip_uuid"]),
+    )
+    job["upload_seconds"] = time.monotonic() - started
+    return job
+
+
+def _create_clip_record(video: Video, job: dict) -> dict:
+    clip = job["clip"]
+    clip_uuid = job["clip_uuid"]
+    clip_path = job["output_path"]
+    start_time = job["start_time"]
+    end_time = job["end_time"]
+    hook_title = clip.get("title") or clip.get("hook_title", f"Clip {job['index'] + 1}")
+
+    transcript_text = clip.get("text", "")
+
+    score_0_100 = float(clip.get("score", 0) or 0)
+    engagement_score = round(score_0_100 / 10.0, 2)
+
+    Clip.objects.create(
+        clip_id=clip_uuid,
+        video=video,
+        title=hook_title,
+        start_time=start_time,
+        end_time=end_time,
+        duration=end_time - start_time,
+        storage_path=job["storage_path"],
+        file_size=job["file_size"],
+        transcript=transcript_text,
+        engagement_score=engagement_score,
+        confidence_score=0,
+        encoder_profile=job.get("encoder_profile") or {},
+        thumbnail_storage_path=job.get("thumbnail_storage_path"),
+    )
+
+    if os.path.exists(clip_path):
+        os.remove(clip_path)
+
+    return {
+        "clip_id": str(clip_uuid),
+        "url": job["storage_path"],
+    }
+
+
+def _plan_render_batches(render_jobs: list) -> list:
+    """Agrupa clips próximos/sobrepostos no tempo para compartilhar um único decode."""
+    max_clips = max(1, int(getattr(settings, "CLIP_BATCH_MAX_CLIPS", 8) or 8))
+    max_gap = float(getattr(settings, "CLIP_BATCH_MAX_GAP_SECONDS", 30.0) or 0.0)
+
+    batches = []
+    current = []
+    current_end = None
+
+    for job in sorted(render_jobs, key=lambda j: j["start_time"]):
+        if current and (len(current) >= max_clips or job["start_time"] - current_end > max_gap):
+            batches.append(current)
+            current = []
+            current_end = None
+
+        current.append(job)
+        current_end = job["end_time"] if current_end is None else max(current_end, job["end_time"])
+
+    if current:
+        batches.append(current)
+
+    return batches
+
+
+def _render_batch(
+    input_path: str,
+    batch: list,
     crop_config: dict = None,
-    ass_file: str = None,
+    has_audio: bool = True,
+    threads: int = None,
 ) -> None:
-    ffmpeg_path = getattr(settings, "FFMPEG_PATH", "ffmpeg")
-    duration = end_time - start_time
+    """Renderiza um lote com um único decode; em caso de falha, cai para o render por clip."""
+    if len(batch) > 1:
+        try:
+            _render_clips_single_decode(
+                input_path, batch, crop_config=crop_config, has_audio=has_audio, threads=threads
+            )
+            return
+        except Exception as e:
+            logger.warning(f"[render] Render em lote falhou; renderizando clip a clip: {e}")
+
+    for job in batch:
+        _render_clip(
+            input_path=input_path,
+            output_path=job["output_path"],
+            start_time=job["start_time"],
+            end_time=job["end_time"],
+            crop_config=crop_config,
+            ass_file=job["ass_file"],
+            threads=threads,
+            encoder_profile=job.get("encoder_profile"),
+            crop_trajectory=job.get("crop_trajectory"),
+            audio_filter=job.get("audio_filter"),
+        )
+
 
+def _build_video_filters(crop_config: dict = None, ass_file: str = None, crop_trajectory: list = None) -> list:
     filter_chain = []
-    
+
     if crop_config:
         w = crop_config.get("width")
         h = crop_config.get("height")
         x = crop_config.get("x")
         y = crop_config.get("y")
+        if crop_trajectory:
+            # x animado: interpolação linear entre os keyframes (t relativo ao início do clip)
+            x = _crop_x_expression(crop_trajectory)
         filter_chain.append(f"crop={w}:{h}:{x}:{y}")
 
     if ass_file and os.path.exists(ass_file):
         clean_ass_path = ass_file.replace("\\", "/").replace(":", "\\:")
         filter_chain.append(f"ass='{clean_ass_path}'")
 
+    return filter_chain
+
+
+def _render_clips_single_decode(
+    input_path: str,
+    batch: list,
+    crop_config: dict = None,
+    has_audio: bool = True,
+    threads: int = None,
+) -> None:
+    ffmpeg_path = getattr(settings, "FFMPEG_PATH", "ffmpeg")
+
+    # Decodifica só a janela coberta pelo lote; trims são relativos ao início da janela.
+    window_start = min(j["start_time"] for j in batch)
+    window_end = max(j["end_time"] for j in batch)
+    n = len(batch)
+
+    graph = [f"[0:v]split={n}" + "".join(f"[vin{i}]" for i in range(n))]
+    if has_audio:
+        graph.append(f"[0:a]asplit={n}" + "".join(f"[ain{i}]" for i in range(n)))
+
+    for i, job in enumerate(batch):
+        rel_start = job["start_time"] - window_start
+        rel_end = job["end_time"] - window_start
+
+        v_chain = [f"trim=start={rel_start:.3f}:end={rel_end:.3f}", "setpts=PTS-STARTPTS"]
+        v_chain.extend(_build_video_filters(crop_config, job["ass_file"], job.get("crop_trajectory")))
+        graph.append(f"[vin{i}]" + ",".join(v_chain) + f"[vout{i}]")
+
+        if has_audio:
+            a_chain = [f"atrim=start={rel_start:.3f}:end={rel_end:.3f}", "asetpts=PTS-STARTPTS"]
+            if job.get("audio_filter"):
+                a_chain.append(job["audio_filter"])
+            graph.append(f"[ain{i}]" + ",".join(a_chain) + f"[aout{i}]")
+
+    cmd = [
+        ffmpeg_path,
+        "-y",
+        "-ss", f"{window_start:.3f}",
+        "-t", f"{window_end - window_start:.3f}",
+        "-i", input_path,
+        "-filter_complex", ";".join(graph),
+    ]
+
+    for i, job in enumerate(batch):
+        cmd.extend(["-map", f"[vout{i}]"])
+        if has_audio:
+            cmd.extend(["-map", f"[aout{i}]"])
+        cmd.extend(EncoderProfileService.encoder_args(job.get("encoder_profile"), default="quality"))
+        if threads:
+            # As N saídas compartilham o orçamento de threads do encode.
+            cmd.extend(["-threads", str(max(1, threads // n))])
+        if has_audio:
+            cmd.extend(["-c:a", "aac", "-b:a", "192k"])
+        cmd.extend(["-movflags", "+faststart", job["output_path"]])
+
+    try:
+        subprocess.run(
+            cmd,
+            check=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            text=True
+        )
+    except subprocess.CalledProcessError as e:
+        error_msg = e.stderr if e.stderr else str(e)
+        raise Exception(f"Falha no render em lote: {error_msg}")
+
+    missing = [j["output_path"] for j in batch if not os.path.exists(j["output_path"])]
+    if missing:
+        raise Exception(f"Arquivos não criados pelo FFmpeg: {missing}")
+
+
+def _clip_audio_filter(video: Video) -> str | None:
+    """
+    Filtro de áudio dos clips a partir do loudness do vídeo inteiro (Video.loudness).
+
+    None dentro da tolerância; loudnorm linear com os parâmetros medidos fora dela
+    (ganho constante: os clips ficam coerentes entre si); loudnorm de uma passada
+    por clip quando não há medição.
+    """
+    names = ["normalized", "audio"]
+    hashes = dict(VideoArtifact.objects.filter(video=video, name__in=names).values_list("name", "content_hash"))
+    measurement = MediaProbeService.stored_loudness(video, names, hashes)
+    loudnorm = MediaProbeService.loudnorm_filter(measurement)
+    if not loudnorm:
+        return None
+    # O loudnorm trabalha a 192 kHz: volta para a taxa do normalized
+    return f"{loudnorm},aresample=44100"
+
+
+def _has_audio_stream(input_path: str, video: Video = None) -> bool:
+    try:
+        return bool(MediaProbeService.probe(input_path, video=video, name="normalized").get("has_audio"))
+    except Exception:
+        return True
+
+
+def _render_clip(
+    input_path: str,
+    output_path: str,
+    start_time: float,
+    end_time: float,
+    crop_config: dict = None,
+    ass_file: str = None,
+    threads: int = None,
+    encoder_profile: dict = None,
+    crop_trajectory: list = None,
+    audio_filter: str = None,
+) -> None:
+    ffmpeg_path = getattr(settings, "FFMPEG_PATH", "ffmpeg")
+    duration = end_time - start_time
+
+    filter_chain = _build_video_filters(crop_config, ass_file, crop_trajectory)
+
     vf_arg = ",".join(filter_chain)
 
     cmd = [
@@ -183,10 +708,15 @@ def _render_clip(
     if vf_arg:
         cmd.extend(["-vf", vf_arg])
 
+    cmd.extend(EncoderProfileService.encoder_args(encoder_profile, default="quality"))
+
+    if threads:
+        cmd.extend(["-threads", str(threads)])
+
+    if audio_filter:
+        cmd.extend(["-af", audio_filter])
+
     cmd.extend([
-        "-c:v", "libx264",
-        "-preset", "slow",
-        "-crf", "21",
         "-c:a", "aac",
         "-b:a", "192k",
         "-movflags", "+faststart",
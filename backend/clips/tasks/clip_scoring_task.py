@@ -1,11 +1,16 @@
 import logging
 import os
 import cv2
+import numpy as np
 from celery import shared_task
 from django.conf import settings
 
 from ..models import Clip, Video, Transcript
 from ..services.storage_service import R2StorageService
+from ..services.artifact_service import ArtifactService
+from ..services.frame_cache_service import FrameCacheService
+from ..services.scene_cut_service import SceneCutService
+from ..services.thumbnail_service import ThumbnailService
 
 logger = logging.getLogger(__name__)
 
@@ -47,22 +52,27 @@ def clip_scoring_task(self, clip_id: str, video_id: str):
         os.makedirs(temp_dir, exist_ok=True)
         
         local_clip_path = os.path.join(temp_dir, f"{clip_id}.mp4")
-        
-        if clip.storage_path:
-            storage.download_file(clip.storage_path, local_clip_path)
-        
-        if os.path.exists(local_clip_path):
-            thumb_path = _extract_vertical_thumbnail(local_clip_path, temp_dir, clip_id)
-            
-            if thumb_path:
-                thumb_storage_path = storage.upload_thumbnail(
-                    file_path=thumb_path, 
-                    organization_id=str(video.organization_id), 
-                    video_id=str(video_id),
-                    filename=f"thumb_{clip_id}.jpg"
-                )
-                clip.thumbnail_storage_path = thumb_storage_path
-                logger.info(f"Thumbnail gerada: {thumb_storage_path}")
+
+        # O render já grava a thumbnail escolhida pelo reframe; sem ela, a pilha de frames
+        # do vídeo evita baixar o clip renderizado só para pontuar alguns frames
+        if not clip.thumbnail_storage_path:
+            thumb_path = _thumbnail_from_frame_cache(video, clip, transcript, temp_dir)
+
+            if not thumb_path and clip.storage_path:
+                storage.download_file(clip.storage_path, local_clip_path)
+
+            if not thumb_path and os.path.exists(local_clip_path):
+                thumb_path = _extract_vertical_thumbnail(local_clip_path, temp_dir, clip_id)
+
+        if thumb_path:
+            thumb_storage_path = storage.upload_thumbnail(
+                file_path=thumb_path, 
+                organization_id=str(video.organization_id), 
+                video_id=str(video_id),
+                filename=f"thumb_{clip_id}.jpg"
+            )
+            clip.thumbnail_storage_path = thumb_storage_path
+            logger.info(f"Thumbnail gerada: {thumb_storage_path}")
 
         clip.save()
         
@@ -91,6 +101,50 @@ def clip_scoring_task(self, clip_id: str, video_id: str):
                 pass
 
 
+def _thumbnail_from_frame_cache(video: Video, clip: Clip, transcript, output_dir: str) -> str | None:
+    """Melhor frame do clip entre os candidatos da pilha de frames (recorte 9:16 do reframe)."""
+    video_dir = os.path.join(settings.MEDIA_ROOT, f"videos/{video.video_id}")
+    try:
+        stack = FrameCacheService.load(video, video_dir)
+    except Exception as e:
+        logger.debug(f"Pilha de frames indisponível para video_id={video.video_id}: {e}")
+        return None
+    if stack is None:
+        return None
+
+    cuts = None
+    try:
+        cuts = SceneCutService.get(video, video_dir)
+    except Exception as e:
+        logger.debug(f"Cortes de cena indisponíveis para video_id={video.video_id}: {e}")
+    # Candidatos espaçados no clip, longe de frames de transição
+    times = ThumbnailService.candidate_times(clip.start_time, clip.end_time, cuts)
+
+    reframe_data = (transcript.reframe_data if transcript else None) or {}
+    crop = reframe_data.get("crops", {}).get("9:16")
+    crop_xs = None
+    if crop:
+        # Trajetória do recorte do clip (reframe por janela), se houver
+        entry = next(
+            (c for c in reframe_data.get("clips") or [] if abs(float(c.get("start_time", 0)) - clip.start_time) < 0.5),
+            None,
+        )
+        keyframes = (entry or {}).get("keyframes") or []
+        if keyframes:
+            key_times, key_xs = zip(*keyframes)
+            crop_xs = np.interp(times - clip.start_time, key_times, key_xs)
+
+    ts, frame = ThumbnailService.best_frame(stack, times, crop_xs=crop_xs, crop_box=crop)
+    if crop and crop_xs is not None:
+        crop = {**crop, "x": int(np.interp(ts - clip.start_time, key_times, key_xs))}
+
+    normalized_path = os.path.join(video_dir, "video_normalized.mp4")
+    source_path = normalized_path if ArtifactService.try_ensure_local(video, "normalized", normalized_path) else None
+    return ThumbnailService.save(
+        frame, os.path.join(output_dir, f"{clip.clip_id}_thumb.jpg"), source_path=source_path, ts=ts, crop_box=crop
+    )
+
+
 def _extract_vertical_thumbnail(video_path: str, output_dir: str, clip_id: str) -> str:
     cap = cv2.VideoCapture(video_path)
     if not cap.isOpened():
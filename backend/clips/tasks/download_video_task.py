@@ -1,20 +1,37 @@
+import hashlib
 import logging
 import os
-import subprocess
-import json
+import random
 import shutil
 from celery import shared_task
 from django.conf import settings
 
 from ..models import Video, Organization
 from ..services.storage_service import R2StorageService
-from .job_utils import get_plan_tier, update_job_status
+from ..services.artifact_service import ArtifactService
+from ..services.media_probe_service import MediaProbeService
+from ..services.source_cache_service import SourceCacheService
+from ..services.download_scheduler_service import DownloadSchedulerService, DownloadThrottledError
+from .job_utils import update_job_status, advance_video_status, mark_step_succeeded
+from .pipeline import advance_pipeline, reset_pipeline, record_checkpoint, dispatch_stage
+from .normalize_video_task import _normalize_from_stream
 
 logger = logging.getLogger(__name__)
 
+YT_DLP_FORMAT = "bv*[ext=mp4][vcodec^=avc1]+ba[ext=m4a]/bv*[ext=mp4]+ba[ext=m4a]/b[ext=mp4]/bv*+ba/b"
+VIDEO_EXTENSIONS = (".mp4", ".mkv", ".mov", ".webm")
+
+
+class NonRetryableDownloadError(Exception):
+    """Erro definitivo da fonte (privado, removido, bloqueio geográfico): retentar não adianta."""
+
+    def __init__(self, message: str, error_code: str):
+        super().__init__(message)
+        self.error_code = error_code
+
 
 @shared_task(bind=True, max_retries=5)
-def download_video_task(self, video_id: str) -> dict:
+def download_video_task(self, video_id: str, deferrals: int = 0) -> dict:
     video = None
     temp_dir = None
     lock_path = None
@@ -23,12 +40,18 @@ def download_video_task(self, video_id: str) -> dict:
         video = Video.objects.get(video_id=video_id)
         
         org = Organization.objects.get(organization_id=video.organization_id)
+
+        if not self.request.retries:
+            reset_pipeline(str(video.video_id))
+
+            # Áudio primeiro: a transcrição começa enquanto o vídeo completo ainda baixa.
+            if _wants_audio_first(video):
+                dispatch_stage(str(video.video_id), "audio", plan=org.plan)
         
-        video.status = "downloading"
-        video.current_step = "downloading"
-        video.save()
-        
-        update_job_status(str(video.video_id), "downloading", progress=10, current_step="downloading")
+        # Sem save() completo: o ramo de áudio segue em paralelo e não pode regredir
+        advance_video_status(str(video.video_id), "downloading", recover_step="downloading")
+
+        update_job_status(str(video.video_id), "downloading", progress=10, current_step="downloading", forward_only=True)
 
         output_dir = os.path.join(settings.MEDIA_ROOT, f"videos/{video.video_id}")
         os.makedirs(output_dir, exist_ok=True)
@@ -46,17 +69,27 @@ def download_video_task(self, video_id: str) -> dict:
         storage = R2StorageService()
         local_video_path = os.path.join(output_dir, "video_original.mp4")
 
+        streamed = None
         if video.storage_path:
-            logger.info(f"Baixando vídeo do R2: {video.storage_path}")
-            storage.download_file(video.storage_path, local_video_path)
+            # Streaming: GETs com Range alimentam o ffmpeg (stdin) enquanto o original é gravado,
+            # sobrepondo download e normalização.
+            if bool(getattr(settings, "INGEST_STREAMING", True)):
+                streamed = _stream_ingest_from_r2(video, storage, local_video_path, output_dir)
+
+            if streamed is None:
+                logger.info(f"Baixando vídeo do R2: {video.storage_path}")
+                storage.download_file(video.storage_path, local_video_path)
             video_path = local_video_path
 
         elif video.source_url:
             logger.info(f"Baixando vídeo de URL externa: {video.source_url} (tipo: {video.source_type})")
 
+            # Em retentativas, os .part/fragmentos da tentativa anterior são retomados.
             downloaded = _download_from_source_url(
                 source_url=video.source_url,
                 output_dir=output_dir,
+                resume=bool(self.request.retries),
+                force_slot=deferrals >= int(getattr(settings, "DOWNLOAD_SCHEDULER_MAX_DEFERRALS", 20)),
             )
             video_path = downloaded["video_path"]
             info = downloaded.get("info") or {}
@@ -75,26 +108,41 @@ def download_video_task(self, video_id: str) -> dict:
         else:
             raise Exception("Nenhuma fonte de vídeo disponível (storage_path ou source_url)")
 
-        logger.info(f"Validando vídeo: {video_path}")
-        duration, resolution, codec = _validate_video(video_path)
+        if streamed:
+            duration, resolution, codec = _validate_metadata(streamed["metadata"], video_path)
+        else:
+            logger.info(f"Validando vídeo: {video_path}")
+            duration, resolution, codec = _validate_video(video_path, video=video)
 
         video.duration = duration
         video.resolution = resolution
         video.file_size = os.path.getsize(video_path)
-        video.last_successful_step = "downloading"
 
-        video.save()
+        # Publica o original para que thumbnail/normalize possam rodar em qualquer worker.
+        if video.storage_path:
+            # Upload do usuário: o original já está no R2; registra o objeto em vez de enviar outra cópia
+            content_hash = streamed["content_hash"] if streamed else ArtifactService.hash_file(video_path)
+            ArtifactService.register(video, "original", video.storage_path, content_hash, video.file_size)
+        else:
+            ArtifactService.publish(video, "original", video_path, storage=storage)
+
+        # Só os campos do download: status/media_info são gravados em paralelo por outros ramos
+        video.save(update_fields=["duration", "resolution", "file_size", "original_filename", "title"])
+        mark_step_succeeded(str(video.video_id), "downloading")
+
+        if streamed and streamed["normalized"]:
+            # Normalização já feita durante o download: o normalize_video_task encontra
+            # o checkpoint atualizado e apenas avança o pipeline.
+            ArtifactService.publish(video, "normalized", streamed["normalized_path"], storage=storage)
+            record_checkpoint(str(video.video_id), "normalize")
         
         logger.info(f"Download concluído para video_id={video.video_id} | "
                    f"Duração: {duration}s | Resolução: {resolution} | Codec: {codec}")
         
-        from .extract_thumbnail_task import extract_thumbnail_task
-        logger.info(f"Disparando extract_thumbnail_task para video_id={video.video_id}")
-        task_result = extract_thumbnail_task.apply_async(
-            args=[str(video.video_id)],
-            queue=f"video.normalize.{get_plan_tier(org.plan)}",
-        )
-        logger.info(f"extract_thumbnail_task disparada com task_id={task_result.id}")
+        # Dispara as etapas liberadas pelo download (normalize; no modo áudio-primeiro o
+        # ramo de áudio já segue em paralelo). O thumbnail espera o normalize.
+        dispatched = advance_pipeline(str(video.video_id), "download")
+        logger.info(f"Etapas disparadas para video_id={video.video_id}: {dispatched}")
 
         return {
             "video_id": str(video.video_id),
@@ -108,22 +156,30 @@ def download_video_task(self, video_id: str) -> dict:
     except Video.DoesNotExist:
         logger.error(f"Vídeo não encontrado: {video_id}")
         return {"error": "Video not found", "status": "failed"}
-        
+
+    except DownloadThrottledError as e:
+        # Reagenda sem consumir as retentativas de erro (max_retries é aplicado descontando as reagendas)
+        countdown = e.retry_after + random.randint(0, e.retry_after)
+        logger.info(f"Download de {video_id} reagendado em {countdown}s: {e}")
+        raise self.retry(countdown=countdown, kwargs={"deferrals": deferrals + 1}, max_retries=self.request.retries + 1)
+
     except Exception as e:
         logger.error(f"Erro ao baixar vídeo {video_id}: {str(e)}", exc_info=True)
         
         if video:
             video.status = "failed"
             video.current_step = "downloading"
-            video.error_code = _get_error_code(str(e))
+            video.error_code = getattr(e, "error_code", None) or _get_error_code(str(e))
             video.error_message = str(e)
             video.retry_count += 1
-            video.save()
+            video.save(update_fields=["status", "current_step", "error_code", "error_message", "retry_count"])
 
-            if self.request.retries < self.max_retries:
-                countdown = 2 ** self.request.retries
-                logger.warning(f"Retentando download em {countdown}s (tentativa {self.request.retries + 1}/{self.max_retries})")
-                raise self.retry(exc=e, countdown=countdown)
+            if isinstance(e, NonRetryableDownloadError):
+                logger.warning(f"Erro definitivo no download de {video_id} ({e.error_code}); sem retentativas")
+            elif self.request.retries - deferrals < self.max_retries:
+                countdown = 2 ** (self.request.retries - deferrals)
+                logger.warning(f"Retentando download em {countdown}s (tentativa {self.request.retries - deferrals + 1}/{self.max_retries})")
+                raise self.retry(exc=e, countdown=countdown, max_retries=self.max_retries + deferrals)
 
         if temp_dir:
             _cleanup_temp_download_files(temp_dir)
@@ -144,14 +200,14 @@ def download_video_task(self, video_id: str) -> dict:
                 pass
 
 
-def _download_from_source_url(source_url: str, output_dir: str) -> dict:
+def _download_from_source_url(source_url: str, output_dir: str, resume: bool = False, force_slot: bool = False) -> dict:
     try:
         import yt_dlp
     except ImportError:
         raise Exception("yt-dlp não está instalado. Adicione à requirements.txt")
 
     tmp_subdir = os.path.join(output_dir, "_yt_dlp")
-    if os.path.isdir(tmp_subdir):
+    if os.path.isdir(tmp_subdir) and not resume:
         try:
             shutil.rmtree(tmp_subdir, ignore_errors=True)
         except Exception:
@@ -159,46 +215,119 @@ def _download_from_source_url(source_url: str, output_dir: str) -> dict:
     os.makedirs(tmp_subdir, exist_ok=True)
     output_template = os.path.join(tmp_subdir, "download.%(ext)s")
 
-    proxy_url = os.getenv("PROXY_URL")
-
     ydl_opts = {
-        "format": "bv*[ext=mp4][vcodec^=avc1]+ba[ext=m4a]/bv*[ext=mp4]+ba[ext=m4a]/b[ext=mp4]/bv*+ba/b",
+        "format": YT_DLP_FORMAT,
         "merge_output_format": "mp4",
         "outtmpl": output_template,
         "noplaylist": True,
         "retries": 3,
-        "fragment_retries": 3,
+        "fragment_retries": 10,
         "socket_timeout": 30,
-        "continuedl": False,
-        "nopart": True,
+        # .part + .ytdl (estado dos fragmentos) ficam em _yt_dlp/ entre retentativas do Celery;
+        # keepvideo mantém os formatos já baixados para que só o merge seja refeito.
+        "continuedl": True,
+        "nopart": False,
         "keepvideo": True,
         "consoletitle": False,
         "quiet": True,
         "no_warnings": True,
     }
 
-    if proxy_url:
-        ydl_opts["proxy"] = proxy_url
+    # Cache entre jobs: mesmo extractor + media ID -> baixa do R2 em vez de passar pelo yt-dlp/proxy.
+    format_selector = ydl_opts["format"]
+    url_key = SourceCacheService.key_from_url(source_url, format_selector) if SourceCacheService.enabled() else None
+    cached = _fetch_from_source_cache(url_key, tmp_subdir)
+    if cached:
+        return cached
+
+    # Vaga por plataforma + proxy do pool (levanta DownloadThrottledError se não houver vaga)
+    lease = DownloadSchedulerService.acquire(source_url, force=force_slot)
+    _apply_download_lease(ydl_opts, lease)
 
+    outcome, error_message = "error", None
     try:
-        logger.info(f"Iniciando download via yt-dlp: {source_url}")
+        logger.info(f"Iniciando download via yt-dlp: {source_url}" + (" (retomando)" if resume else ""))
         with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(source_url, download=True)
+            info = ydl.extract_info(source_url, download=False, process=False)
+
+            info_key = SourceCacheService.key_from_info(info, format_selector) if SourceCacheService.enabled() else None
+            if info_key and info_key != url_key:
+                cached = _fetch_from_source_cache(info_key, tmp_subdir)
+                if cached:
+                    outcome = "source"
+                    return cached
+
+            info = ydl.process_ie_result(info, download=True)
             logger.info(f"yt-dlp ok: {info.get('title', 'Unknown')}")
+            outcome = "ok"
 
     except yt_dlp.utils.DownloadError as e:
-        raise Exception(_map_yt_dlp_error_to_message(str(e), source_url))
+        error = _yt_dlp_error(str(e), source_url)
+        outcome = "source" if isinstance(error, NonRetryableDownloadError) else "error"
+        error_message = str(e)
+        raise error
     except Exception as e:
+        error_message = str(e)
         raise Exception(f"Falha no download yt-dlp: {str(e)}")
+    finally:
+        DownloadSchedulerService.release(lease, outcome, error_message)
 
     final_path = _find_downloaded_media_file(tmp_subdir)
     if not final_path:
         raise Exception("Arquivo de vídeo não encontrado após download")
 
+    if SourceCacheService.enabled():
+        try:
+            SourceCacheService.store(
+                SourceCacheService.key_from_info(info, format_selector),
+                final_path,
+                info,
+                aliases=[url_key, info_key],
+            )
+        except Exception as e:
+            logger.warning(f"[source_cache] Falha ao armazenar {source_url}: {e}")
+
     return {"video_path": final_path, "info": info}
 
 
-def _find_downloaded_media_file(download_dir: str) -> str | None:
+def _apply_download_lease(ydl_opts: dict, lease: dict) -> None:
+    if lease.get("proxy"):
+        ydl_opts["proxy"] = lease["proxy"]
+    if lease.get("concurrent_fragments", 1) > 1:
+        ydl_opts["concurrent_fragment_downloads"] = lease["concurrent_fragments"]
+    ydl_opts["progress_hooks"] = [DownloadSchedulerService.progress_hook(lease)]
+
+
+def _wants_audio_first(video: Video) -> bool:
+    if not video.source_url or video.storage_path:
+        return False
+    if not bool(getattr(settings, "AUDIO_FIRST_ACQUISITION", True)):
+        return False
+
+    # Com o vídeo no cache de origem o download é rápido; o áudio separado só duplicaria tráfego.
+    if SourceCacheService.enabled():
+        url_key = SourceCacheService.key_from_url(video.source_url, YT_DLP_FORMAT)
+        if SourceCacheService.get(url_key):
+            return False
+    return True
+
+
+def _fetch_from_source_cache(cache_key: str | None, download_dir: str) -> dict | None:
+    entry = SourceCacheService.get(cache_key)
+    if not entry:
+        return None
+
+    ext = os.path.splitext(entry.storage_path)[1] or ".mp4"
+    local_path = os.path.join(download_dir, f"download{ext}")
+    try:
+        SourceCacheService.fetch(entry, local_path)
+    except Exception as e:
+        logger.warning(f"[source_cache] Falha ao baixar {entry.cache_key} do cache; usando yt-dlp: {e}")
+        return None
+    return {"video_path": local_path, "info": dict(entry.info or {}), "cached": True}
+
+
+def _find_downloaded_media_file(download_dir: str, extensions: tuple = VIDEO_EXTENSIONS) -> str | None:
     try:
         candidates = []
         for name in os.listdir(download_dir):
@@ -206,7 +335,8 @@ def _find_downloaded_media_file(download_dir: str) -> str | None:
             if os.path.isdir(p):
                 continue
             lower = name.lower()
-            if lower.endswith((".mp4", ".mkv", ".mov", ".webm")):
+            # .temp.* é a saída intermediária do merge do yt-dlp (pode estar incompleta)
+            if lower.endswith(extensions) and ".temp." not in lower:
                 candidates.append(p)
         if not candidates:
             return None
@@ -230,6 +360,30 @@ def _map_yt_dlp_error_to_message(error_msg: str, source_url: str) -> str:
     return f"Erro ao baixar vídeo via yt-dlp: {error_msg}"
 
 
+def _classify_yt_dlp_error(error_msg: str) -> str | None:
+    """Código de erro quando a falha é definitiva; None se vale retentar."""
+    msg = (error_msg or "").lower()
+
+    # "Sign in to confirm you're not a bot" é bloqueio do IP/proxy, não do vídeo
+    if "not a bot" in msg:
+        return None
+    if "private" in msg or "login" in msg or "sign in" in msg:
+        return "VIDEO_PRIVATE"
+    if "geo" in msg or "in your country" in msg:
+        return "GEO_BLOCKED"
+    if "removed" in msg or "unavailable" in msg or "not available" in msg or "does not exist" in msg:
+        return "VIDEO_NOT_FOUND"
+    return None
+
+
+def _yt_dlp_error(error_msg: str, source_url: str) -> Exception:
+    message = _map_yt_dlp_error_to_message(error_msg, source_url)
+    error_code = _classify_yt_dlp_error(error_msg)
+    if error_code:
+        return NonRetryableDownloadError(message, error_code)
+    return Exception(message)
+
+
 def _guess_title_from_ydl_info(info: dict, fallback: str) -> str:
     title = (info or {}).get("title")
     if title and isinstance(title, str):
@@ -255,39 +409,27 @@ def _cleanup_temp_download_files(output_dir: str) -> None:
             pass
 
 
-def _validate_video(video_path: str) -> tuple:
-    ffprobe_path = getattr(settings, "FFMPEG_PATH", "ffmpeg").replace("ffmpeg", "ffprobe")
-    timeout = 30
-
+def _validate_video(video_path: str, video: Video = None) -> tuple:
     try:
-        cmd = [
-            ffprobe_path,
-            "-v", "error",
-            "-show_entries", "stream=codec_type,width,height,codec_name:format=duration",
-            "-of", "json",
-            video_path,
-        ]
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True, timeout=timeout)
-        
-        data = json.loads(result.stdout)
-        
-        format_info = data.get('format', {})
-        streams = data.get('streams', [])
+        metadata = MediaProbeService.probe(video_path, video=video, name="original")
+    except Exception as e:
+        raise Exception(f"Erro ao extrair metadados: {e}")
+    return _validate_metadata(metadata, video_path)
 
-        duration = float(format_info.get('duration', 0))
-        
-        video_stream = next((s for s in streams if s['codec_type'] == 'video'), None)
-        audio_stream = next((s for s in streams if s['codec_type'] == 'audio'), None)
 
-        if not video_stream:
+def _validate_metadata(metadata: dict, label: str) -> tuple:
+    try:
+        duration = float(metadata.get("duration") or 0)
+
+        if not metadata.get("has_video"):
             raise Exception("Arquivo não possui stream de vídeo válido")
         
-        if not audio_stream:
-            logger.warning(f"Vídeo {video_path} não possui áudio")
+        if not metadata.get("has_audio"):
+            logger.warning(f"Vídeo {label} não possui áudio")
 
-        width = int(video_stream.get('width', 0))
-        height = int(video_stream.get('height', 0))
-        codec = video_stream.get('codec_name', '')
+        width = int(metadata.get("width") or 0)
+        height = int(metadata.get("height") or 0)
+        codec = metadata.get("video_codec") or ""
         resolution = f"{width}x{height}"
 
         if duration < 5:
@@ -300,14 +442,95 @@ def _validate_video(video_path: str) -> tuple:
         logger.info(f"Vídeo validado: {resolution} | {codec} | {duration}s")
         return duration, resolution, codec
 
-    except subprocess.TimeoutExpired:
-        raise Exception(f"Timeout ao validar vídeo (ffprobe demorou mais de {timeout}s)")
-    except subprocess.CalledProcessError as e:
-        raise Exception(f"Erro ao validar vídeo: {e.stderr or e}")
     except Exception as e:
         raise Exception(f"Erro ao extrair metadados: {e}")
 
 
+def _stream_ingest_from_r2(video: Video, storage: R2StorageService, local_video_path: str, output_dir: str) -> dict | None:
+    """
+    Valida pelo ffprobe remoto e normaliza enquanto os bytes chegam do R2.
+
+    Returns:
+        {"metadata", "normalized", "normalized_path", "content_hash"} ou None se o container
+        não puder ser lido sequencialmente (ex: MP4 com moov no final) ou se a sondagem
+        remota falhar; só uma rejeição de `_validate_metadata` é propagada
+    """
+    key = video.storage_path
+    try:
+        metadata = MediaProbeService.probe_object(key, video=video, name="original", storage=storage)
+    except Exception as e:
+        # Falha de rede/assinatura da URL não deve derrubar a tentativa: o download completo resolve
+        logger.warning(f"[ingest] ffprobe remoto falhou para {key}; usando download completo: {e}")
+        return None
+
+    # Falha rápido (duração/resolução) antes de transferir o arquivo.
+    _validate_metadata(metadata, key)
+
+    try:
+        info = storage.get_object_info(key)
+        stream_friendly = bool(info) and _is_stream_friendly(storage, key, metadata, info["size"])
+    except Exception as e:
+        logger.warning(f"[ingest] Não foi possível preparar o streaming de {key}; usando download completo: {e}")
+        return None
+
+    if not stream_friendly:
+        logger.info(f"[ingest] {key} não é sequencial (moov no final?); usando download completo")
+        return None
+
+    normalized_path = os.path.join(output_dir, "video_normalized.mp4")
+    logger.info(f"[ingest] Streaming do R2 para ffmpeg: {key} ({info['size']} bytes)")
+    # O sha256 do original é calculado sobre os mesmos chunks (o artefato não precisa reler o arquivo)
+    digest = hashlib.sha256()
+    normalized = _normalize_from_stream(
+        _hashed_chunks(storage.iter_object_chunks(key, size=info["size"]), digest),
+        normalized_path,
+        metadata,
+        tee_path=local_video_path,
+    )
+    return {
+        "metadata": metadata,
+        "normalized": normalized,
+        "normalized_path": normalized_path,
+        "content_hash": digest.hexdigest(),
+    }
+
+
+def _hashed_chunks(chunks, digest):
+    for chunk in chunks:
+        digest.update(chunk)
+        yield chunk
+
+
+def _is_stream_friendly(storage: R2StorageService, key: str, metadata: dict, size: int) -> bool:
+    format_name = (metadata.get("format_name") or "").lower()
+    if "matroska" in format_name or "webm" in format_name:
+        return True
+    if "mp4" in format_name or "mov" in format_name:
+        header = storage.read_range(key, 0, min(size, 1024 * 1024) - 1)
+        return _has_leading_moov(header)
+    return False
+
+
+def _has_leading_moov(header: bytes) -> bool:
+    # Percorre os boxes de topo do MP4: stdin não permite seek, então o moov precisa vir antes do mdat.
+    offset = 0
+    while offset + 8 <= len(header):
+        box_size = int.from_bytes(header[offset:offset + 4], "big")
+        box_type = header[offset + 4:offset + 8]
+        if box_type == b"moov":
+            return True
+        if box_type == b"mdat":
+            return False
+        if box_size == 1:
+            if offset + 16 > len(header):
+                break
+            box_size = int.from_bytes(header[offset + 8:offset + 16], "big")
+        if box_size < 8:
+            return False
+        offset += box_size
+    return False
+
+
 def _get_error_code(error_message: str) -> str:
     """
     Mapeia mensagem de erro para código de erro.
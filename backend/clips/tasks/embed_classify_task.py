@@ -7,7 +7,8 @@ import google.generativeai as genai
 
 from ..models import Video, Transcript, Organization
 from ..services.embedding_cache_service import EmbeddingCacheService
-from .job_utils import get_plan_tier, update_job_status
+from .job_utils import update_job_status
+from .pipeline import advance_pipeline, skip_if_fresh
 
 logger = logging.getLogger(__name__)
 
@@ -18,6 +19,8 @@ _DEFAULT_VIRAL_EMBEDDING = None
 def embed_classify_task(self, video_id: str) -> dict:
     try:
         video = Video.objects.get(video_id=video_id)
+        if skip_if_fresh(video_id, "embed"):
+            return {"video_id": str(video.video_id), "status": "skipped"}
         org = Organization.objects.get(organization_id=video.organization_id)
         
         video.status = "embedding"
@@ -80,11 +83,7 @@ def embed_classify_task(self, video_id: str) -> dict:
         
         update_job_status(str(video.video_id), "selecting", progress=60, current_step="selecting")
 
-        from .select_clips_task import select_clips_task
-        select_clips_task.apply_async(
-            args=[str(video.video_id)],
-            queue=f"video.select.{get_plan_tier(org.plan)}",
-        )
+        advance_pipeline(str(video.video_id), "embed")
 
         return {
             "video_id": str(video.video_id),
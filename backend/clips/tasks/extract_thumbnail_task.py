@@ -1,12 +1,17 @@
 import logging
-import cv2
 import os
 import glob
 import subprocess
 from celery import shared_task
-from ..models import Video, Organization
+from ..models import Video
 from ..services.storage_service import R2StorageService
-from .job_utils import get_plan_tier, update_job_status
+from ..services.artifact_service import ArtifactService
+from ..services.frame_cache_service import FrameCacheService
+from ..services.face_detection_service import FaceDetectionService
+from ..services.scene_cut_service import SceneCutService
+from ..services.thumbnail_service import ThumbnailService
+from .job_utils import update_job_status
+from .pipeline import advance_pipeline, skip_if_fresh
 
 logger = logging.getLogger(__name__)
 
@@ -14,64 +19,42 @@ logger = logging.getLogger(__name__)
 @shared_task(bind=True, max_retries=3)
 def extract_thumbnail_task(self, video_id: str):
     video = None
-    cap = None
     thumbnail_path = None
     
     try:
         logger.info(f"Iniciando extração de thumbnail para video_id={video_id}")
         
         video = Video.objects.get(video_id=video_id)
+        if skip_if_fresh(video_id, "thumbnail"):
+            return {"video_id": str(video.video_id), "status": "skipped"}
         
-        video.current_step = "extracting_thumbnail"
-        video.save()
-        update_job_status(str(video_id), "extracting_thumbnail", progress=15, current_step="extracting_thumbnail")
-        
+        # Roda em paralelo ao ramo transcribe -> select -> reframe (depois do normalize),
+        # então não altera status/progresso do vídeo.
         from django.conf import settings
         video_dir = os.path.join(settings.MEDIA_ROOT, f"videos/{video_id}")
-        video_path = None
-
-        potential_path = os.path.join(video_dir, "video_original.mp4")
-        if os.path.exists(potential_path):
-            video_path = potential_path
-        else:
-            search_patterns = ['*.mp4', '*.mkv', '*.mov', '*.webm']
-            for pattern in search_patterns:
-                files = glob.glob(os.path.join(video_dir, pattern))
-                if files:
-                    video_path = files[0]
-                    break
-        
-        if not video_path and video.file and os.path.exists(video.file.path):
-            video_path = video.file.path
-
-        if not video_path:
-            raise Exception(f"Arquivo de vídeo não encontrado em {video_dir}")
-
-        logger.info(f"Arquivo de vídeo localizado: {video_path}")
-        
-        cap = cv2.VideoCapture(video_path)
-        
-        if not cap.isOpened():
-            raise Exception(f"Não foi possível abrir o arquivo de vídeo: {video_path}")
-        
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        
-        if total_frames <= 0:
-            raise Exception("Vídeo não possui frames ou está corrompido")
-        
-        target_frame = int(total_frames * 0.25)
-        cap.set(cv2.CAP_PROP_POS_FRAMES, target_frame)
-        
-        ret, frame = cap.read()
+        normalized_path = os.path.join(video_dir, "video_normalized.mp4")
 
-        if not ret:
-            cap.set(cv2.CAP_PROP_POS_FRAMES, 1)
-            ret, frame = cap.read()
+        thumbnail_dir = os.path.join(video_dir, 'thumbnails')
+        os.makedirs(thumbnail_dir, exist_ok=True)
+        thumbnail_path = os.path.join(thumbnail_dir, f"{video_id}_thumb.jpg")
 
-        if not ret:
-            thumbnail_dir = os.path.join(video_dir, 'thumbnails')
-            os.makedirs(thumbnail_dir, exist_ok=True)
-            thumbnail_path = os.path.join(thumbnail_dir, f"{video_id}_thumb.jpg")
+        chosen = None
+        try:
+            stack = FrameCacheService.ensure(video, video_dir, normalized_path)
+            if stack is not None:
+                chosen = _best_frame_from_stack(video, video_dir, stack)
+        except Exception as e:
+            logger.warning(f"Pilha de frames indisponível para video_id={video_id}; extraindo com ffmpeg: {e}")
+
+        if chosen is not None:
+            ts, frame = chosen
+            # Escolha na pilha; o JPEG sai do normalizado em resolução cheia
+            source_path = normalized_path if ArtifactService.try_ensure_local(video, "normalized", normalized_path) else None
+            ThumbnailService.save(frame, thumbnail_path, source_path=source_path, ts=ts, max_dim=320, quality=80)
+            logger.info(f"Thumbnail escolhida em t={ts:.1f}s para video_id={video_id}")
+        else:
+            video_path = _locate_video_file(video, video_dir, normalized_path)
+            logger.info(f"Arquivo de vídeo localizado: {video_path}")
 
             ffmpeg_path = getattr(settings, "FFMPEG_PATH", "ffmpeg")
             ts = max(float(video.duration or 0) * 0.25, 1.0)
@@ -80,74 +63,26 @@ def extract_thumbnail_task(self, video_id: str):
                 "-ss", str(ts),
                 "-i", video_path,
                 "-frames:v", "1",
-                "-vf", "scale=320:-1",
+                "-vf", "scale=320:-2",
                 "-q:v", "4",
                 "-y",
                 thumbnail_path,
             ]
             subprocess.run(cmd, capture_output=True, text=True, check=True)
+            if not os.path.exists(thumbnail_path):
+                raise Exception(f"ffmpeg não gerou a thumbnail de {video_path}")
 
-            logger.info(f"Fazendo upload da thumbnail para R2...")
-            storage = R2StorageService()
-            r2_thumbnail_path = storage.upload_thumbnail(thumbnail_path, video.organization_id, video_id)
-
-            video.thumbnail_storage_path = r2_thumbnail_path
-            video.last_successful_step = "extracting_thumbnail"
-            video.status = "normalizing"
-            video.current_step = "normalizing"
-            video.save()
-
-            logger.info(f"Thumbnail salva com sucesso: {r2_thumbnail_path}")
-            update_job_status(str(video_id), "normalizing", progress=20, current_step="normalizing")
-
-            org = Organization.objects.get(organization_id=video.organization_id)
-
-            from .normalize_video_task import normalize_video_task
-            normalize_video_task.apply_async(
-                args=[str(video_id)],
-                queue=f"video.normalize.{get_plan_tier(org.plan)}",
-            )
-
-            return str(video_id)
-
-        original_height, original_width = frame.shape[:2]
-        max_dim = 320
-        
-        ratio = min(max_dim / original_width, max_dim / original_height)
-        new_width = int(original_width * ratio)
-        new_height = int(original_height * ratio)
-        
-        frame = cv2.resize(frame, (new_width, new_height), interpolation=cv2.INTER_AREA)
-        
-        thumbnail_dir = os.path.join(video_dir, 'thumbnails')
-        os.makedirs(thumbnail_dir, exist_ok=True)
-        
-        thumbnail_path = os.path.join(thumbnail_dir, f"{video_id}_thumb.jpg")
-        
-        cv2.imwrite(thumbnail_path, frame, [cv2.IMWRITE_JPEG_QUALITY, 80])
-        
         logger.info(f"Fazendo upload da thumbnail para R2...")
         storage = R2StorageService()
         r2_thumbnail_path = storage.upload_thumbnail(thumbnail_path, video.organization_id, video_id)
-        
-        video.thumbnail_storage_path = r2_thumbnail_path
-        video.last_successful_step = "extracting_thumbnail"
-        video.status = "normalizing"
-        video.current_step = "normalizing"
-        video.save()
-        
+
+        # update() em vez de save(): as etapas paralelas gravam a mesma linha
+        Video.objects.filter(video_id=video.video_id).update(thumbnail_storage_path=r2_thumbnail_path)
+
         logger.info(f"Thumbnail salva com sucesso: {r2_thumbnail_path}")
-        
-        update_job_status(str(video_id), "normalizing", progress=20, current_step="normalizing")
-        
-        org = Organization.objects.get(organization_id=video.organization_id)
-        
-        from .normalize_video_task import normalize_video_task
-        normalize_video_task.apply_async(
-            args=[str(video_id)],
-            queue=f"video.normalize.{get_plan_tier(org.plan)}",
-        )
-        
+
+        advance_pipeline(str(video_id), "thumbnail")
+
         return str(video_id)
 
     except Video.DoesNotExist:
@@ -165,10 +100,43 @@ def extract_thumbnail_task(self, video_id: str):
             raise e
             
     finally:
-        if cap:
-            cap.release()
         if thumbnail_path and os.path.exists(thumbnail_path):
             try:
                 os.remove(thumbnail_path)
             except OSError:
                 pass
+
+
+def _best_frame_from_stack(video: Video, video_dir: str, stack: dict) -> tuple:
+    """K candidatos pelo vídeo, longe de cortes, pontuados em lote (nitidez, exposição, rosto)."""
+    cuts = SceneCutService.get(video, video_dir)
+    times = ThumbnailService.candidate_times(0.0, stack["duration"], cuts)
+
+    faces = None
+    try:
+        source = {"kind": "stack", "path": stack["path"], "fps": stack["fps"], "count": len(stack["timestamps"])}
+        faces = [c is not None for c in FaceDetectionService.detect(source, times.tolist())]
+    except Exception as e:
+        logger.warning(f"Detecção de rosto indisponível para a thumbnail de video_id={video.video_id}: {e}")
+
+    return ThumbnailService.best_frame(stack, times, faces=faces)
+
+
+def _locate_video_file(video: Video, video_dir: str, normalized_path: str) -> str:
+    if ArtifactService.try_ensure_local(video, "normalized", normalized_path):
+        return normalized_path
+
+    potential_path = os.path.join(video_dir, "video_original.mp4")
+    if ArtifactService.try_ensure_local(video, "original", potential_path):
+        return potential_path
+
+    search_patterns = ['*.mp4', '*.mkv', '*.mov', '*.webm']
+    for pattern in search_patterns:
+        files = glob.glob(os.path.join(video_dir, pattern))
+        if files:
+            return files[0]
+
+    if video.file and os.path.exists(video.file.path):
+        return video.file.path
+
+    raise Exception(f"Arquivo de vídeo não encontrado em {video_dir}")
@@ -1,8 +1,28 @@
 import logging
-from ..models import Job
+from django.db.models import Q
+from ..models import Job, Video
 
 logger = logging.getLogger(__name__)
 
+# Ordem das etapas do vídeo. Com ramos paralelos (áudio primeiro, thumbnail/reframe),
+# uma etapa que termina depois não pode devolver status/progresso para trás.
+VIDEO_STEP_ORDER = [
+    "ingestion",
+    "queued",
+    "downloading",
+    "normalizing",
+    "transcribing",
+    "analyzing",
+    "embedding",
+    "selecting",
+    "reframing",
+    "clipping",
+    "rendering",
+    "captioning",
+    "completed",
+    "done",
+]
+
 
 def get_plan_tier(plan: str | None) -> str:
     p = (plan or "").strip().lower()
@@ -13,7 +33,8 @@ def update_job_status(
     video_id: str,
     status: str,
     progress: int = None,
-    current_step: str = None
+    current_step: str = None,
+    forward_only: bool = False,
 ) -> bool:
 
     try:
@@ -27,10 +48,19 @@ def update_job_status(
         if current_step is not None:
             update_fields["current_step"] = current_step
 
-        affected = Job.objects.filter(video_id=video_id).update(**update_fields)
-        
+        jobs = Job.objects.filter(video_id=video_id)
+        if forward_only and progress is not None:
+            # Outro ramo do pipeline já passou deste ponto: não regride
+            if not jobs.exists():
+                logger.warning(f"[job_utils] Job não encontrado para video_id={video_id}")
+                return False
+            jobs = jobs.filter(progress__lte=progress)
+
+        affected = jobs.update(**update_fields)
+
         if affected == 0:
-            logger.warning(f"[job_utils] Job não encontrado para video_id={video_id}")
+            if not forward_only:
+                logger.warning(f"[job_utils] Job não encontrado para video_id={video_id}")
             return False
         
         logger.debug(
@@ -45,3 +75,55 @@ def update_job_status(
             exc_info=True
         )
         return False
+
+
+def advance_video_status(video_id: str, status: str, current_step: str = None, recover_step: str = None) -> bool:
+    """
+    Atualiza status/current_step do Video só se `status` estiver à frente do atual.
+
+    Args:
+        video_id: ID do vídeo
+        status: Novo status (etapa de VIDEO_STEP_ORDER)
+        current_step: Etapa atual (padrão: `status`)
+        recover_step: Etapa da própria task: sai de "failed" se a falha foi dela (retry)
+
+    Returns:
+        True se o status foi alterado
+    """
+    behind = VIDEO_STEP_ORDER[:VIDEO_STEP_ORDER.index(status)] if status in VIDEO_STEP_ORDER else []
+    condition = Q(status__in=behind) | Q(status__isnull=True)
+    if recover_step:
+        condition |= Q(status="failed", current_step=recover_step)
+
+    return bool(
+        Video.objects.filter(condition, video_id=video_id).update(status=status, current_step=current_step or status)
+    )
+
+
+def mark_step_succeeded(video_id: str, step: str) -> bool:
+    """Grava `last_successful_step` se `step` estiver à frente do registrado."""
+    behind = VIDEO_STEP_ORDER[:VIDEO_STEP_ORDER.index(step)] if step in VIDEO_STEP_ORDER else []
+    condition = Q(last_successful_step__in=behind) | Q(last_successful_step__isnull=True)
+    return bool(Video.objects.filter(condition, video_id=video_id).update(last_successful_step=step))
+
+
+def record_job_metrics(video_id: str, key: str, data) -> bool:
+    """Grava `data` em Job.metrics[key] (merge com as métricas existentes)."""
+    try:
+        job = Job.objects.filter(video_id=video_id).order_by("-created_at").first()
+        if not job:
+            logger.warning(f"[job_utils] Job não encontrado para métricas video_id={video_id}")
+            return False
+
+        metrics = dict(job.metrics or {})
+        metrics[key] = data
+        job.metrics = metrics
+        job.save(update_fields=["metrics"])
+        return True
+
+    except Exception as e:
+        logger.error(
+            f"[job_utils] Erro ao gravar métricas do job {video_id}: {e}",
+            exc_info=True
+        )
+        return False
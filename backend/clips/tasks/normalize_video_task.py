@@ -1,16 +1,25 @@
 import logging
 import os
 import glob
+import shutil
 import subprocess
-import json
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from celery import shared_task
 from django.conf import settings
 
 from ..models import Video, Organization
-from .job_utils import get_plan_tier, update_job_status
+from ..services.artifact_service import ArtifactService
+from ..services.media_probe_service import MediaProbeService
+from ..services.encoder_profile_service import EncoderProfileService
+from .job_utils import get_plan_tier, update_job_status, record_job_metrics, advance_video_status, mark_step_succeeded
+from .pipeline import advance_pipeline, skip_if_fresh
 
 logger = logging.getLogger(__name__)
 
+# Taxa de quadros do normalized
+NORMALIZED_FPS = 30
+
 
 @shared_task(bind=True, max_retries=5)
 def normalize_video_task(self, video_id: str) -> dict:
@@ -18,18 +27,19 @@ def normalize_video_task(self, video_id: str) -> dict:
         logger.info(f"Iniciando normalização de vídeo para video_id: {video_id}")
         
         video = Video.objects.get(video_id=video_id)
+        if skip_if_fresh(video_id, "normalize"):
+            return {"video_id": str(video.video_id), "status": "skipped"}
         org = Organization.objects.get(organization_id=video.organization_id)
-        
-        video.status = "normalizing"
-        video.current_step = "normalizing"
-        video.save()
+
+        # Sem save() completo: com áudio primeiro, a transcrição pode já estar adiante
+        advance_video_status(str(video.video_id), "normalizing", recover_step="normalizing")
 
         video_dir = os.path.join(settings.MEDIA_ROOT, f"videos/{video_id}")
         os.makedirs(video_dir, exist_ok=True)
 
         input_path = None
         potential_input = os.path.join(video_dir, "video_original.mp4")
-        if os.path.exists(potential_input):
+        if ArtifactService.try_ensure_local(video, "original", potential_input):
             input_path = potential_input
         else:
             patterns = ['*.mp4', '*.mkv', '*.mov', '*.webm', '*.avi']
@@ -44,42 +54,66 @@ def normalize_video_task(self, video_id: str) -> dict:
 
         output_path = os.path.join(video_dir, "video_normalized.mp4")
 
+        # Sem loudnorm aqui: o loudness é medido na extração de áudio da transcrição
+        # (que já decodifica o áudio) e aplicado no render dos clips, que recodifica o áudio
+        encoder_profile = None
+        mode = "transcode"
+
         # Fast-path: se já estiver num formato compatível, apenas remux/copy.
         # Isso evita recompressão (qualidade idêntica) e é muito mais rápido.
         try:
-            metadata = _probe_media(input_path)
+            metadata = MediaProbeService.probe(input_path, video=video, name="original")
             if _is_fastpath_eligible(metadata):
+                mode = "remux"
                 logger.info(
                     f"[normalize] Fast-path remux para {video_id}: "
                     f"v={metadata.get('video_codec')} a={metadata.get('audio_codec')} fps={metadata.get('fps')}"
                 )
                 _remux_copy(input_path, output_path)
             else:
-                _normalize_with_ffmpeg(input_path, output_path)
+                # Perfil do encoder por job: sob backlog na fila do tier, cai para presets mais rápidos.
+                tier = get_plan_tier(org.plan)
+                duration = float(metadata.get("duration") or 0)
+                if _wants_segmented(metadata):
+                    mode = "segmented"
+                encoder_profile = EncoderProfileService.select(
+                    "normalize",
+                    tier,
+                    media_seconds=duration,
+                    queue=f"video.normalize.{tier}",
+                    parallelism=_get_segment_concurrency(_segment_count(duration)) if mode == "segmented" else 1,
+                )
+                if mode == "segmented":
+                    _normalize_segmented(input_path, output_path, metadata, video_dir, encoder_profile)
+                else:
+                    _normalize_with_ffmpeg(input_path, output_path, encoder_profile)
         except Exception as e:
             logger.warning(f"[normalize] Fast-path falhou/indisponível, usando normalização completa: {e}")
-            _normalize_with_ffmpeg(input_path, output_path)
+            mode = "transcode"
+            _normalize_with_ffmpeg(input_path, output_path, encoder_profile)
+
+        record_job_metrics(str(video.video_id), "normalize", {"mode": mode, "encoder_profile": encoder_profile})
 
         if not os.path.exists(output_path):
             raise Exception("FFmpeg finalizou mas arquivo normalized não foi criado")
 
-        resolution = _get_video_resolution(output_path)
+        resolution = _get_video_resolution(output_path, video=video)
         file_size = os.path.getsize(output_path)
 
+        ArtifactService.publish(video, "normalized", output_path)
+
+        # Só os campos desta etapa: media_info e o status dos outros ramos
+        # foram gravados por eles enquanto o normalize rodava
         video.file_size = file_size
         video.resolution = resolution
-        video.last_successful_step = "normalizing"
-        video.status = "transcribing"
-        video.current_step = "transcribing"
-        video.save()
-        
-        update_job_status(str(video.video_id), "transcribing", progress=30, current_step="transcribing")
+        video.save(update_fields=["file_size", "resolution"])
+        mark_step_succeeded(str(video.video_id), "normalizing")
+        advance_video_status(str(video.video_id), "transcribing", recover_step="normalizing")
 
-        from .transcribe_video_task import transcribe_video_task
-        transcribe_video_task.apply_async(
-            args=[str(video.video_id)],
-            queue=f"video.transcribe.{get_plan_tier(org.plan)}",
-        )
+        update_job_status(str(video.video_id), "transcribing", progress=30, current_step="transcribing", forward_only=True)
+
+        # Libera transcrição e thumbnail em paralelo.
+        advance_pipeline(str(video.video_id), "normalize")
 
         return {
             "video_id": str(video.video_id),
@@ -98,7 +132,7 @@ def normalize_video_task(self, video_id: str) -> dict:
             video.error_code = "NORMALIZATION_ERROR"
             video.error_message = str(e)
             video.retry_count += 1
-            video.save()
+            video.save(update_fields=["status", "current_step", "error_code", "error_message", "retry_count"])
 
             if self.request.retries < self.max_retries:
                 raise self.retry(exc=e, countdown=2 ** self.request.retries)
@@ -106,33 +140,13 @@ def normalize_video_task(self, video_id: str) -> dict:
         return {"error": str(e), "status": "failed"}
 
 
-def _normalize_with_ffmpeg(input_path: str, output_path: str) -> None:
-    ffmpeg_path = getattr(settings, "FFMPEG_PATH", "ffmpeg")
+def _normalize_with_ffmpeg(
+    input_path: str,
+    output_path: str,
+    encoder_profile: dict = None,
+) -> None:
     ffmpeg_timeout = int(getattr(settings, "FFMPEG_TIMEOUT", 1800))
-
-    vf_filter = "scale='min(1920,iw)':'-2',pad=ceil(iw/2)*2:ceil(ih/2)*2"
-
-    cmd = [
-        ffmpeg_path,
-        "-y",
-        "-i", input_path,
-        
-        "-c:v", "libx264",
-        "-preset", "veryfast",
-        "-crf", "23",
-        "-r", "30",
-        "-pix_fmt", "yuv420p",
-        "-vf", vf_filter,
-        
-        "-c:a", "aac",
-        "-ar", "44100",
-        "-b:a", "128k",
-        "-af", "loudnorm=I=-16:TP=-1.5:LRA=11",
-        
-        "-movflags", "+faststart",
-        
-        output_path,
-    ]
+    cmd = _build_normalize_cmd(input_path, output_path, encoder_profile)
 
     try:
         subprocess.run(
@@ -151,75 +165,288 @@ def _normalize_with_ffmpeg(input_path: str, output_path: str) -> None:
         raise Exception(f"Normalização excedeu o tempo limite de {ffmpeg_timeout}s")
 
 
-def _get_video_resolution(video_path: str) -> str:
-    ffprobe_path = getattr(settings, "FFMPEG_PATH", "ffmpeg").replace("ffmpeg", "ffprobe")
+def _build_normalize_cmd(
+    input_path: str,
+    output_path: str,
+    encoder_profile: dict = None,
+) -> list:
+    ffmpeg_path = getattr(settings, "FFMPEG_PATH", "ffmpeg")
 
-    try:
-        cmd = [
-            ffprobe_path,
-            "-v", "error",
-            "-select_streams", "v:0",
-            "-show_entries", "stream=width,height",
-            "-of", "csv=p=0",
-            video_path,
-        ]
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-        
-        output = result.stdout.strip()
-        if not output:
-            return "0x0"
+    cmd = [
+        ffmpeg_path,
+        "-y",
+        "-i", input_path,
+        *_video_encode_args(encoder_profile),
+        *_audio_encode_args(),
+    ]
+    if encoder_profile and encoder_profile.get("threads"):
+        cmd.extend(["-threads", str(encoder_profile["threads"])])
+    cmd.extend([
+        "-movflags", "+faststart",
+        output_path,
+    ])
+    return cmd
 
-        width, height = map(int, output.split(","))
-        return f"{width}x{height}"
-    except Exception as e:
-        logger.warning(f"Não foi possível extrair resolução de {video_path}: {e}")
-        return "0x0"
+
+def _video_encode_args(encoder_profile: dict = None) -> list:
+    # Formato do normalized: H.264 30 fps yuv420p, no máximo 1920 de largura (dimensões pares).
+    # Preset/CRF vêm do perfil do encoder (padrão: "fast" = veryfast/23).
+    return [
+        *EncoderProfileService.encoder_args(encoder_profile, default="fast"),
+        "-r", str(NORMALIZED_FPS),
+        "-pix_fmt", "yuv420p",
+        "-vf", "scale='min(1920,iw)':'-2',pad=ceil(iw/2)*2:ceil(ih/2)*2",
+    ]
 
 
-def _probe_media(input_path: str) -> dict:
-    ffprobe_path = getattr(settings, "FFMPEG_PATH", "ffmpeg").replace("ffmpeg", "ffprobe")
-    timeout = 30
+def _audio_encode_args() -> list:
+    return [
+        "-c:a", "aac",
+        "-ar", "44100",
+        "-b:a", "128k",
+    ]
+
 
+def _wants_segmented(metadata: dict) -> bool:
+    if not bool(getattr(settings, "NORMALIZE_SEGMENTED", True)):
+        return False
+    min_duration = float(getattr(settings, "NORMALIZE_SEGMENT_MIN_DURATION", 1200))
+    return bool(metadata.get("has_video")) and float(metadata.get("duration") or 0) >= min_duration
+
+
+def _normalize_segmented(
+    input_path: str,
+    output_path: str,
+    metadata: dict,
+    video_dir: str,
+    encoder_profile: dict = None,
+) -> None:
+    """
+    Transcodifica vídeos longos em paralelo: o vídeo é dividido em trechos nos
+    keyframes, cada trecho vira um ffmpeg (só vídeo) e o áudio é codificado
+    inteiro numa passada à parte (sem emendas de priming do AAC). No fim, os
+    trechos são unidos pelo concat demuxer e o áudio é multiplexado em copy.
+
+    Os cortes caem em múltiplos de 1/30 s, então cada trecho tem um número exato de
+    quadros; mesmo assim a saída é sondada e, se o vídeo emendado derivar do áudio
+    mais de um quadro, a etapa falha para o caller cair no transcode em um processo.
+    """
+    duration = float(metadata.get("duration") or 0)
+    bounds = _plan_segments(input_path, duration)
+    concurrency = _get_segment_concurrency(len(bounds))
+    threads = max(1, (os.cpu_count() or 1) // concurrency)
+    ffmpeg_timeout = int(getattr(settings, "FFMPEG_TIMEOUT", 1800))
+
+    work_dir = os.path.join(video_dir, "_normalize_segments")
+    shutil.rmtree(work_dir, ignore_errors=True)
+    os.makedirs(work_dir, exist_ok=True)
+
+    logger.info(
+        f"[normalize] Modo segmentado: {len(bounds)} trechos de ~{duration / max(1, len(bounds)):.0f}s "
+        f"| {concurrency} em paralelo x {threads} threads"
+    )
+    try:
+        segment_paths = [os.path.join(work_dir, f"segment_{i:03d}.mp4") for i in range(len(bounds))]
+        audio_path = os.path.join(work_dir, "audio.m4a") if metadata.get("has_audio") else None
+
+        with ThreadPoolExecutor(max_workers=concurrency + (1 if audio_path else 0)) as pool:
+            futures = [
+                pool.submit(
+                    _run_ffmpeg, _build_segment_cmd(input_path, path, start, end, threads, encoder_profile), ffmpeg_timeout
+                )
+                for path, (start, end) in zip(segment_paths, bounds)
+            ]
+            if audio_path:
+                futures.append(pool.submit(_run_ffmpeg, _build_audio_only_cmd(input_path, audio_path), ffmpeg_timeout))
+            for future in futures:
+                future.result()
+
+        list_path = os.path.join(work_dir, "segments.txt")
+        with open(list_path, "w", encoding="utf-8") as f:
+            for path in segment_paths:
+                f.write(f"file '{path}'\n")
+
+        _run_ffmpeg(_build_concat_cmd(list_path, audio_path, output_path), ffmpeg_timeout)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    _check_segmented_sync(output_path, metadata)
+
+
+def _check_segmented_sync(output_path: str, source_metadata: dict) -> None:
+    """Falha se o vídeo emendado derivou do áudio (ou da duração do original) mais de um quadro."""
+    output = MediaProbeService.probe(output_path)
+    video_duration = output.get("video_duration")
+    if video_duration is None:
+        raise Exception("Não foi possível medir a duração do vídeo emendado")
+
+    if output.get("has_audio"):
+        audio_duration = output.get("audio_duration")
+        if audio_duration is None:
+            raise Exception("Não foi possível medir a duração do áudio do vídeo emendado")
+        # Diferença que o original já tinha entre vídeo e áudio não é deriva da emenda
+        source_video = source_metadata.get("video_duration")
+        source_audio = source_metadata.get("audio_duration")
+        offset = source_video - source_audio if source_video is not None and source_audio is not None else 0.0
+        drift = (video_duration - audio_duration) - offset
+    else:
+        drift = video_duration - float(source_metadata.get("video_duration") or source_metadata.get("duration") or 0)
+
+    if abs(drift) > 1.0 / NORMALIZED_FPS:
+        raise Exception(f"Normalização segmentada fora de sincronia: deriva de {drift * 1000:.0f} ms")
+
+
+def _plan_segments(input_path: str, duration: float) -> list:
+    """Limites [(início, fim|None)] dos trechos, cortando no keyframe mais próximo de cada alvo."""
+    segment_seconds = float(getattr(settings, "NORMALIZE_SEGMENT_SECONDS", 300))
+    num_segments = _segment_count(duration)
+    targets = [duration * i / num_segments for i in range(1, num_segments)]
+
+    keyframes = _find_keyframes_near(input_path, targets)
+    cuts = []
+    for target in targets:
+        nearby = [t for t in keyframes if abs(t - target) <= segment_seconds / 2]
+        cut = min(nearby, key=lambda t: abs(t - target)) if nearby else target
+        # Múltiplo de 1/30 s: cada trecho vira um número inteiro de quadros com -r 30 e o
+        # arredondamento não acumula na emenda (o seek decodifica no máximo até o quadro seguinte)
+        cut = round(cut * NORMALIZED_FPS) / NORMALIZED_FPS
+        if cut > (cuts[-1] if cuts else 0.0) + 1.0 and cut < duration - 1.0:
+            cuts.append(cut)
+
+    starts = [0.0] + cuts
+    ends = cuts + [None]
+    return list(zip(starts, ends))
+
+
+def _segment_count(duration: float) -> int:
+    segment_seconds = float(getattr(settings, "NORMALIZE_SEGMENT_SECONDS", 300))
+    return max(1, int(round(duration / max(1.0, segment_seconds))))
+
+
+def _find_keyframes_near(input_path: str, targets: list, window: float = 20.0) -> list:
+    """Keyframes (pts) em janelas curtas após cada alvo, lendo só pacotes (sem decodificar)."""
+    if not targets:
+        return []
+
+    ffprobe_path = getattr(settings, "FFMPEG_PATH", "ffmpeg").replace("ffmpeg", "ffprobe")
+    intervals = ",".join(f"{max(0.0, t - window / 2):.3f}%+{window:.0f}" for t in targets)
     cmd = [
         ffprobe_path,
         "-v", "error",
-        "-print_format", "json",
-        "-show_format",
-        "-show_streams",
+        "-select_streams", "v:0",
+        "-read_intervals", intervals,
+        "-show_entries", "packet=pts_time,flags",
+        "-of", "csv=p=0",
         input_path,
     ]
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, check=True, timeout=120)
+    except Exception as e:
+        logger.warning(f"[normalize] Não foi possível listar keyframes; cortes por tempo: {e}")
+        return []
+
+    keyframes = []
+    for line in result.stdout.splitlines():
+        pts, _, flags = line.partition(",")
+        if flags.startswith("K"):
+            try:
+                keyframes.append(float(pts))
+            except ValueError:
+                continue
+    return sorted(set(keyframes))
+
+
+def _get_segment_concurrency(num_segments: int) -> int:
+    cpu_count = os.cpu_count() or 1
+    configured = int(getattr(settings, "NORMALIZE_SEGMENT_CONCURRENCY", 0) or 0) or max(1, cpu_count // 2)
+    return max(1, min(configured, cpu_count, num_segments))
+
+
+def _build_segment_cmd(
+    input_path: str,
+    output_path: str,
+    start: float,
+    end: float | None,
+    threads: int,
+    encoder_profile: dict = None,
+) -> list:
+    ffmpeg_path = getattr(settings, "FFMPEG_PATH", "ffmpeg")
+
+    # -ss antes do -i: seek rápido até o keyframe; o corte fica a menos de 1/30 s dele, então o decode descartado é mínimo
+    cmd = [
+        ffmpeg_path,
+        "-y",
+        "-hide_banner",
+        "-loglevel", "error",
+        "-ss", f"{start:.6f}",
+        "-i", input_path,
+    ]
+    if end is not None:
+        cmd.extend(["-t", f"{end - start:.6f}"])
+    cmd.extend([
+        "-map", "0:v:0",
+        "-an",
+        *_video_encode_args(encoder_profile),
+        "-threads", str(threads),
+        output_path,
+    ])
+    return cmd
 
-    result = subprocess.run(cmd, capture_output=True, text=True, check=True, timeout=timeout)
-    data = json.loads(result.stdout or "{}")
-    streams = data.get("streams", [])
 
-    v = next((s for s in streams if s.get("codec_type") == "video"), None)
-    a = next((s for s in streams if s.get("codec_type") == "audio"), None)
+def _build_audio_only_cmd(input_path: str, output_path: str) -> list:
+    ffmpeg_path = getattr(settings, "FFMPEG_PATH", "ffmpeg")
 
-    def _parse_fps(s: dict | None) -> float | None:
-        if not s:
-            return None
-        # avg_frame_rate vem como "30000/1001" etc.
-        fr = s.get("avg_frame_rate") or s.get("r_frame_rate")
-        if not fr or fr == "0/0":
-            return None
-        try:
-            num, den = fr.split("/")
-            den_f = float(den)
-            return float(num) / den_f if den_f else None
-        except Exception:
-            return None
+    return [
+        ffmpeg_path,
+        "-y",
+        "-hide_banner",
+        "-loglevel", "error",
+        "-i", input_path,
+        "-map", "0:a:0",
+        "-vn",
+        *_audio_encode_args(),
+        output_path,
+    ]
 
-    return {
-        "format_name": (data.get("format", {}) or {}).get("format_name"),
-        "video_codec": (v or {}).get("codec_name"),
-        "audio_codec": (a or {}).get("codec_name"),
-        "pix_fmt": (v or {}).get("pix_fmt"),
-        "fps": _parse_fps(v),
-        "width": (v or {}).get("width"),
-        "height": (v or {}).get("height"),
-        "has_audio": bool(a),
-    }
+
+def _build_concat_cmd(list_path: str, audio_path: str | None, output_path: str) -> list:
+    ffmpeg_path = getattr(settings, "FFMPEG_PATH", "ffmpeg")
+
+    cmd = [
+        ffmpeg_path,
+        "-y",
+        "-hide_banner",
+        "-loglevel", "error",
+        "-f", "concat",
+        "-safe", "0",
+        "-i", list_path,
+    ]
+    if audio_path:
+        cmd.extend(["-i", audio_path, "-map", "0:v:0", "-map", "1:a:0"])
+    cmd.extend([
+        "-c", "copy",
+        "-movflags", "+faststart",
+        output_path,
+    ])
+    return cmd
+
+
+def _run_ffmpeg(cmd: list, timeout: int) -> None:
+    try:
+        subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, timeout=timeout, text=True)
+    except subprocess.CalledProcessError as e:
+        raise Exception(f"FFmpeg falhou: {(e.stderr or str(e))[-2000:]}")
+    except subprocess.TimeoutExpired:
+        raise Exception(f"FFmpeg excedeu o tempo limite de {timeout}s")
+
+
+def _get_video_resolution(video_path: str, video: Video = None) -> str:
+    try:
+        metadata = MediaProbeService.probe(video_path, video=video, name="normalized")
+        return MediaProbeService.resolution(metadata)
+    except Exception as e:
+        logger.warning(f"Não foi possível extrair resolução de {video_path}: {e}")
+        return "0x0"
 
 
 def _is_fastpath_eligible(metadata: dict) -> bool:
@@ -243,10 +470,22 @@ def _is_fastpath_eligible(metadata: dict) -> bool:
 
 
 def _remux_copy(input_path: str, output_path: str) -> None:
-    ffmpeg_path = getattr(settings, "FFMPEG_PATH", "ffmpeg")
     ffmpeg_timeout = int(getattr(settings, "FFMPEG_TIMEOUT", 1800))
 
-    cmd = [
+    subprocess.run(
+        _build_remux_cmd(input_path, output_path),
+        check=True,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        timeout=ffmpeg_timeout,
+        text=True,
+    )
+
+
+def _build_remux_cmd(input_path: str, output_path: str) -> list:
+    ffmpeg_path = getattr(settings, "FFMPEG_PATH", "ffmpeg")
+
+    return [
         ffmpeg_path,
         "-y",
         "-hide_banner",
@@ -259,11 +498,64 @@ def _remux_copy(input_path: str, output_path: str) -> None:
         output_path,
     ]
 
-    subprocess.run(
-        cmd,
-        check=True,
-        stdout=subprocess.DEVNULL,
-        stderr=subprocess.PIPE,
-        timeout=ffmpeg_timeout,
-        text=True,
-    )
+
+def _normalize_from_stream(chunks, output_path: str, metadata: dict, tee_path: str) -> bool:
+    """
+    Normaliza/remuxa lendo o original de um iterador de bytes (ffmpeg via stdin).
+
+    Cada chunk também é gravado em `tee_path`, então o original completo fica
+    em disco ao final mesmo que o ffmpeg falhe (nesse caso a normalização fica
+    para o normalize_video_task).
+
+    Returns:
+        True se `output_path` foi gerado com sucesso
+    """
+    ffmpeg_timeout = int(getattr(settings, "FFMPEG_TIMEOUT", 1800))
+    fastpath = _is_fastpath_eligible(metadata)
+    cmd = (_build_remux_cmd if fastpath else _build_normalize_cmd)("pipe:0", output_path)
+    logger.info(f"[normalize] Normalização em streaming ({'remux' if fastpath else 'transcode'}) para {output_path}")
+
+    tmp_tee = f"{tee_path}.part"
+    with open(tmp_tee, "wb") as tee, tempfile.TemporaryFile() as stderr_file:
+        # stderr em arquivo: um PIPE não lido travaria o ffmpeg enquanto escrevemos no stdin
+        proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=stderr_file)
+        ffmpeg_alive = True
+        try:
+            for chunk in chunks:
+                tee.write(chunk)
+                if ffmpeg_alive:
+                    try:
+                        proc.stdin.write(chunk)
+                    except BrokenPipeError:
+                        ffmpeg_alive = False
+        except Exception:
+            # Falha no download: encerra o ffmpeg e descarta o original parcial
+            proc.kill()
+            proc.wait()
+            tee.close()
+            os.remove(tmp_tee)
+            raise
+        finally:
+            try:
+                proc.stdin.close()
+            except (BrokenPipeError, ValueError):
+                pass
+
+        try:
+            returncode = proc.wait(timeout=ffmpeg_timeout)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+            returncode = -1
+
+        stderr_file.seek(0)
+        error_msg = stderr_file.read().decode("utf-8", errors="replace")[-2000:]
+
+    os.replace(tmp_tee, tee_path)
+
+    if returncode != 0 or not os.path.exists(output_path):
+        logger.warning(f"[normalize] Streaming falhou (rc={returncode}); normalização seguirá pelo arquivo: {error_msg}")
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        return False
+    return True
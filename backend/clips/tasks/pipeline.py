@@ -0,0 +1,562 @@
+"""
+DAG declarativo do pipeline de processamento de vídeo.
+
+Cada task, ao concluir, chama `advance_pipeline(video_id, stage)`; o scheduler
+dispara todas as etapas cujas dependências já terminaram (e cujos artefatos
+de entrada existem). Etapas independentes rodam em paralelo:
+
+    download -> normalize
+    normalize -> (thumbnail || transcribe -> analyze -> embed -> select)
+    select -> reframe -> clip
+
+`reframe` analisa só as janelas dos clips selecionados (custo proporcional à
+duração somada dos clips) e grava uma trajetória de recorte por clip.
+
+Para URLs externas, `audio` (só a faixa de áudio) roda em paralelo ao
+download e é um caminho alternativo (`alt_deps`) para liberar `transcribe`
+antes do vídeo terminar de baixar e normalizar.
+
+Cada etapa concluída grava um StageCheckpoint com o fingerprint de suas
+entradas (hash dos artefatos + fingerprints das dependências), configuração
+e versão do código. `resume_pipeline` reentra no DAG apenas pelas etapas
+obsoletas; as tasks usam `skip_if_fresh` para não refazer trabalho válido.
+
+`thumbnail` e `reframe` leem a mesma pilha de frames amostrados do vídeo
+normalizado (FrameCacheService), construída por quem chegar primeiro. O índice
+de cortes de cena calculado sobre ela é usado por select, reframe e thumbnails.
+"""
+
+import hashlib
+import json
+import logging
+import os
+from importlib import import_module
+from django.conf import settings
+from django.core.cache import cache
+
+from ..models import Video, Transcript, Organization, VideoArtifact, StageCheckpoint, Clip, Job
+from .job_utils import get_plan_tier, update_job_status
+
+logger = logging.getLogger(__name__)
+
+PIPELINE_STATE_TTL = 86400 * 3
+
+# stage -> (módulo, task, prefixo da fila, dependências)
+# alt_deps: conjunto alternativo que também libera a etapa (o primeiro a completar vence)
+# optional: etapa que só existe em alguns modos (não entra na retomada sem checkpoint)
+PIPELINE_STAGES = {
+    "audio": {"task": ("acquire_audio_task", "acquire_audio_task"), "queue": "download", "deps": [], "optional": True},
+    "download": {"task": ("download_video_task", "download_video_task"), "queue": "download", "deps": []},
+    "normalize": {"task": ("normalize_video_task", "normalize_video_task"), "queue": "normalize", "deps": ["download"]},
+    "thumbnail": {"task": ("extract_thumbnail_task", "extract_thumbnail_task"), "queue": "normalize", "deps": ["normalize"]},
+    "transcribe": {"task": ("transcribe_video_task", "transcribe_video_task"), "queue": "transcribe", "deps": ["normalize"], "alt_deps": ["audio"]},
+    "analyze": {"task": ("analyze_semantic_task", "analyze_semantic_task"), "queue": "analyze", "deps": ["transcribe"]},
+    "embed": {"task": ("embed_classify_task", "embed_classify_task"), "queue": "classify", "deps": ["analyze"]},
+    "select": {"task": ("select_clips_task", "select_clips_task"), "queue": "select", "deps": ["embed"]},
+    "reframe": {"task": ("reframe_video_task", "reframe_video_task"), "queue": "reframe", "deps": ["normalize", "select"]},
+    "clip": {"task": ("clip_generation_task", "clip_generation_task"), "queue": "clip", "deps": ["select", "reframe"]},
+}
+
+# Versão do código de cada etapa: incremente ao mudar a lógica/formato da saída.
+STAGE_CODE_VERSIONS = {
+    "audio": 1,
+    "download": 1,
+    "thumbnail": 4,
+    "normalize": 3,
+    "transcribe": 1,
+    "analyze": 1,
+    "embed": 1,
+    "select": 2,
+    "reframe": 5,
+    "clip": 2,
+}
+
+# Settings que alteram a saída de cada etapa (entram no fingerprint)
+STAGE_CONFIG_SETTINGS = {
+    "audio": ["AUDIO_FIRST_FORMAT"],
+    "transcribe": [
+        "WHISPER_MODEL",
+        "WHISPER_WORD_TIMESTAMPS",
+        "WHISPER_BEAM_SIZE",
+        "WHISPER_BEST_OF",
+        "WHISPER_MAX_AUDIO_SECONDS",
+        "GEMINI_REFINE_WHISPER_TRANSCRIPT",
+        "GEMINI_REFINE_MODEL",
+        "GEMINI_REFINE_TEMPERATURE",
+        "GEMINI_REFINE_MAX_SEGMENTS",
+    ],
+    "select": [
+        "MIN_TARGET_CLIPS",
+        "MAX_TARGET_CLIPS",
+        "SCENE_CUT_THRESHOLD",
+        "SCENE_CUT_LOCAL_RATIO",
+        "SCENE_CUT_LOCAL_WINDOW",
+        "SCENE_MIN_SHOT_SECONDS",
+        "SCENE_SNAP_TOLERANCE_SECONDS",
+        "SCENE_SNAP_FORWARD_SECONDS",
+    ],
+    "thumbnail": [
+        "THUMBNAIL_CANDIDATES",
+        "REFRAME_DETECT_WIDTH",
+        "REFRAME_MIN_DETECTION_CONFIDENCE",
+        "SCENE_CUT_THRESHOLD",
+        "SCENE_CUT_LOCAL_RATIO",
+        "SCENE_CUT_LOCAL_WINDOW",
+        "SCENE_MIN_SHOT_SECONDS",
+        "FRAME_CACHE_ENABLED",
+        "FRAME_CACHE_FPS",
+        "FRAME_CACHE_WIDTH",
+        "FRAME_CACHE_MAX_FRAMES",
+    ],
+    "reframe": [
+        "REFRAME_SAMPLE_EVERY_SECONDS",
+        "REFRAME_SMOOTHING_SECONDS",
+        "REFRAME_KEYFRAME_TOLERANCE_PX",
+        "REFRAME_MAX_KEYFRAMES",
+        "REFRAME_DETECT_WIDTH",
+        "REFRAME_MIN_DETECTION_CONFIDENCE",
+        "THUMBNAIL_CANDIDATES",
+        "SCENE_CUT_THRESHOLD",
+        "SCENE_CUT_LOCAL_RATIO",
+        "SCENE_CUT_LOCAL_WINDOW",
+        "SCENE_MIN_SHOT_SECONDS",
+        "FRAME_CACHE_ENABLED",
+        "FRAME_CACHE_FPS",
+        "FRAME_CACHE_WIDTH",
+        "FRAME_CACHE_MAX_FRAMES",
+    ],
+    "clip": ["LOUDNESS_TARGET_I", "LOUDNESS_TARGET_TP", "LOUDNESS_TARGET_LRA", "LOUDNESS_TOLERANCE_LU"],
+}
+
+# Etapas cuja saída depende de Job.configuration (durações, número de clips, ...)
+STAGE_USES_JOB_CONFIG = {"analyze", "select", "clip"}
+
+# Artefatos consumidos por cada etapa (hash de conteúdo entra no fingerprint)
+STAGE_INPUT_ARTIFACTS = {
+    "thumbnail": ["normalized"],
+    "normalize": ["original"],
+    "transcribe": ["normalized"],
+    "analyze": ["transcript"],
+    "reframe": ["normalized"],
+    "clip": ["reframe"],
+}
+
+# Artefatos consumidos quando a etapa roda pelo caminho `alt_deps`
+STAGE_ALT_INPUT_ARTIFACTS = {
+    "transcribe": ["audio"],
+}
+
+# Job.current_step -> etapa do DAG
+STEP_TO_STAGE = {
+    "downloading": "download",
+    "extracting_thumbnail": "thumbnail",
+    "normalizing": "normalize",
+    "transcribing": "transcribe",
+    "analyzing": "analyze",
+    "embedding": "embed",
+    "selecting": "select",
+    "reframing": "reframe",
+    "clipping": "clip",
+    "rendering": "clip",
+}
+
+# Etapa do DAG -> Job.current_step (primeiro passo de cada etapa)
+STAGE_TO_STEP = {stage: step for step, stage in reversed(STEP_TO_STAGE.items())}
+
+
+def _video_dir(video_id: str) -> str:
+    return os.path.join(settings.MEDIA_ROOT, f"videos/{video_id}")
+
+
+def _has_artifact(video_id: str, name: str) -> bool:
+    return VideoArtifact.objects.filter(video_id=video_id, name=name).exists()
+
+
+def _has_original(video_id: str) -> bool:
+    if _has_artifact(video_id, "original"):
+        return True
+    video_dir = _video_dir(video_id)
+    if not os.path.isdir(video_dir):
+        return False
+    return any(
+        name.startswith("video_original") or name.lower().endswith((".mp4", ".mkv", ".mov", ".webm", ".avi"))
+        for name in os.listdir(video_dir)
+    )
+
+
+def _has_normalized(video_id: str) -> bool:
+    if _has_artifact(video_id, "normalized"):
+        return True
+    return os.path.exists(os.path.join(_video_dir(video_id), "video_normalized.mp4"))
+
+
+def _has_transcript(video_id: str) -> bool:
+    return Transcript.objects.filter(video_id=video_id).exists()
+
+
+def _has_analysis(video_id: str) -> bool:
+    transcript = Transcript.objects.filter(video_id=video_id).first()
+    return bool(transcript and transcript.analysis_data is not None)
+
+
+def _has_selected_clips(video_id: str) -> bool:
+    transcript = Transcript.objects.filter(video_id=video_id).first()
+    return bool(transcript and transcript.selected_clips)
+
+
+def _has_reframe_data(video_id: str) -> bool:
+    transcript = Transcript.objects.filter(video_id=video_id).first()
+    if transcript and transcript.reframe_data:
+        return True
+    if _has_artifact(video_id, "reframe"):
+        return True
+    return os.path.exists(os.path.join(_video_dir(video_id), "reframe.json"))
+
+
+def _has_audio_source(video_id: str) -> bool:
+    return _has_artifact(video_id, "audio")
+
+
+# (dep, stage) -> verificação do artefato produzido por `dep` e consumido por `stage`
+EDGE_ARTIFACT_CHECKS = {
+    ("audio", "transcribe"): _has_audio_source,
+    ("download", "normalize"): _has_original,
+    ("normalize", "thumbnail"): _has_normalized,
+    ("normalize", "transcribe"): _has_normalized,
+    ("normalize", "reframe"): _has_normalized,
+    ("select", "reframe"): _has_selected_clips,
+    ("transcribe", "analyze"): _has_transcript,
+    ("analyze", "embed"): _has_analysis,
+    ("embed", "select"): _has_analysis,
+    ("select", "clip"): _has_selected_clips,
+    ("reframe", "clip"): _has_reframe_data,
+}
+
+
+def _has_thumbnail(video_id: str) -> bool:
+    return Video.objects.filter(video_id=video_id).exclude(thumbnail_storage_path__isnull=True).exclude(thumbnail_storage_path="").exists()
+
+
+def _has_rendered_clips(video_id: str) -> bool:
+    transcript = Transcript.objects.filter(video_id=video_id).first()
+    expected = len((transcript.selected_clips if transcript else None) or [])
+    return expected > 0 and Clip.objects.filter(video_id=video_id).count() >= expected
+
+
+# stage -> verificação de que a saída da etapa ainda existe
+STAGE_OUTPUT_CHECKS = {
+    "audio": _has_audio_source,
+    "download": _has_original,
+    "thumbnail": _has_thumbnail,
+    "normalize": _has_normalized,
+    "transcribe": _has_transcript,
+    "analyze": _has_analysis,
+    "embed": _has_analysis,
+    "select": _has_selected_clips,
+    "reframe": _has_reframe_data,
+    "clip": _has_rendered_clips,
+}
+
+
+def _done_key(video_id: str, stage: str) -> str:
+    return f"pipeline:{video_id}:done:{stage}"
+
+
+def _dispatched_key(video_id: str, stage: str) -> str:
+    return f"pipeline:{video_id}:dispatched:{stage}"
+
+
+def reset_pipeline(video_id: str) -> None:
+    """Limpa o estado do DAG (início de um novo processamento)."""
+    keys = []
+    for stage in PIPELINE_STAGES:
+        keys.append(_done_key(video_id, stage))
+        keys.append(_dispatched_key(video_id, stage))
+    cache.delete_many(keys)
+
+
+def get_pipeline_state(video_id: str) -> dict:
+    """Retorna {stage: done?} para o vídeo."""
+    done = cache.get_many([_done_key(video_id, s) for s in PIPELINE_STAGES])
+    return {stage: bool(done.get(_done_key(video_id, stage))) for stage in PIPELINE_STAGES}
+
+
+def is_stage_dispatched(video_id: str, stage: str) -> bool:
+    """True se a etapa já foi disparada nesta execução do pipeline."""
+    return bool(cache.get(_dispatched_key(str(video_id), stage)))
+
+
+def dispatch_stage(video_id: str, stage: str, plan: str | None = None) -> bool:
+    """Dispara a task da etapa uma única vez por execução do pipeline."""
+    if not cache.add(_dispatched_key(video_id, stage), 1, PIPELINE_STATE_TTL):
+        logger.debug(f"[pipeline] Etapa '{stage}' já disparada para video_id={video_id}")
+        return False
+
+    if plan is None:
+        video = Video.objects.get(video_id=video_id)
+        plan = Organization.objects.get(organization_id=video.organization_id).plan
+
+    spec = PIPELINE_STAGES[stage]
+    module_name, task_name = spec["task"]
+    task = getattr(import_module(f".{module_name}", __package__), task_name)
+
+    task.apply_async(
+        args=[str(video_id)],
+        queue=f"video.{spec['queue']}.{get_plan_tier(plan)}",
+    )
+    logger.info(f"[pipeline] Etapa '{stage}' disparada para video_id={video_id}")
+    return True
+
+
+def advance_pipeline(video_id: str, completed_stage: str) -> list:
+    """
+    Marca `completed_stage` como concluída e dispara as etapas liberadas.
+
+    Returns:
+        Lista de etapas disparadas nesta chamada
+    """
+    video_id = str(video_id)
+    cache.set(_done_key(video_id, completed_stage), 1, PIPELINE_STATE_TTL)
+
+    try:
+        record_checkpoint(video_id, completed_stage)
+    except Exception as e:
+        logger.warning(f"[pipeline] Falha ao gravar checkpoint de '{completed_stage}' para video_id={video_id}: {e}")
+
+    state = get_pipeline_state(video_id)
+    ready = []
+    for stage, spec in PIPELINE_STAGES.items():
+        for deps in (spec["deps"], spec.get("alt_deps")):
+            if deps and completed_stage in deps and all(state.get(dep) for dep in deps):
+                ready.append((stage, deps))
+                break
+    if not ready:
+        return []
+
+    # Verifica todas as arestas antes de disparar qualquer etapa; uma aresta sem
+    # artefato falha só a etapa consumidora (a etapa concluída não é refeita)
+    releasable = []
+    for stage, deps in ready:
+        missing = [
+            dep for dep in deps
+            if not EDGE_ARTIFACT_CHECKS.get((dep, stage), lambda _v: True)(video_id)
+        ]
+        if missing:
+            _fail_stage(video_id, stage, missing)
+        else:
+            releasable.append(stage)
+    if not releasable:
+        return []
+
+    video = Video.objects.get(video_id=video_id)
+    plan = Organization.objects.get(organization_id=video.organization_id).plan
+
+    return [stage for stage in releasable if dispatch_stage(video_id, stage, plan=plan)]
+
+
+def _fail_stage(video_id: str, stage: str, missing: list) -> None:
+    """Marca `stage` como falha por artefatos de entrada ausentes (sem propagar exceção)."""
+    message = f"Artefatos ausentes para '{stage}' (de: {', '.join(missing)})"
+    logger.error(f"[pipeline] {message} | video_id={video_id}")
+
+    step = STAGE_TO_STEP.get(stage, stage)
+    try:
+        Video.objects.filter(video_id=video_id).update(
+            status="failed",
+            current_step=step,
+            error_code="missing_artifacts",
+            error_message=message,
+        )
+        update_job_status(video_id, "failed", current_step=step)
+    except Exception as e:
+        logger.warning(f"[pipeline] Falha ao marcar '{stage}' como falha para video_id={video_id}: {e}")
+
+
+def _stage_config(video: Video, stage: str) -> dict:
+    config = {
+        name: getattr(settings, name, os.getenv(name))
+        for name in STAGE_CONFIG_SETTINGS.get(stage, [])
+    }
+    if stage in STAGE_USES_JOB_CONFIG:
+        job = Job.objects.filter(video_id=video.video_id).order_by("-created_at").first()
+        config["job"] = (job.configuration if job else None) or {}
+    return config
+
+
+def _uses_alt_deps(video_id: str, stage: str) -> bool:
+    alt_deps = PIPELINE_STAGES[stage].get("alt_deps")
+    return bool(alt_deps) and all(STAGE_OUTPUT_CHECKS.get(dep, lambda _v: False)(str(video_id)) for dep in alt_deps)
+
+
+def _stage_deps(video_id: str, stage: str) -> list:
+    """Dependências efetivas da etapa (alt_deps quando o caminho alternativo foi usado)."""
+    if _uses_alt_deps(video_id, stage):
+        return PIPELINE_STAGES[stage]["alt_deps"]
+    return PIPELINE_STAGES[stage]["deps"]
+
+
+def _stage_inputs(video: Video, stage: str) -> dict:
+    if stage in ("download", "audio"):
+        return {"source": video.storage_path or video.source_url}
+
+    names = STAGE_INPUT_ARTIFACTS.get(stage, [])
+    if _uses_alt_deps(video.video_id, stage):
+        names = STAGE_ALT_INPUT_ARTIFACTS.get(stage, names)
+    if not names:
+        return {}
+    hashes = dict(
+        VideoArtifact.objects.filter(video=video, name__in=names).values_list("name", "content_hash")
+    )
+    return {name: hashes.get(name) for name in names}
+
+
+def _fingerprint_components(video: Video, stage: str, memo: dict) -> dict:
+    return {
+        "stage": stage,
+        "version": STAGE_CODE_VERSIONS.get(stage, 1),
+        "config": _stage_config(video, stage),
+        "inputs": _stage_inputs(video, stage),
+        "deps": {dep: compute_stage_fingerprint(video, dep, memo) for dep in _stage_deps(video.video_id, stage)},
+    }
+
+
+def compute_stage_fingerprint(video: Video, stage: str, memo: dict | None = None) -> str:
+    """
+    Calcula o fingerprint atual da etapa: hash das entradas, config e versão do código.
+
+    Inclui recursivamente o fingerprint das dependências, então uma mudança
+    em qualquer etapa anterior invalida todas as posteriores.
+    """
+    memo = {} if memo is None else memo
+    if stage not in memo:
+        components = _fingerprint_components(video, stage, memo)
+        payload = json.dumps(components, sort_keys=True, default=str)
+        memo[stage] = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    return memo[stage]
+
+
+def record_checkpoint(video_id: str, stage: str) -> StageCheckpoint:
+    """Grava o fingerprint da execução bem-sucedida da etapa."""
+    video = Video.objects.get(video_id=video_id)
+    memo = {}
+    components = _fingerprint_components(video, stage, memo)
+    fingerprint = compute_stage_fingerprint(video, stage, memo)
+
+    checkpoint, _ = StageCheckpoint.objects.update_or_create(
+        video=video,
+        stage=stage,
+        defaults={"fingerprint": fingerprint, "components": json.loads(json.dumps(components, default=str))},
+    )
+    return checkpoint
+
+
+def get_stale_stages(video_id: str) -> dict:
+    """
+    Avalia cada etapa (em ordem topológica) contra seu checkpoint.
+
+    Uma etapa está atualizada se o fingerprint gravado bate com o atual, sua
+    saída ainda existe e todas as dependências estão atualizadas.
+
+    Returns:
+        {stage: motivo} apenas para as etapas obsoletas
+    """
+    video = Video.objects.get(video_id=video_id)
+    checkpoints = dict(
+        StageCheckpoint.objects.filter(video=video).values_list("stage", "fingerprint")
+    )
+
+    memo = {}
+    stale = {}
+    for stage, spec in PIPELINE_STAGES.items():
+        if spec.get("optional") and stage not in checkpoints:
+            continue
+
+        stale_deps = [dep for dep in _stage_deps(video_id, stage) if dep in stale]
+        if stale_deps:
+            stale[stage] = f"dependência obsoleta: {', '.join(stale_deps)}"
+        elif stage not in checkpoints:
+            stale[stage] = "sem checkpoint"
+        elif checkpoints[stage] != compute_stage_fingerprint(video, stage, memo):
+            stale[stage] = "fingerprint divergente"
+        elif not STAGE_OUTPUT_CHECKS.get(stage, lambda _v: True)(str(video_id)):
+            stale[stage] = "saída ausente"
+    return stale
+
+
+def is_stage_fresh(video_id: str, stage: str) -> bool:
+    """True se a etapa já foi concluída com as entradas/config/código atuais."""
+    video = Video.objects.filter(video_id=video_id).first()
+    if not video:
+        return False
+    checkpoint = StageCheckpoint.objects.filter(video=video, stage=stage).first()
+    if not checkpoint or checkpoint.fingerprint != compute_stage_fingerprint(video, stage):
+        return False
+    return STAGE_OUTPUT_CHECKS.get(stage, lambda _v: True)(str(video_id))
+
+
+def skip_if_fresh(video_id: str, stage: str) -> bool:
+    """
+    Chamado no início da task: se a etapa está atualizada, avança o DAG sem refazê-la.
+
+    Returns:
+        True se a etapa foi pulada
+    """
+    try:
+        fresh = is_stage_fresh(str(video_id), stage)
+    except Exception as e:
+        logger.warning(f"[pipeline] Falha ao verificar checkpoint de '{stage}' para video_id={video_id}: {e}")
+        return False
+    if not fresh:
+        return False
+
+    logger.info(f"[pipeline] Etapa '{stage}' atualizada para video_id={video_id}; reutilizando saída")
+    advance_pipeline(str(video_id), stage)
+    return True
+
+
+def invalidate_stages(video_id: str, from_stage: str) -> list:
+    """Remove checkpoints de `from_stage` e de todas as etapas que dependem dela."""
+    invalid = {from_stage}
+    for stage, spec in PIPELINE_STAGES.items():
+        if any(dep in invalid for dep in spec["deps"] + spec.get("alt_deps", [])):
+            invalid.add(stage)
+
+    StageCheckpoint.objects.filter(video_id=video_id, stage__in=invalid).delete()
+    return [stage for stage in PIPELINE_STAGES if stage in invalid]
+
+
+def resume_pipeline(video_id: str, from_stage: str | None = None) -> list:
+    """
+    Reentra no DAG a partir das primeiras etapas obsoletas.
+
+    Etapas atualizadas são marcadas como concluídas sem rodar; são disparadas
+    apenas as etapas obsoletas cujas dependências estão todas atualizadas. O
+    restante segue normalmente via `advance_pipeline`.
+
+    Args:
+        video_id: ID do vídeo
+        from_stage: Força o reprocessamento desta etapa (e dependentes)
+
+    Returns:
+        Lista de etapas disparadas
+    """
+    video_id = str(video_id)
+    if from_stage:
+        invalidate_stages(video_id, from_stage)
+
+    reset_pipeline(video_id)
+    stale = get_stale_stages(video_id)
+
+    for stage in PIPELINE_STAGES:
+        if stage not in stale:
+            cache.set(_done_key(video_id, stage), 1, PIPELINE_STATE_TTL)
+
+    entry = [
+        stage for stage in PIPELINE_STAGES
+        if stage in stale and not any(dep in stale for dep in _stage_deps(video_id, stage))
+    ]
+    logger.info(f"[pipeline] Retomando video_id={video_id} | obsoletas={stale} | entrada={entry}")
+
+    video = Video.objects.get(video_id=video_id)
+    plan = Organization.objects.get(organization_id=video.organization_id).plan
+    return [stage for stage in entry if dispatch_stage(video_id, stage, plan=plan)]
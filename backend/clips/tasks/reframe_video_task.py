@@ -1,58 +1,86 @@
+import json
 import logging
 import os
 import numpy as np
 from celery import shared_task
 from django.conf import settings
 
-from ..models import Video, Transcript, Organization
-from .job_utils import get_plan_tier, update_job_status
+from ..models import Video, Transcript
+from ..services.artifact_service import ArtifactService
+from ..services.face_detection_service import FaceDetectionService
+from ..services.frame_cache_service import FrameCacheService
+from ..services.media_probe_service import MediaProbeService
+from ..services.scene_cut_service import SceneCutService
+from ..services.storage_service import R2StorageService
+from ..services.thumbnail_service import ThumbnailService
+from .pipeline import advance_pipeline, skip_if_fresh
 
 logger = logging.getLogger(__name__)
 
 
 @shared_task(bind=True, max_retries=3)
 def reframe_video_task(self, video_id: str) -> dict:
+    video = None
     try:
         logger.info(f"Iniciando Smart Reframing para video_id: {video_id}")
         
         video = Video.objects.get(video_id=video_id)
-        org = Organization.objects.get(organization_id=video.organization_id)
-        
-        video.status = "reframing"
-        video.current_step = "reframing"
-        video.save()
-        update_job_status(str(video.video_id), "reframing", progress=80, current_step="reframing")
-
-        transcript = Transcript.objects.filter(video=video).first()
-        if not transcript:
-            raise Exception("Transcrição não encontrada")
+        if skip_if_fresh(video_id, "reframe"):
+            return {"video_id": str(video.video_id), "status": "skipped"}
 
+        # Roda depois do select (só nas janelas dos clips escolhidos) e em paralelo ao
+        # thumbnail, então não altera status/progresso do vídeo.
         video_dir = os.path.join(settings.MEDIA_ROOT, f"videos/{video_id}")
         input_path = os.path.join(video_dir, "video_normalized.mp4")
 
-        if not os.path.exists(input_path):
-            raise Exception("Vídeo normalizado não encontrado")
+        transcript = Transcript.objects.filter(video=video).first()
+        selected_clips = (transcript.selected_clips if transcript else None) or []
 
-        reframe_data = _detect_smart_crop(input_path)
+        # A pilha de frames amostrados dispensa os seeks no vídeo (e o download do normalizado)
+        stack = None
+        try:
+            stack = FrameCacheService.ensure(video, video_dir, input_path)
+        except Exception as e:
+            logger.warning(f"[reframe] Pilha de frames indisponível para video_id={video_id}; lendo o vídeo: {e}")
 
-        transcript.reframe_data = reframe_data
-        transcript.save()
+        if stack is None and not ArtifactService.try_ensure_local(video, "normalized", input_path):
+            raise Exception("Vídeo normalizado não encontrado")
 
-        video.last_successful_step = "reframing"
-        video.status = "clipping"
-        video.current_step = "clipping"
-        video.save()
-        
-        from .clip_generation_task import clip_generation_task
-        clip_generation_task.apply_async(
-            args=[str(video.video_id)],
-            queue=f"video.clip.{get_plan_tier(org.plan)}",
+        scene_cuts = None
+        if stack is not None:
+            try:
+                scene_cuts = SceneCutService.get(video, video_dir)
+            except Exception as e:
+                logger.warning(f"[reframe] Cortes de cena indisponíveis para video_id={video_id}: {e}")
+
+        reframe_data, samples = _detect_smart_crop(
+            input_path, selected_clips, stack=stack, duration=video.duration, scene_cuts=scene_cuts
         )
 
+        # Thumbnails de todos os clips saem da mesma pilha, reaproveitando as detecções de rosto
+        if stack is not None:
+            try:
+                source_path = input_path if ArtifactService.try_ensure_local(video, "normalized", input_path) else None
+                _attach_clip_thumbnails(video, video_dir, stack, reframe_data, samples, scene_cuts, source_path)
+            except Exception as e:
+                logger.warning(f"[reframe] Falha ao gerar thumbnails dos clips de video_id={video_id}: {e}")
+
+        # O arquivo é a fonte para o join no render quando a linha da transcrição muda depois.
+        reframe_path = os.path.join(video_dir, "reframe.json")
+        with open(reframe_path, "w", encoding="utf-8") as f:
+            json.dump(reframe_data, f)
+        ArtifactService.publish(video, "reframe", reframe_path)
+
+        Transcript.objects.filter(video=video).update(reframe_data=reframe_data)
+
+        advance_pipeline(str(video.video_id), "reframe")
+
         return {
             "video_id": str(video.video_id),
             "face_detected": reframe_data.get("face_detected"),
-            "crop_center_x": reframe_data.get("crops", {}).get("9:16", {}).get("center_x")
+            "crop_center_x": reframe_data.get("crops", {}).get("9:16", {}).get("center_x"),
+            "clips": len(reframe_data.get("clips") or []),
+            "analyzed_seconds": reframe_data.get("analyzed_seconds"),
         }
 
     except Video.DoesNotExist:
@@ -70,78 +98,244 @@ def reframe_video_task(self, video_id: str) -> dict:
         return {"error": str(e), "status": "failed"}
 
 
-def _detect_smart_crop(video_path: str) -> dict:
-    try:
-        import cv2
-        import mediapipe as mp
-    except ImportError:
-        raise Exception("Instale: pip install opencv-python mediapipe")
-
-    mp_face_detection = mp.solutions.face_detection
-    
-    cap = cv2.VideoCapture(video_path)
-    if not cap.isOpened():
-        raise Exception("Erro ao abrir vídeo para análise")
-
-    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-    fps = cap.get(cv2.CAP_PROP_FPS)
-    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-
-    face_centers_x = []
-    
-    # Otimização: amostragem configurável (em segundos) + early-stop.
-    # Não reduz a qualidade do render final; apenas reduz custo da análise.
-    sample_every_seconds = float(getattr(settings, "REFRAME_SAMPLE_EVERY_SECONDS", 1.0) or 1.0)
-    max_samples = int(getattr(settings, "REFRAME_MAX_FACE_SAMPLES", 240) or 240)
-    min_samples_to_stop = int(getattr(settings, "REFRAME_MIN_SAMPLES_TO_STOP", 90) or 90)
-
-    effective_fps = fps if isinstance(fps, (int, float)) and fps and fps > 0 else 30.0
-    stride = max(1, int(round(effective_fps * sample_every_seconds)))
-    
-    with mp_face_detection.FaceDetection(model_selection=1, min_detection_confidence=0.6) as face_detection:
-        for i in range(0, total_frames, stride):
-            cap.set(cv2.CAP_PROP_POS_FRAMES, i)
-            ret, frame = cap.read()
-            if not ret:
-                break
-
-            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            results = face_detection.process(frame_rgb)
-
-            if results.detections:
-                best_detection = max(results.detections, key=lambda d: d.score[0])
-                
-                bboxC = best_detection.location_data.relative_bounding_box
-                
-                center_x = int((bboxC.xmin + bboxC.width / 2) * width)
-                face_centers_x.append(center_x)
-
-                # Early-stop: quando já temos amostras suficientes, não há ganho em continuar varrendo o vídeo todo.
-                if len(face_centers_x) >= max_samples:
-                    break
-
-            # Se já temos um mínimo de amostras (qualidade boa), podemos parar cedo.
-            if len(face_centers_x) >= min_samples_to_stop:
-                break
-
-    cap.release()
-
-    face_detected = len(face_centers_x) > 0
-    
-    if face_detected:
-        stable_center_x = int(np.median(face_centers_x))
+def _detect_smart_crop(
+    video_path: str,
+    selected_clips: list,
+    stack: dict = None,
+    duration: float = None,
+    scene_cuts=None,
+) -> tuple:
+    """
+    Detecta o rosto só nas janelas dos clips selecionados e monta, por clip,
+    uma trajetória do recorte 9:16 (keyframes [t, x] relativos ao início do clip).
+
+    O custo da análise escala com a duração somada dos clips, não do vídeo.
+    Cortes de cena (`scene_cuts`) reiniciam a trajetória dentro do clip.
+    `crops` (recorte fixo pela mediana de todas as detecções) continua sendo
+    gravado para thumbnails e como fallback do render.
+
+    Returns:
+        (reframe_data, amostras [(janela, tempos relativos, centros x)] por clip)
+    """
+    sample_every_seconds = float(getattr(settings, "REFRAME_SAMPLE_EVERY_SECONDS", 0.5) or 0.5)
+
+    if stack is not None:
+        # Coordenadas relativas do detector são escaladas pela resolução do vídeo normalizado
+        width, height = stack["source_width"], stack["source_height"]
+        duration = stack["duration"] or duration
+        # A pilha pode ter menos fps que o pedido (vídeos longos)
+        sample_every_seconds = max(sample_every_seconds, 1.0 / stack["fps"])
+        source = {"kind": "stack", "path": stack["path"], "fps": stack["fps"], "count": len(stack["timestamps"])}
     else:
-        stable_center_x = width // 2
+        metadata = MediaProbeService.probe(video_path)
+        width, height = int(metadata.get("width") or 0), int(metadata.get("height") or 0)
+        duration = duration or metadata.get("duration")
+        source = {"kind": "video", "path": video_path}
+
+    windows = _clip_windows(selected_clips, duration)
+    base_crop = _calculate_crops(width, height, width // 2)["9:16"]
+
+    # Todas as amostras de todas as janelas vão de uma vez para o pool (shards por tempo)
+    window_times = [np.arange(w["start_time"], w["end_time"], sample_every_seconds) for w in windows]
+    all_times = np.concatenate(window_times) if window_times else np.array([])
+    relative_centers = FaceDetectionService.detect(source, all_times.tolist())
+    all_centers = np.array([np.nan if c is None else c * width for c in relative_centers], dtype=np.float64)
+
+    samples = []
+    offset = 0
+    for window, times in zip(windows, window_times):
+        centers = all_centers[offset:offset + len(times)]
+        offset += len(times)
+        samples.append((window, times - window["start_time"], centers))
+
+    detected = np.concatenate([c[~np.isnan(c)] for _, _, c in samples]) if samples else np.array([])
+    face_detected = detected.size > 0
+    stable_center_x = int(np.median(detected)) if face_detected else width // 2
+
+    clips = []
+    for window, rel_times, centers in samples:
+        cuts = SceneCutService.cuts_between(scene_cuts, window["start_time"], window["end_time"]) - window["start_time"]
+        keyframes = _crop_trajectory(rel_times, centers, stable_center_x, width, base_crop["width"], cuts=cuts)
+        clips.append({
+            "index": window["index"],
+            "start_time": window["start_time"],
+            "end_time": window["end_time"],
+            "face_detected": bool(np.any(~np.isnan(centers))),
+            "keyframes": keyframes,
+        })
 
     crops = _calculate_crops(width, height, stable_center_x)
 
     return {
-        "face_detected": face_detected,
+        "face_detected": bool(face_detected),
         "video_resolution": f"{width}x{height}",
         "crops": crops,
-        "raw_face_centers_count": len(face_centers_x)
-    }
+        "clips": clips,
+        "raw_face_centers_count": int(detected.size),
+        "analyzed_seconds": round(sum(w["end_time"] - w["start_time"] for w, _, _ in samples), 1),
+    }, samples
+
+
+def _attach_clip_thumbnails(
+    video: Video,
+    video_dir: str,
+    stack: dict,
+    reframe_data: dict,
+    samples: list,
+    scene_cuts=None,
+    source_path: str = None,
+) -> None:
+    """
+    Escolhe e publica a thumbnail de cada clip (recorte 9:16 na trajetória do clip).
+
+    Os candidatos são pontuados em lote pelo ThumbnailService; a presença de
+    rosto vem das amostras já detectadas acima (a mais próxima de cada candidato).
+    O JPEG é extraído de `source_path` em resolução cheia quando disponível.
+    """
+    crop_box = reframe_data.get("crops", {}).get("9:16")
+    storage = R2StorageService()
+    thumbnail_dir = os.path.join(video_dir, "thumbnails")
+
+    for (window, rel_times, centers), entry in zip(samples, reframe_data.get("clips") or []):
+        start, end = window["start_time"], window["end_time"]
+        times = ThumbnailService.candidate_times(start, end, scene_cuts)
+
+        faces = None
+        if len(rel_times):
+            nearest = np.abs((rel_times + start)[None, :] - times[:, None]).argmin(axis=1)
+            faces = ~np.isnan(centers[nearest])
+
+        crop_xs = None
+        chosen_box = crop_box
+        if entry.get("keyframes"):
+            key_times, key_xs = zip(*entry["keyframes"])
+            crop_xs = np.interp(times - start, key_times, key_xs)
+
+        ts, frame = ThumbnailService.best_frame(stack, times, faces=faces, crop_xs=crop_xs, crop_box=crop_box)
+        if crop_box and crop_xs is not None:
+            chosen_box = {**crop_box, "x": int(np.interp(ts - start, key_times, key_xs))}
+
+        filename = f"clip_{window['index']}.jpg"
+        local_path = ThumbnailService.save(
+            frame, os.path.join(thumbnail_dir, filename), source_path=source_path, ts=ts, crop_box=chosen_box
+        )
+        try:
+            storage_path = storage.upload_thumbnail(local_path, str(video.organization_id), str(video.video_id), filename=filename)
+        finally:
+            os.remove(local_path)
+
+        entry["thumbnail"] = {"storage_path": storage_path, "time": round(ts, 3)}
+
+
+def _clip_windows(selected_clips: list, duration: float = None) -> list:
+    """Janelas [start, end] dos clips, com a mesma folga no fim usada pelo render."""
+    windows = []
+    for idx, clip in enumerate(selected_clips or []):
+        start = max(0.0, float(clip.get("start_time", 0) or 0))
+        end = float(clip.get("end_time", 0) or 0) + float(clip.get("tail_seconds", 1.0))
+        if duration:
+            end = min(end, float(duration))
+        if end > start:
+            windows.append({"index": idx, "start_time": round(start, 3), "end_time": round(end, 3)})
+    return windows
+
+
+def _crop_trajectory(times, centers, fallback_center_x: int, width: int, crop_width: int, cuts=None) -> list:
+    """
+    Keyframes [t, x] do recorte de um clip a partir dos centros de rosto amostrados.
+
+    A trajetória recomeça em cada corte de cena (`cuts`: pares [antes, depois]
+    relativos ao início do clip): cada plano é interpolado e suavizado à parte
+    e o recorte salta no meio do corte em vez de deslizar entre os planos.
+    """
+    times = np.asarray(times, dtype=np.float64)
+    centers = np.asarray(centers, dtype=np.float64)
+    bounds = np.sort(np.asarray(cuts, dtype=np.float64).reshape(-1, 2).mean(axis=1)) if cuts is not None else np.array([])
+
+    max_keyframes = int(getattr(settings, "REFRAME_MAX_KEYFRAMES", 48) or 48)
+    per_shot = max(2, max_keyframes // (len(bounds) + 1))
+    shot_ids = np.searchsorted(bounds, times, side="right")
+
+    keyframes = []
+    for shot in range(len(bounds) + 1):
+        mask = shot_ids == shot
+        if not mask.any():
+            continue
+        shot_keyframes = _shot_trajectory(times[mask], centers[mask], fallback_center_x, width, crop_width, per_shot)
+        if keyframes:
+            # Mantém o x do plano anterior até 1ms antes do corte: o crop salta no corte
+            cut_t = round(float(bounds[shot - 1]), 3)
+            if cut_t - 0.001 > keyframes[-1][0]:
+                keyframes.append([round(cut_t - 0.001, 3), keyframes[-1][1]])
+            shot_keyframes[0][0] = cut_t
+        for kf in shot_keyframes:
+            if not keyframes or kf[0] > keyframes[-1][0]:
+                keyframes.append(kf)
+
+    if not keyframes:
+        x = int(np.clip(fallback_center_x - crop_width // 2, 0, max(0, width - crop_width)))
+        return [[0.0, x]]
+    if len({x for _, x in keyframes}) == 1:
+        return [[0.0, keyframes[0][1]]]
+    return keyframes
+
+
+def _shot_trajectory(times, centers, fallback_center_x: int, width: int, crop_width: int, max_keyframes: int) -> list:
+    """
+    Keyframes de um plano: amostras sem rosto são interpoladas entre as vizinhas;
+    a curva é suavizada com um kernel gaussiano (convolução) e reduzida por
+    Douglas-Peucker, para que a expressão do `crop` no ffmpeg fique curta.
+    """
+    max_x = max(0, width - crop_width)
+
+    valid = ~np.isnan(centers)
+    if not valid.any():
+        x = int(np.clip(fallback_center_x - crop_width // 2, 0, max_x))
+        return [[round(float(times[0]), 3), x]]
+
+    filled = np.interp(times, times[valid], centers[valid])
+
+    step = float(times[1] - times[0]) if times.size > 1 else 1.0
+    sigma = float(getattr(settings, "REFRAME_SMOOTHING_SECONDS", 1.0) or 0.0) / step
+    if sigma > 0 and filled.size > 1:
+        radius = max(1, int(round(3 * sigma)))
+        kernel = np.exp(-0.5 * (np.arange(-radius, radius + 1) / sigma) ** 2)
+        kernel /= kernel.sum()
+        filled = np.convolve(np.pad(filled, radius, mode="edge"), kernel, mode="valid")
+
+    xs = np.clip(filled - crop_width / 2.0, 0, max_x)
+
+    tolerance = float(getattr(settings, "REFRAME_KEYFRAME_TOLERANCE_PX", 8) or 0)
+    if float(xs.max() - xs.min()) <= tolerance:
+        return [[round(float(times[0]), 3), int(round(float(np.median(xs))))]]
+
+    keep = _simplify_polyline(times, xs, tolerance, max_keyframes)
+    return [[round(float(times[i]), 3), int(round(float(xs[i])))] for i in keep]
+
+
+def _simplify_polyline(times, values, tolerance: float, max_points: int) -> list:
+    """Douglas-Peucker (iterativo): índices dos pontos que mantêm o erro <= tolerance."""
+    keep = {0, len(values) - 1}
+    pending = [(0, len(values) - 1)]
+    while pending and len(keep) < max_points:
+        # Sempre divide o trecho com o maior erro primeiro, para respeitar `max_points`
+        best = None
+        for a, b in pending:
+            if b - a < 2:
+                continue
+            seg_t = times[a + 1:b]
+            line = values[a] + (values[b] - values[a]) * (seg_t - times[a]) / (times[b] - times[a])
+            errors = np.abs(values[a + 1:b] - line)
+            i = int(np.argmax(errors))
+            if best is None or errors[i] > best[0]:
+                best = (float(errors[i]), a, b, a + 1 + i)
+        if best is None or best[0] <= tolerance:
+            break
+        _, a, b, split = best
+        keep.add(split)
+        pending.remove((a, b))
+        pending.extend([(a, split), (split, b)])
+    return sorted(keep)
 
 
 def _calculate_crops(width: int, height: int, center_x: int) -> dict:
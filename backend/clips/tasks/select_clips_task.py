@@ -1,9 +1,12 @@
 import logging
 from celery import shared_task
 import os
+from django.conf import settings
 
-from ..models import Video, Transcript, Organization
-from .job_utils import get_plan_tier, update_job_status
+from ..models import Video, Transcript
+from ..services.scene_cut_service import SceneCutService
+from .job_utils import update_job_status
+from .pipeline import advance_pipeline, skip_if_fresh
 
 logger = logging.getLogger(__name__)
 
@@ -14,7 +17,8 @@ def select_clips_task(self, video_id: str) -> dict:
         logger.info(f"Iniciando seleção de clips para video_id: {video_id}")
         
         video = Video.objects.get(video_id=video_id)
-        org = Organization.objects.get(organization_id=video.organization_id)
+        if skip_if_fresh(video_id, "select"):
+            return {"video_id": str(video.video_id), "status": "skipped"}
         
         video.status = "selecting"
         video.current_step = "selecting"
@@ -84,21 +88,20 @@ def select_clips_task(self, video_id: str) -> dict:
         if not selected_clips:
             raise Exception("Não foi possível selecionar nenhum clip válido")
 
+        selected_clips = _snap_to_scene_cuts(video, selected_clips, config)
+
         transcript.selected_clips = selected_clips
         transcript.save()
 
         video.last_successful_step = "selecting"
-        video.status = "reframing"
-        video.current_step = "reframing"
+        video.status = "clipping"
+        video.current_step = "clipping"
         video.save()
         
-        update_job_status(str(video.video_id), "reframing", progress=70, current_step="reframing")
+        update_job_status(str(video.video_id), "clipping", progress=80, current_step="clipping")
 
-        from .reframe_video_task import reframe_video_task
-        reframe_video_task.apply_async(
-            args=[str(video.video_id)],
-            queue=f"video.reframe.{get_plan_tier(org.plan)}",
-        )
+        # Libera o reframe das janelas selecionadas; o render vem depois dele.
+        advance_pipeline(str(video.video_id), "select")
 
         return {
             "video_id": str(video.video_id),
@@ -121,6 +124,60 @@ def select_clips_task(self, video_id: str) -> dict:
         return {"error": str(e), "status": "failed"}
 
 
+def _snap_to_scene_cuts(video: Video, selected_clips: list, config: dict) -> list:
+    """
+    Alinha início/fim dos clips aos cortes de cena próximos.
+
+    O início vai para o primeiro frame do plano (recuando até a tolerância, ou
+    avançando no máximo SCENE_SNAP_FORWARD_SECONDS para não cortar fala); o
+    fim vai para o último frame do plano se houver corte logo depois, e nesse
+    caso o clip não recebe a folga de 1s do render (`tail_seconds` = 0), que
+    cairia no plano seguinte.
+    """
+    tolerance = float(getattr(settings, "SCENE_SNAP_TOLERANCE_SECONDS", 1.5) or 0.0)
+    forward = float(getattr(settings, "SCENE_SNAP_FORWARD_SECONDS", 0.3) or 0.0)
+    if tolerance <= 0:
+        return selected_clips
+
+    video_dir = os.path.join(settings.MEDIA_ROOT, f"videos/{video.video_id}")
+    try:
+        cuts = SceneCutService.get(video, video_dir, build=True)
+    except Exception as e:
+        logger.warning(f"Cortes de cena indisponíveis para video_id={video.video_id}: {e}")
+        cuts = None
+    if cuts is None or not len(cuts):
+        return selected_clips
+
+    before, after = cuts[:, 0], cuts[:, 1]
+    snapped = 0
+    for clip in selected_clips:
+        start, end = clip["start_time"], clip["end_time"]
+        new_start, new_end, tail = start, end, 1.0
+
+        starts = after[(after >= start - tolerance) & (after <= start + forward)]
+        if len(starts):
+            new_start = float(starts[abs(starts - start).argmin()])
+
+        ends = before[(before >= end) & (before <= end + tolerance)]
+        if len(ends):
+            new_end, tail = float(ends.min()), 0.0
+
+        duration = new_end - new_start
+        if config["min_duration"] <= duration <= max(config["max_duration"], end - start) and new_end > new_start:
+            if (new_start, new_end) != (start, end):
+                snapped += 1
+            clip.update({
+                "start_time": round(new_start, 3),
+                "end_time": round(new_end, 3),
+                "duration": round(duration, 3),
+                "tail_seconds": tail,
+            })
+
+    if snapped:
+        logger.info(f"{snapped}/{len(selected_clips)} clips alinhados a cortes de cena")
+    return selected_clips
+
+
 def _process_selection(candidates: list, config: dict) -> list:
     valid_candidates = []
 
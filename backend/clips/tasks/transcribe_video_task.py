@@ -1,19 +1,30 @@
 import logging
 import os
+import glob
 import json
 import subprocess
+import tempfile
+import numpy as np
 from celery import shared_task
 from django.conf import settings
 import google.generativeai as genai
 
-from ..models import Video, Transcript, Organization
+from ..models import Video, VideoArtifact, Transcript, Organization
 from .job_utils import get_plan_tier, update_job_status
+from .pipeline import advance_pipeline, skip_if_fresh
 from ..services.storage_service import R2StorageService
+from ..services.artifact_service import ArtifactService
+from ..services.media_probe_service import MediaProbeService
+from ..services.whisper_model_service import WhisperModelService
 
 logger = logging.getLogger(__name__)
 
 _gemini_configured = False
 
+# Leitura do PCM do ffmpeg (stdout) em blocos: 1 MiB = 32 s de áudio a 16 kHz s16
+PCM_CHUNK_BYTES = 1024 * 1024
+WHISPER_SAMPLE_RATE = 16000
+
 
 @shared_task(bind=True, max_retries=3)
 def transcribe_video_task(self, video_id: str) -> dict:
@@ -22,92 +33,133 @@ def transcribe_video_task(self, video_id: str) -> dict:
         logger.info(f"Iniciando transcrição para video_id: {video_id}")
         
         video = Video.objects.get(video_id=video_id)
+        if skip_if_fresh(video_id, "transcribe"):
+            return {"video_id": str(video.video_id), "status": "skipped"}
         org = Organization.objects.get(organization_id=video.organization_id)
         
         video.status = "transcribing"
         video.current_step = "transcribing"
-        video.save()
+        # update_fields: com áudio primeiro, o download ainda pode estar gravando o mesmo Video
+        video.save(update_fields=["status", "current_step"])
         update_job_status(str(video.video_id), "transcribing", progress=35, current_step="transcribing")
 
         video_dir = os.path.join(settings.MEDIA_ROOT, f"videos/{video_id}")
-        
-        video_path = os.path.join(video_dir, "video_normalized.mp4")
-        if not os.path.exists(video_path):
-            raise Exception("Arquivo video_normalized.mp4 não encontrado")
-
-        audio_path = _extract_audio_with_ffmpeg(video_path, video_dir)
-
-        transcript_data = _transcribe_with_whisper(audio_path)
-
-        # Opcional: pós-processamento com Gemini para corrigir gírias/jargões/metáforas.
-        # Mantém timestamps (start/end) e word-timestamps; altera apenas os textos.
-        if bool(getattr(settings, "GEMINI_REFINE_WHISPER_TRANSCRIPT", False)):
+        video_path, source_name = _resolve_audio_source(video, video_dir)
+        # A extração já decodifica o áudio inteiro: mede o loudness no mesmo ffmpeg (usado no render)
+        measure_loudness = _wants_loudness(video, source_name)
+
+        # Streaming: PCM do ffmpeg (stdout) direto para um buffer float32, sem audio_temp.wav.
+        # O sharding precisa dos arquivos em disco, então nesse caso seguimos pelo caminho em arquivo.
+        audio = None
+        loudness = None
+        if bool(getattr(settings, "WHISPER_STREAM_AUDIO", True)) and not _wants_sharding(video, org):
             try:
-                transcript_data = _refine_transcript_with_gemini(transcript_data)
+                audio, loudness = _extract_audio_to_array(video_path, measure_loudness, expected_seconds=video.duration)
             except Exception as e:
-                logger.warning(f"[transcribe] Gemini refine falhou; seguindo com Whisper original: {e}")
+                logger.warning(f"[transcribe] Extração via pipe falhou; usando arquivo WAV: {e}")
+
+        if audio is None:
+            audio_path, loudness = _extract_audio_with_ffmpeg(video_path, video_dir, measure_loudness)
+        _store_loudness(video, source_name, loudness)
+
+        if audio is None:
+            # Vídeos longos: divide o áudio em shards (cortes em silêncio) e transcreve em paralelo.
+            shards = _plan_transcription_shards(audio_path, video, org)
+            if shards:
+                _dispatch_sharded_transcription(video, org, audio_path, shards)
+                audio_path = None
+                return {
+                    "video_id": str(video.video_id),
+                    "status": "transcribing",
+                    "shards": len(shards),
+                }
+            audio = audio_path
+
+        transcript_data = _transcribe_with_whisper(audio)
+        del audio
+
+        if audio_path and os.path.exists(audio_path):
+            os.remove(audio_path)
 
-        json_path = os.path.join(video_dir, "transcript.json")
-        with open(json_path, "w", encoding="utf-8") as f:
-            json.dump(transcript_data, f, ensure_ascii=False, indent=2)
+        return _finalize_transcription(video, org, transcript_data, video_dir)
 
-        srt_path = os.path.join(video_dir, "transcript.srt")
-        _save_srt_file(transcript_data, srt_path)
+    except Video.DoesNotExist:
+        return {"error": "Video not found", "status": "failed"}
+    except Exception as e:
+        logger.error(f"Erro transcrição {video_id}: {str(e)}", exc_info=True)
+        if video:
+            video.status = "failed"
+            video.error_message = str(e)
+            video.save()
+            
+            if audio_path and os.path.exists(audio_path):
+                try:
+                    os.remove(audio_path)
+                except:
+                    pass
 
-        storage = R2StorageService()
-        transcript_storage_path = storage.upload_transcript(
-            file_path=json_path,
-            organization_id=str(video.organization_id),
-            video_id=str(video.video_id),
-        )
+            if self.request.retries < self.max_retries:
+                raise self.retry(exc=e, countdown=2 ** self.request.retries)
 
-        Transcript.objects.update_or_create(
-            video=video,
-            defaults={
-                "full_text": transcript_data.get("full_text", ""),
-                "segments": transcript_data.get("segments", []),
-                "language": transcript_data.get("language", "en"),
-                "confidence_score": transcript_data.get("confidence_score", 0),
-                "storage_path": transcript_storage_path,
-            }
-        )
+        return {"error": str(e), "status": "failed"}
 
-        if os.path.exists(audio_path):
-            os.remove(audio_path)
 
-        video.last_successful_step = "transcribing"
-        video.status = "analyzing"
-        video.current_step = "analyzing"
-        video.save()
-        
-        update_job_status(str(video.video_id), "analyzing", progress=40, current_step="analyzing")
+@shared_task(bind=True, max_retries=3)
+def transcribe_shard_task(self, video_id: str, index: int, shard_path: str, offset: float) -> dict:
+    try:
+        logger.info(f"[transcribe] Shard {index} (offset={offset:.2f}s) para video_id: {video_id}")
 
-        from .analyze_semantic_task import analyze_semantic_task
-        analyze_semantic_task.apply_async(
-            args=[str(video.video_id)],
-            queue=f"video.analyze.{get_plan_tier(org.plan)}",
-        )
+        video = Video.objects.get(video_id=video_id)
+        if not ArtifactService.try_ensure_local(video, f"audio_shard_{index}", shard_path):
+            raise Exception(f"Shard de áudio não encontrado: {shard_path}")
+
+        shard_data = _transcribe_with_whisper(shard_path)
 
         return {
-            "video_id": str(video.video_id),
-            "language": transcript_data.get("language"),
-            "words_count": len(transcript_data.get("full_text", "").split()),
+            "index": int(index),
+            "offset": float(offset),
+            "language": shard_data.get("language"),
+            "segments": _offset_segments(shard_data.get("segments", []), float(offset)),
         }
 
+    except Exception as e:
+        logger.error(f"Erro transcrição shard {index} ({video_id}): {e}", exc_info=True)
+        if self.request.retries < self.max_retries:
+            raise self.retry(exc=e, countdown=2 ** self.request.retries)
+
+        # O callback do chord não roda quando um shard falha de vez: fecha o Job e limpa aqui
+        Video.objects.filter(video_id=video_id).update(
+            status="failed", current_step="transcribing", error_message=str(e)
+        )
+        update_job_status(str(video_id), "failed", current_step="transcribing")
+        video = Video.objects.filter(video_id=video_id).first()
+        if video:
+            _cleanup_shards(video, os.path.dirname(shard_path))
+        raise
+
+
+@shared_task(bind=True, max_retries=3)
+def merge_transcript_shards_task(self, shard_results: list, video_id: str) -> dict:
+    video = None
+    try:
+        video = Video.objects.get(video_id=video_id)
+        org = Organization.objects.get(organization_id=video.organization_id)
+
+        video_dir = os.path.join(settings.MEDIA_ROOT, f"videos/{video_id}")
+        transcript_data = _merge_shard_results(shard_results)
+        # Os resultados chegam pelo chord: os shards de áudio não são mais necessários
+        _cleanup_shards(video, video_dir)
+
+        return _finalize_transcription(video, org, transcript_data, video_dir)
+
     except Video.DoesNotExist:
         return {"error": "Video not found", "status": "failed"}
     except Exception as e:
-        logger.error(f"Erro transcrição {video_id}: {str(e)}", exc_info=True)
+        logger.error(f"Erro ao consolidar shards {video_id}: {e}", exc_info=True)
         if video:
             video.status = "failed"
             video.error_message = str(e)
             video.save()
-            
-            if audio_path and os.path.exists(audio_path):
-                try:
-                    os.remove(audio_path)
-                except:
-                    pass
 
             if self.request.retries < self.max_retries:
                 raise self.retry(exc=e, countdown=2 ** self.request.retries)
@@ -115,62 +167,444 @@ def transcribe_video_task(self, video_id: str) -> dict:
         return {"error": str(e), "status": "failed"}
 
 
-def _extract_audio_with_ffmpeg(video_path: str, output_dir: str) -> str:
-    audio_path = os.path.join(output_dir, "audio_temp.wav")
-    ffmpeg_path = getattr(settings, "FFMPEG_PATH", "ffmpeg")
+def _finalize_transcription(video: Video, org: Organization, transcript_data: dict, video_dir: str) -> dict:
+    # Opcional: pós-processamento com Gemini para corrigir gírias/jargões/metáforas.
+    # Mantém timestamps (start/end) e word-timestamps; altera apenas os textos.
+    if bool(getattr(settings, "GEMINI_REFINE_WHISPER_TRANSCRIPT", False)):
+        try:
+            transcript_data = _refine_transcript_with_gemini(transcript_data)
+        except Exception as e:
+            logger.warning(f"[transcribe] Gemini refine falhou; seguindo com Whisper original: {e}")
+
+    json_path = os.path.join(video_dir, "transcript.json")
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump(transcript_data, f, ensure_ascii=False, indent=2)
+
+    srt_path = os.path.join(video_dir, "transcript.srt")
+    _save_srt_file(transcript_data, srt_path)
+
+    storage = R2StorageService()
+    transcript_storage_path = storage.upload_transcript(
+        file_path=json_path,
+        organization_id=str(video.organization_id),
+        video_id=str(video.video_id),
+    )
+    ArtifactService.publish(video, "transcript", json_path, storage=storage)
+
+    Transcript.objects.update_or_create(
+        video=video,
+        defaults={
+            "full_text": transcript_data.get("full_text", ""),
+            "segments": transcript_data.get("segments", []),
+            "language": transcript_data.get("language", "en"),
+            "confidence_score": transcript_data.get("confidence_score", 0),
+            "storage_path": transcript_storage_path,
+        }
+    )
+
+    video.last_successful_step = "transcribing"
+    video.status = "analyzing"
+    video.current_step = "analyzing"
+    video.save(update_fields=["last_successful_step", "status", "current_step"])
+
+    update_job_status(str(video.video_id), "analyzing", progress=40, current_step="analyzing")
+
+    advance_pipeline(str(video.video_id), "transcribe")
+
+    return {
+        "video_id": str(video.video_id),
+        "language": transcript_data.get("language"),
+        "words_count": len(transcript_data.get("full_text", "").split()),
+    }
+
+
+def _resolve_audio_source(video: Video, video_dir: str) -> tuple:
+    """
+    Faixa de áudio baixada à parte (áudio primeiro), senão o vídeo normalizado.
+    Retorna (caminho local, nome do artefato).
+    """
+    if VideoArtifact.objects.filter(video=video, name="audio").exists():
+        # O ffmpeg detecta o container pelo conteúdo; a extensão local é só informativa.
+        local = glob.glob(os.path.join(video_dir, "audio_source.*"))
+        audio_source_path = local[0] if local else os.path.join(video_dir, "audio_source.m4a")
+        if ArtifactService.try_ensure_local(video, "audio", audio_source_path):
+            return audio_source_path, "audio"
+
+    video_path = os.path.join(video_dir, "video_normalized.mp4")
+    if not ArtifactService.try_ensure_local(video, "normalized", video_path):
+        raise Exception("Arquivo video_normalized.mp4 não encontrado")
+    return video_path, "normalized"
+
+
+def _wants_loudness(video: Video, source_name: str) -> bool:
+    """Mede só quando a extração cobre o áudio inteiro e ainda não há medição desse conteúdo."""
     max_seconds = getattr(settings, "WHISPER_MAX_AUDIO_SECONDS", None)
-    
+    if isinstance(max_seconds, (int, float)) and max_seconds and max_seconds > 0:
+        if not video.duration or float(video.duration) > float(max_seconds):
+            return False
+
+    content_hash = _artifact_hash(video, source_name)
+    return MediaProbeService.stored_loudness(video, [source_name], {source_name: content_hash}) is None
+
+
+def _store_loudness(video: Video, source_name: str, measurement: dict | None) -> None:
+    if measurement is None:
+        return
+    try:
+        MediaProbeService.store_loudness(video, source_name, measurement, _artifact_hash(video, source_name))
+        logger.info(
+            f"[transcribe] Loudness de {source_name}: I={measurement.get('input_i')} LUFS "
+            f"TP={measurement.get('input_tp')} dBTP"
+        )
+    except Exception as e:
+        logger.warning(f"[transcribe] Falha ao gravar loudness de {source_name}: {e}")
+
+
+def _artifact_hash(video: Video, name: str) -> str | None:
+    return VideoArtifact.objects.filter(video=video, name=name).values_list("content_hash", flat=True).first()
+
+
+def _get_shard_config(plan: str | None) -> dict:
+    tier = get_plan_tier(plan)
+    config = getattr(settings, "TRANSCRIBE_SHARDING", {}) or {}
+    return config.get(tier) or config.get("starter") or {}
+
+
+def _wants_sharding(video: Video, org: Organization) -> bool:
+    config = _get_shard_config(org.plan)
+    if not config.get("enabled", True):
+        return False
+
+    shard_seconds = float(config.get("shard_seconds") or 0)
+    min_duration = float(config.get("min_duration") or 0)
+    duration = float(video.duration or 0)
+    return shard_seconds > 0 and duration >= max(min_duration, shard_seconds * 1.5)
+
+
+def _plan_transcription_shards(audio_path: str, video: Video, org: Organization) -> list:
+    """Retorna lista de (start, end) em segundos, ou [] quando não vale a pena dividir."""
+    config = _get_shard_config(org.plan)
+    if not config.get("enabled", True):
+        return []
+
+    shard_seconds = float(config.get("shard_seconds") or 0)
+    max_shards = int(config.get("max_shards") or 1)
+    min_duration = float(config.get("min_duration") or 0)
+
+    duration = _get_wav_duration(audio_path) or float(video.duration or 0)
+    if shard_seconds <= 0 or max_shards < 2 or duration < max(min_duration, shard_seconds * 1.5):
+        return []
+
+    num_shards = min(max_shards, int(round(duration / shard_seconds)))
+    if num_shards < 2:
+        return []
+
+    silences = _detect_silences(audio_path)
+    search_window = float(config.get("silence_search_seconds") or 30)
+    target = duration / num_shards
+
+    cuts = []
+    for k in range(1, num_shards):
+        ideal = target * k
+        nearby = [m for m in silences if abs(m - ideal) <= search_window]
+        cut = min(nearby, key=lambda m: abs(m - ideal)) if nearby else ideal
+        if cuts and cut <= cuts[-1] + 1.0:
+            cut = ideal
+        cuts.append(cut)
+
+    bounds = [0.0] + cuts + [duration]
+    return [(bounds[i], bounds[i + 1]) for i in range(len(bounds) - 1)]
+
+
+def _dispatch_sharded_transcription(video: Video, org: Organization, audio_path: str, shards: list) -> None:
+    from celery import chord
+
+    video_dir = os.path.dirname(audio_path)
+    queue = f"video.transcribe.{get_plan_tier(org.plan)}"
+
+    header = []
+    try:
+        for i, (start, end) in enumerate(shards):
+            shard_path = _cut_audio_shard(audio_path, video_dir, i, start, end)
+            # Shards podem ser consumidos por workers em outros nós.
+            ArtifactService.publish(video, f"audio_shard_{i}", shard_path)
+            header.append(
+                transcribe_shard_task.s(str(video.video_id), i, shard_path, float(start)).set(queue=queue)
+            )
+    except Exception:
+        _cleanup_shards(video, video_dir)
+        raise
+
+    if os.path.exists(audio_path):
+        os.remove(audio_path)
+
+    logger.info(f"[transcribe] {len(header)} shards disparados para video_id={video.video_id}")
+    chord(header)(merge_transcript_shards_task.s(str(video.video_id)).set(queue=queue))
+
+
+def _get_wav_duration(audio_path: str) -> float | None:
+    # PCM s16le mono 16 kHz = 32000 bytes/s (header WAV é desprezível).
+    try:
+        return max(0.0, (os.path.getsize(audio_path) - 44) / 32000.0)
+    except OSError:
+        return None
+
+
+def _detect_silences(audio_path: str) -> list:
+    """Retorna os pontos médios dos trechos de silêncio (em segundos)."""
+    ffmpeg_path = getattr(settings, "FFMPEG_PATH", "ffmpeg")
+    cmd = [
+        ffmpeg_path,
+        "-hide_banner",
+        "-nostats",
+        "-i", audio_path,
+        "-af", "silencedetect=noise=-35dB:d=0.4",
+        "-f", "null", "-",
+    ]
+
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=300)
+    except Exception as e:
+        logger.warning(f"[transcribe] silencedetect falhou; cortes serão fixos: {e}")
+        return []
+
+    midpoints = []
+    silence_start = None
+    for line in (result.stderr or "").splitlines():
+        if "silence_start:" in line:
+            try:
+                silence_start = float(line.split("silence_start:")[1].split()[0])
+            except (IndexError, ValueError):
+                silence_start = None
+        elif "silence_end:" in line and silence_start is not None:
+            try:
+                silence_end = float(line.split("silence_end:")[1].split()[0])
+                midpoints.append((silence_start + silence_end) / 2.0)
+            except (IndexError, ValueError):
+                pass
+            silence_start = None
+
+    return midpoints
+
+
+def _cut_audio_shard(audio_path: str, output_dir: str, index: int, start: float, end: float) -> str:
+    shard_path = os.path.join(output_dir, f"audio_shard_{index}.wav")
+    ffmpeg_path = getattr(settings, "FFMPEG_PATH", "ffmpeg")
+
     cmd = [
         ffmpeg_path, "-y",
         "-hide_banner",
         "-loglevel", "error",
+        "-ss", f"{start:.3f}",
+        "-t", f"{max(0.0, end - start):.3f}",
+        "-i", audio_path,
+        "-c", "copy",
+        shard_path,
+    ]
+
+    try:
+        subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        return shard_path
+    except subprocess.CalledProcessError as e:
+        raise Exception(f"Erro FFmpeg shard de áudio: {e.stderr.decode() if e.stderr else str(e)}")
+
+
+def _offset_segments(segments: list, offset: float) -> list:
+    out = []
+    for seg in segments:
+        out.append({
+            **seg,
+            "start": seg["start"] + offset,
+            "end": seg["end"] + offset,
+            "words": [
+                {**w, "start": w["start"] + offset, "end": w["end"] + offset}
+                for w in seg.get("words", [])
+            ],
+        })
+    return out
+
+
+def _merge_shard_results(shard_results: list) -> dict:
+    ordered = sorted(shard_results or [], key=lambda r: int(r.get("index", 0)))
+
+    segments = []
+    language_weight = {}
+    for r in ordered:
+        shard_segments = r.get("segments") or []
+        segments.extend(shard_segments)
+
+        lang = r.get("language") or "en"
+        spoken = sum(max(0.0, s["end"] - s["start"]) for s in shard_segments)
+        language_weight[lang] = language_weight.get(lang, 0.0) + spoken
+
+    language = max(language_weight, key=language_weight.get) if language_weight else "en"
+    full_text = " ".join((s.get("text") or "").strip() for s in segments).strip()
+
+    return {
+        "full_text": full_text,
+        "segments": segments,
+        "language": language,
+        "confidence_score": 95,
+    }
+
+
+def _cleanup_shards(video: Video, video_dir: str) -> None:
+    """Remove os shards de áudio: arquivos locais, objetos no R2 e linhas de VideoArtifact."""
+    ArtifactService.delete(video, "audio_shard_")
+
+    for path in glob.glob(os.path.join(video_dir, "audio_shard_*.wav")):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _build_audio_extract_cmd(video_path: str, output_args: list, measure_loudness: bool = False) -> list:
+    """
+    ffmpeg que decodifica o primeiro stream de áudio para 16 kHz mono (entrada do Whisper).
+
+    Com `measure_loudness`, um ramo do mesmo filtergraph roda a passada de análise do
+    loudnorm: a medição sai de graça, sem decodificar o áudio outra vez.
+    """
+    ffmpeg_path = getattr(settings, "FFMPEG_PATH", "ffmpeg")
+    max_seconds = getattr(settings, "WHISPER_MAX_AUDIO_SECONDS", None)
+
+    cmd = [
+        ffmpeg_path, "-y",
+        "-nostdin",
+        "-hide_banner",
+        "-nostats",
+        # O loudnorm imprime a medição (JSON) no nível info
+        "-loglevel", "info" if measure_loudness else "error",
         "-i", video_path,
+    ]
+    if measure_loudness:
+        analysis = MediaProbeService.loudness_analysis_filter()
+        cmd.extend([
+            "-filter_complex", f"[0:a:0]asplit=2[asr][loud];[loud]{analysis},anullsink",
+            "-map", "[asr]",
+        ])
+    else:
         # Seleciona apenas 1 stream de áudio (se existir). Evita pegar streams estranhas/corrompidas.
-        "-map", "0:a:0?",
+        cmd.extend(["-map", "0:a:0?"])
+    cmd.extend([
         "-vn",
         # Tenta ignorar erros de decode em mídias com áudio quebrado.
         "-err_detect", "ignore_err",
         "-fflags", "+discardcorrupt",
-        "-acodec", "pcm_s16le",
-        "-ar", "16000",
-        "-ac", "1",
-        audio_path
-    ]
+    ])
 
     if isinstance(max_seconds, (int, float)) and max_seconds and max_seconds > 0:
-        # Coloca -t antes do output para limitar o processamento.
-        cmd.insert(-1, str(float(max_seconds)))
-        cmd.insert(-1, "-t")
+        # -t antes do output para limitar o processamento.
+        cmd.extend(["-t", str(float(max_seconds))])
+
+    cmd.extend(output_args)
+    return cmd
+
+
+def _loudness_from_stderr(stderr: str, measure_loudness: bool) -> dict | None:
+    if not measure_loudness:
+        return None
+    measurement = MediaProbeService.parse_loudnorm(stderr)
+    if measurement is None:
+        logger.warning("[transcribe] loudnorm não imprimiu a medição de loudness")
+    return measurement
+
+
+def _extract_audio_with_ffmpeg(video_path: str, output_dir: str, measure_loudness: bool = False) -> tuple:
+    """Extrai o áudio para audio_temp.wav. Retorna (caminho, medição de loudness ou None)."""
+    audio_path = os.path.join(output_dir, "audio_temp.wav")
+    cmd = _build_audio_extract_cmd(
+        video_path,
+        ["-acodec", "pcm_s16le", "-ar", "16000", "-ac", "1", audio_path],
+        measure_loudness,
+    )
 
     try:
-        subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
-        return audio_path
+        result = subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
     except subprocess.CalledProcessError as e:
-        raise Exception(f"Erro FFmpeg áudio: {e.stderr.decode() if e.stderr else str(e)}")
+        raise Exception(f"Erro FFmpeg áudio: {e.stderr.decode(errors='replace')[-2000:] if e.stderr else str(e)}")
+
+    return audio_path, _loudness_from_stderr(result.stderr.decode(errors="replace"), measure_loudness)
+
 
+def _extract_audio_to_array(video_path: str, measure_loudness: bool = False, expected_seconds: float = None) -> tuple:
+    """
+    Decodifica o áudio (16 kHz mono) via stdout do ffmpeg num buffer float32 normalizado.
 
-def _transcribe_with_whisper(audio_path: str) -> dict:
+    O stdout é lido em blocos de PCM_CHUNK_BYTES e convertido direto para um buffer
+    float32 pré-alocado pela duração esperada: o PCM inteiro nunca fica em memória.
+
+    Returns:
+        (buffer, medição de loudness ou None)
+    """
+    cmd = _build_audio_extract_cmd(
+        video_path,
+        ["-f", "s16le", "-acodec", "pcm_s16le", "-ar", str(WHISPER_SAMPLE_RATE), "-ac", "1", "-"],
+        measure_loudness,
+    )
+
+    max_seconds = getattr(settings, "WHISPER_MAX_AUDIO_SECONDS", None)
+    seconds = float(expected_seconds or 0) or 600.0
+    if isinstance(max_seconds, (int, float)) and max_seconds and max_seconds > 0:
+        seconds = min(seconds, float(max_seconds))
+    # Folga de 1s: a duração do container raramente bate com a do stream de áudio
+    audio = np.empty(int((seconds + 1.0) * WHISPER_SAMPLE_RATE), dtype=np.float32)
+    size = 0
+
+    # stderr em arquivo: com a medição de loudness o ffmpeg loga em nível info e o pipe poderia encher
+    with tempfile.TemporaryFile() as stderr_file:
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr_file)
+        try:
+            while True:
+                chunk = proc.stdout.read(PCM_CHUNK_BYTES)
+                if not chunk:
+                    break
+                pcm = np.frombuffer(chunk, dtype=np.int16, count=len(chunk) // 2)
+                if size + pcm.size > audio.size:
+                    # Duração subestimada: cresce o buffer (raro)
+                    audio = np.resize(audio, max(size + pcm.size, int(audio.size * 1.5)))
+                audio[size:size + pcm.size] = pcm
+                size += pcm.size
+            returncode = proc.wait()
+        except BaseException:
+            proc.kill()
+            proc.wait()
+            raise
+        finally:
+            proc.stdout.close()
+
+        stderr_file.seek(0)
+        stderr = stderr_file.read().decode(errors="replace")
+
+    if returncode != 0:
+        raise Exception(f"Erro FFmpeg áudio (pipe): {stderr[-2000:] or returncode}")
+    if size == 0:
+        raise Exception("FFmpeg não retornou amostras de áudio")
+
+    audio = audio[:size]
+    audio *= 1.0 / 32768.0
+    return audio, _loudness_from_stderr(stderr, measure_loudness)
+
+
+def _transcribe_with_whisper(audio) -> dict:
+    """`audio` pode ser o caminho de um arquivo ou um np.ndarray float32 a 16 kHz."""
     try:
-        import whisper
         import torch
     except ImportError:
         raise Exception("Instale: pip install openai-whisper torch")
 
-    model_size = getattr(settings, "WHISPER_MODEL")
-    
-    device = "cuda" if torch.cuda.is_available() else "cpu"
-    
-    logger.info(f"Carregando Whisper modelo '{model_size}' em '{device}'...")
-    
-    try:
-        model = whisper.load_model(model_size, device=device)
+    # Modelo residente no processo: só paga o load no primeiro uso (ou após despejo LRU).
+    model, model_key = WhisperModelService.get_model()
+    _, device, dtype = model_key
 
+    try:
         whisper_word_timestamps = bool(getattr(settings, "WHISPER_WORD_TIMESTAMPS", True))
 
-        use_fp16 = bool(getattr(settings, "WHISPER_FP16", True)) if device == "cuda" else False
+        use_fp16 = dtype == "fp16"
 
         result = model.transcribe(
-            audio_path,
+            audio,
             word_timestamps=whisper_word_timestamps,
             beam_size=int(getattr(settings, "WHISPER_BEAM_SIZE", 1)),
             best_of=int(getattr(settings, "WHISPER_BEST_OF", 1)),
@@ -179,9 +613,13 @@ def _transcribe_with_whisper(audio_path: str) -> dict:
 
     except Exception as e:
         if device == "cuda":
+            # Estado da GPU pode estar inconsistente (ex: OOM); força reload no próximo job.
+            WhisperModelService.discard(model_key)
             torch.cuda.empty_cache()
         raise Exception(f"Falha interna Whisper: {e}")
 
+    logger.info(f"[whisper] Cache stats: {WhisperModelService.get_stats()}")
+
     segments = result.get("segments", [])
     full_text = result.get("text", "").strip()
     language = result.get("language", "en")
@@ -206,10 +644,6 @@ def _transcribe_with_whisper(audio_path: str) -> dict:
             "words": words
         })
 
-    if device == "cuda":
-        del model
-        torch.cuda.empty_cache()
-
     return {
         "full_text": full_text,
         "segments": structured_segments,
@@ -0,0 +1,466 @@
+import os
+import sys
+import tempfile
+import uuid
+from unittest import mock
+
+import numpy as np
+from django.test import SimpleTestCase, override_settings
+
+from .models import Video
+from .services.encoder_profile_service import EncoderProfileService
+from .services.media_probe_service import MediaProbeService
+from .services.scene_cut_service import SceneCutService
+from .tasks import pipeline
+from .tasks.clip_generation_task import _crop_x_expression, _should_fanout
+from .tasks.normalize_video_task import _check_segmented_sync, _plan_segments
+from .tasks.reframe_video_task import _crop_trajectory, _shot_trajectory, _simplify_polyline
+from .tasks.select_clips_task import _snap_to_scene_cuts
+from .tasks.transcribe_video_task import _build_audio_extract_cmd, _extract_audio_to_array
+
+WIDTH = 1920
+CROP_WIDTH = 608
+
+
+@override_settings(REFRAME_SMOOTHING_SECONDS=1.0, REFRAME_KEYFRAME_TOLERANCE_PX=8, REFRAME_MAX_KEYFRAMES=48)
+class CropTrajectoryTests(SimpleTestCase):
+    def test_constant_center_collapses_to_single_keyframe(self):
+        times = np.arange(0, 10, 0.5)
+        centers = np.full(times.size, 600.0)
+
+        self.assertEqual(_crop_trajectory(times, centers, 960, WIDTH, CROP_WIDTH), [[0.0, 296]])
+
+    def test_cut_jumps_instead_of_sliding(self):
+        times = np.arange(0, 10, 0.5)
+        centers = np.where(times < 5.0, 600.0, 1500.0)
+
+        keyframes = _crop_trajectory(times, centers, 960, WIDTH, CROP_WIDTH, cuts=[[4.9, 5.1]])
+
+        self.assertEqual(keyframes, [[0.0, 296], [4.999, 296], [5.0, 1196]])
+
+    def test_cuts_at_window_edges_are_ignored(self):
+        times = np.arange(0, 5, 0.5)
+        centers = np.full(times.size, 600.0)
+
+        keyframes = _crop_trajectory(times, centers, 960, WIDTH, CROP_WIDTH, cuts=[[-0.1, 0.0], [4.9, 5.2]])
+
+        self.assertEqual(keyframes, [[0.0, 296]])
+
+    def test_shot_without_faces_uses_fallback(self):
+        times = np.arange(0, 10, 0.5)
+        centers = np.where(times < 5.0, 600.0, np.nan)
+
+        keyframes = _crop_trajectory(times, centers, 960, WIDTH, CROP_WIDTH, cuts=[[4.9, 5.1]])
+
+        self.assertEqual(keyframes, [[0.0, 296], [4.999, 296], [5.0, 656]])
+
+    def test_no_samples_returns_fallback(self):
+        self.assertEqual(_crop_trajectory([], [], 960, WIDTH, CROP_WIDTH), [[0.0, 656]])
+
+    def test_keyframes_stay_inside_frame(self):
+        times = np.arange(0, 10, 0.5)
+        centers = np.linspace(0, WIDTH, times.size)
+
+        keyframes = _crop_trajectory(times, centers, 960, WIDTH, CROP_WIDTH)
+
+        self.assertGreater(len(keyframes), 1)
+        self.assertTrue(all(0 <= x <= WIDTH - CROP_WIDTH for _, x in keyframes))
+        self.assertEqual([t for t, _ in keyframes], sorted(t for t, _ in keyframes))
+
+
+@override_settings(REFRAME_SMOOTHING_SECONDS=1.0, REFRAME_KEYFRAME_TOLERANCE_PX=8)
+class ShotTrajectoryTests(SimpleTestCase):
+    def test_all_nan_uses_fallback_at_shot_start(self):
+        times = np.array([2.0, 2.5, 3.0])
+        centers = np.full(3, np.nan)
+
+        self.assertEqual(_shot_trajectory(times, centers, 100, WIDTH, CROP_WIDTH, 8), [[2.0, 0]])
+
+    def test_single_sample(self):
+        self.assertEqual(
+            _shot_trajectory(np.array([1.0]), np.array([1800.0]), 960, WIDTH, CROP_WIDTH, 8),
+            [[1.0, WIDTH - CROP_WIDTH]],
+        )
+
+    def test_missing_samples_are_interpolated(self):
+        times = np.arange(0, 4, 0.5)
+        centers = np.array([600.0, np.nan, np.nan, 600.0, np.nan, 600.0, 600.0, np.nan])
+
+        self.assertEqual(_shot_trajectory(times, centers, 960, WIDTH, CROP_WIDTH, 8), [[0.0, 296]])
+
+
+class SimplifyPolylineTests(SimpleTestCase):
+    def test_straight_line_keeps_endpoints(self):
+        times = np.arange(5, dtype=np.float64)
+
+        self.assertEqual(_simplify_polyline(times, times * 10, 0.5, 10), [0, 4])
+
+    def test_keeps_peak(self):
+        times = np.arange(5, dtype=np.float64)
+        values = np.array([0.0, 10.0, 20.0, 10.0, 0.0])
+
+        self.assertEqual(_simplify_polyline(times, values, 0.5, 10), [0, 2, 4])
+
+    def test_respects_max_points(self):
+        times = np.arange(9, dtype=np.float64)
+        values = np.array([0.0, 50.0, 0.0, 50.0, 0.0, 50.0, 0.0, 50.0, 0.0])
+
+        self.assertEqual(len(_simplify_polyline(times, values, 0.5, 4)), 4)
+
+    def test_two_points(self):
+        self.assertEqual(_simplify_polyline(np.array([0.0, 1.0]), np.array([3.0, 7.0]), 0.5, 10), [0, 1])
+
+
+class CropExpressionTests(SimpleTestCase):
+    def test_single_keyframe_is_constant(self):
+        self.assertEqual(_crop_x_expression([[0.0, 296]]), "296")
+
+    def test_piecewise_linear_with_escaped_commas(self):
+        expr = _crop_x_expression([[0.0, 100], [2.0, 300]])
+
+        self.assertEqual(
+            expr,
+            "if(lt(t\\,0.000)\\,100\\,if(lt(t\\,2.000)\\,100+(200)*(t-0.000)/2.000\\,300))",
+        )
+        # Vírgula sem escape quebraria a cadeia de filtros do ffmpeg
+        self.assertTrue(all(expr[i - 1] == "\\" for i, c in enumerate(expr) if c == ","))
+
+    def test_jump_at_cut_skips_zero_length_segment(self):
+        expr = _crop_x_expression([[0.0, 100], [4.999, 100], [5.0, 900], [5.0, 900]])
+
+        self.assertNotIn("/0.000", expr)
+        self.assertTrue(expr.endswith("\\,900)))"))
+
+
+SCENE_PARAMS = {"threshold": 0.35, "local_ratio": 2.0, "local_window": 8, "min_shot_seconds": 1.0}
+
+
+def _frames(*levels, rows=40, cols=8):
+    """Frames sintéticos: cada item é um nível de cinza ou (fração de linhas brancas)."""
+    frames = np.zeros((len(levels), rows, cols, 3), dtype=np.uint8)
+    for i, level in enumerate(levels):
+        if isinstance(level, tuple):
+            frames[i, :int(rows * level[0])] = 255
+        else:
+            frames[i] = level
+    return frames
+
+
+class SceneCutDetectTests(SimpleTestCase):
+    def test_hard_cut(self):
+        frames = _frames(*([0] * 10 + [255] * 10))
+        timestamps = np.arange(20) * 0.5
+
+        cuts = SceneCutService.detect(frames, timestamps, SCENE_PARAMS)
+
+        np.testing.assert_allclose(cuts, [[4.5, 5.0]])
+
+    def test_static_video_has_no_cuts(self):
+        frames = _frames(*([90] * 20))
+
+        self.assertEqual(SceneCutService.detect(frames, np.arange(20) * 0.5, SCENE_PARAMS).shape, (0, 2))
+
+    def test_too_few_frames(self):
+        self.assertEqual(SceneCutService.detect(_frames(0), [0.0], SCENE_PARAMS).shape, (0, 2))
+
+    def test_min_shot_keeps_strongest_cut(self):
+        # Preto -> 60% branco -> branco: dois cortes a 0.5s, fica o mais forte (0.6 > 0.4)
+        frames = _frames(*([0] * 5 + [(0.6,)] + [255] * 14))
+
+        cuts = SceneCutService.detect(frames, np.arange(20) * 0.5, SCENE_PARAMS)
+
+        np.testing.assert_allclose(cuts, [[2.0, 2.5]])
+
+    def test_cuts_between_and_stable_time(self):
+        cuts = np.array([[4.5, 5.0], [19.5, 20.0]])
+
+        np.testing.assert_allclose(SceneCutService.cuts_between(cuts, 0, 10), [[4.5, 5.0]])
+        self.assertEqual(SceneCutService.cuts_between(None, 0, 10).shape, (0, 2))
+        # Perto do corte: puxado para dentro do plano que contém t
+        self.assertEqual(SceneCutService.stable_time(cuts, 5.1, 0, 30), 5.5)
+        self.assertEqual(SceneCutService.stable_time(cuts, 10.0, 0, 30), 10.0)
+
+
+@override_settings(SCENE_SNAP_TOLERANCE_SECONDS=1.5, SCENE_SNAP_FORWARD_SECONDS=0.3, MEDIA_ROOT="/tmp")
+class SnapToSceneCutsTests(SimpleTestCase):
+    config = {"min_duration": 5, "max_duration": 60}
+
+    def _snap(self, clips, cuts, config=None):
+        video = Video(video_id=uuid.uuid4())
+        with mock.patch.object(SceneCutService, "get", return_value=None if cuts is None else np.array(cuts)):
+            return _snap_to_scene_cuts(video, clips, config or self.config)
+
+    def test_snaps_start_and_end_and_drops_tail(self):
+        clips = self._snap([{"start_time": 10.5, "end_time": 29.5}], [[9.8, 10.0], [29.9, 30.1]])
+
+        self.assertEqual(clips[0], {"start_time": 10.0, "end_time": 29.9, "duration": 19.9, "tail_seconds": 0.0})
+
+    def test_start_moves_forward_only_a_little(self):
+        clips = self._snap([{"start_time": 9.5, "end_time": 20.0}], [[9.8, 10.0]])
+
+        self.assertEqual(clips[0]["start_time"], 9.5)
+        self.assertEqual(clips[0]["tail_seconds"], 1.0)
+
+    def test_keeps_clip_when_snapped_duration_is_out_of_range(self):
+        clips = self._snap(
+            [{"start_time": 10.5, "end_time": 29.5}],
+            [[9.8, 10.0], [29.9, 30.1]],
+            config={"min_duration": 19.95, "max_duration": 60},
+        )
+
+        self.assertEqual(clips[0], {"start_time": 10.5, "end_time": 29.5})
+
+    def test_without_cuts_returns_clips_unchanged(self):
+        clips = [{"start_time": 1.0, "end_time": 9.0}]
+
+        self.assertEqual(self._snap(clips, None), [{"start_time": 1.0, "end_time": 9.0}])
+        self.assertEqual(self._snap(clips, np.empty((0, 2))), [{"start_time": 1.0, "end_time": 9.0}])
+
+
+class AdvancePipelineTests(SimpleTestCase):
+    def _advance(self, edge_checks):
+        state = {stage: stage in ("download", "normalize") for stage in pipeline.PIPELINE_STAGES}
+        video = mock.Mock(organization_id=uuid.uuid4())
+        with mock.patch.object(pipeline, "record_checkpoint"), \
+                mock.patch.object(pipeline.cache, "set"), \
+                mock.patch.object(pipeline, "get_pipeline_state", return_value=state), \
+                mock.patch.dict(pipeline.EDGE_ARTIFACT_CHECKS, edge_checks), \
+                mock.patch.object(pipeline.Video.objects, "get", return_value=video), \
+                mock.patch.object(pipeline.Organization.objects, "get", return_value=mock.Mock(plan="business")), \
+                mock.patch.object(pipeline, "dispatch_stage", return_value=True) as dispatch, \
+                mock.patch.object(pipeline, "_fail_stage") as fail:
+            dispatched = pipeline.advance_pipeline("vid", "normalize")
+        return dispatched, dispatch, fail
+
+    def test_dispatches_all_ready_stages(self):
+        dispatched, _, fail = self._advance({
+            ("normalize", "thumbnail"): lambda _v: True,
+            ("normalize", "transcribe"): lambda _v: True,
+        })
+
+        self.assertEqual(dispatched, ["thumbnail", "transcribe"])
+        fail.assert_not_called()
+
+    def test_missing_artifact_fails_only_its_stage(self):
+        dispatched, dispatch, fail = self._advance({
+            ("normalize", "thumbnail"): lambda _v: True,
+            ("normalize", "transcribe"): lambda _v: False,
+        })
+
+        self.assertEqual(dispatched, ["thumbnail"])
+        dispatch.assert_called_once_with("vid", "thumbnail", plan="business")
+        fail.assert_called_once_with("vid", "transcribe", ["normalize"])
+
+    def test_nothing_dispatched_when_every_edge_is_missing(self):
+        dispatched, dispatch, fail = self._advance({
+            ("normalize", "thumbnail"): lambda _v: False,
+            ("normalize", "transcribe"): lambda _v: False,
+        })
+
+        self.assertEqual(dispatched, [])
+        dispatch.assert_not_called()
+        self.assertEqual(fail.call_count, 2)
+
+
+@override_settings(
+    ENCODER_PROFILES={},
+    ENCODER_PROFILE_POLICY={"render": {"starter": {"ladder": ["quality", "fast"], "deadline_seconds": 900}}},
+)
+class EncoderProfileSelectTests(SimpleTestCase):
+    def _select(self, depth, consumers, typical, task_name=None):
+        with mock.patch.object(EncoderProfileService, "get_queue_depth", return_value=(depth, consumers)), \
+                mock.patch.object(EncoderProfileService, "get_typical_task_seconds", return_value=typical) as get_typical:
+            profile = EncoderProfileService.select(
+                "render", "starter", media_seconds=300, queue="video.clip.starter", task_name=task_name,
+            )
+        return profile, get_typical
+
+    def test_empty_queue_keeps_top_profile(self):
+        profile, get_typical = self._select(0, 0, 600)
+
+        self.assertEqual(profile["name"], "quality")
+        get_typical.assert_not_called()
+
+    def test_backlog_steps_down_the_ladder(self):
+        profile, get_typical = self._select(10, 4, 300, task_name="clip_generation_task")
+
+        self.assertEqual(profile["name"], "fast")
+        self.assertEqual(profile["backlog_seconds"], 750.0)
+        get_typical.assert_called_once_with("render", "clip_generation_task")
+
+
+@override_settings(CLIP_RENDER_FANOUT=True, CLIP_FANOUT_MIN_CLIP_SECONDS=900, CLIP_FANOUT_MIN_CLIPS=12)
+class ShouldFanoutTests(SimpleTestCase):
+    def _jobs(self, count, seconds):
+        return [{"start_time": i * 100.0, "end_time": i * 100.0 + seconds} for i in range(count)]
+
+    def test_short_job_renders_locally(self):
+        self.assertFalse(_should_fanout(self._jobs(5, 40)))
+
+    def test_long_clips_fan_out(self):
+        self.assertTrue(_should_fanout(self._jobs(10, 90)))
+
+    def test_many_clips_fan_out(self):
+        self.assertTrue(_should_fanout(self._jobs(12, 20)))
+
+    def test_single_clip_never_fans_out(self):
+        self.assertFalse(_should_fanout(self._jobs(1, 1200)))
+
+    @override_settings(CLIP_RENDER_FANOUT=False)
+    def test_disabled(self):
+        self.assertFalse(_should_fanout(self._jobs(20, 90)))
+
+
+LOUDNORM_STDERR = """
+[Parsed_loudnorm_2 @ 0x55d0] 
+{
+	"input_i" : "-23.54",
+	"input_tp" : "-4.10",
+	"input_lra" : "6.30",
+	"input_thresh" : "-33.90",
+	"output_i" : "-16.02",
+	"output_tp" : "-1.50",
+	"output_lra" : "5.10",
+	"output_thresh" : "-26.30",
+	"normalization_type" : "linear",
+	"target_offset" : "0.02"
+}
+"""
+
+
+@override_settings(LOUDNESS_TARGET_I=-16.0, LOUDNESS_TARGET_TP=-1.5, LOUDNESS_TARGET_LRA=11.0, LOUDNESS_TOLERANCE_LU=1.0)
+class LoudnessTests(SimpleTestCase):
+    def test_parse_loudnorm(self):
+        measurement = MediaProbeService.parse_loudnorm("Stream mapping: ..." + LOUDNORM_STDERR)
+
+        self.assertEqual(measurement["input_i"], -23.54)
+        self.assertEqual(measurement["target_offset"], 0.02)
+        self.assertEqual(measurement["target"], {"I": -16.0, "TP": -1.5, "LRA": 11.0})
+
+    def test_parse_silence_and_missing_json(self):
+        measurement = MediaProbeService.parse_loudnorm(LOUDNORM_STDERR.replace('"-23.54"', '"-inf"'))
+
+        self.assertIsNone(measurement["input_i"])
+        self.assertIsNone(MediaProbeService.parse_loudnorm("Output #0, wav"))
+
+    def test_filter_within_tolerance_is_skipped(self):
+        measurement = MediaProbeService.parse_loudnorm(LOUDNORM_STDERR.replace('"-23.54"', '"-16.40"'))
+
+        self.assertIsNone(MediaProbeService.loudnorm_filter(measurement))
+
+    def test_filter_outside_tolerance_uses_two_passes(self):
+        audio_filter = MediaProbeService.loudnorm_filter(MediaProbeService.parse_loudnorm(LOUDNORM_STDERR))
+
+        self.assertIn(":measured_I=-23.54:", audio_filter)
+        self.assertTrue(audio_filter.endswith(":linear=true"))
+
+    def test_filter_without_measurement_is_single_pass(self):
+        self.assertEqual(MediaProbeService.loudnorm_filter(None), "loudnorm=I=-16.0:TP=-1.5:LRA=11.0")
+
+    def test_stored_loudness_checks_target_and_content(self):
+        measurement = MediaProbeService.parse_loudnorm(LOUDNORM_STDERR)
+        video = Video(video_id=uuid.uuid4(), loudness={
+            "normalized": {"content_hash": "abc", "version": 2, "measurement": measurement},
+        })
+
+        self.assertEqual(MediaProbeService.stored_loudness(video, ["normalized"], {"normalized": "abc"}), measurement)
+        self.assertIsNone(MediaProbeService.stored_loudness(video, ["normalized"], {"normalized": "def"}))
+        with override_settings(LOUDNESS_TARGET_I=-14.0):
+            self.assertIsNone(MediaProbeService.stored_loudness(video, ["normalized"]))
+
+    @override_settings(WHISPER_MAX_AUDIO_SECONDS=None)
+    def test_extract_cmd_measures_in_the_same_decode(self):
+        cmd = _build_audio_extract_cmd("in.mp4", ["-f", "s16le", "-"], measure_loudness=True)
+
+        graph = cmd[cmd.index("-filter_complex") + 1]
+        self.assertTrue(graph.startswith("[0:a:0]asplit=2[asr][loud];[loud]loudnorm="))
+        self.assertTrue(graph.endswith("print_format=json,anullsink"))
+        self.assertEqual(cmd[cmd.index("-map") + 1], "[asr]")
+        self.assertEqual(cmd[cmd.index("-loglevel") + 1], "info")
+        self.assertNotIn("-filter_complex", _build_audio_extract_cmd("in.mp4", ["-"]))
+
+
+FAKE_FFMPEG = """#!{python}
+import sys
+import numpy as np
+
+sys.stdout.buffer.write(np.arange({samples}, dtype=np.int16).tobytes())
+sys.stderr.write({stderr!r})
+sys.exit({code})
+"""
+
+
+@override_settings(WHISPER_MAX_AUDIO_SECONDS=None)
+class ExtractAudioToArrayTests(SimpleTestCase):
+    def _extract(self, samples, expected_seconds, stderr="", code=0, measure_loudness=False):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "ffmpeg")
+            with open(path, "w") as f:
+                f.write(FAKE_FFMPEG.format(python=sys.executable, samples=samples, stderr=stderr, code=code))
+            os.chmod(path, 0o755)
+            with override_settings(FFMPEG_PATH=path):
+                return _extract_audio_to_array("in.mp4", measure_loudness, expected_seconds=expected_seconds)
+
+    def test_reads_pcm_into_float_buffer(self):
+        audio, loudness = self._extract(48000, expected_seconds=3)
+
+        self.assertEqual(audio.dtype, np.float32)
+        self.assertEqual(audio.size, 48000)
+        self.assertAlmostEqual(float(audio[1]), 1 / 32768)
+        self.assertIsNone(loudness)
+
+    def test_grows_when_duration_is_underestimated(self):
+        audio, _ = self._extract(40000, expected_seconds=0.5)
+
+        self.assertEqual(audio.size, 40000)
+        self.assertAlmostEqual(float(audio[-1]) * 32768, 39999 - 65536)
+
+    def test_parses_loudness_from_stderr(self):
+        _, loudness = self._extract(1600, expected_seconds=1, stderr=LOUDNORM_STDERR, measure_loudness=True)
+
+        self.assertEqual(loudness["input_i"], -23.54)
+
+    def test_ffmpeg_error(self):
+        with self.assertRaisesRegex(Exception, "decode falhou"):
+            self._extract(0, expected_seconds=1, stderr="decode falhou", code=1)
+
+
+@override_settings(NORMALIZE_SEGMENT_SECONDS=300)
+class SegmentedNormalizeTests(SimpleTestCase):
+    def test_cuts_snap_to_output_frames(self):
+        with mock.patch(
+            "clips.tasks.normalize_video_task._find_keyframes_near",
+            return_value=[299.987, 600.0417],
+        ):
+            segments = _plan_segments("in.mp4", 900.0)
+
+        self.assertEqual(len(segments), 3)
+        for start, _ in segments[1:]:
+            self.assertAlmostEqual(start * 30, round(start * 30))
+
+    def _check(self, output, source):
+        with mock.patch.object(MediaProbeService, "probe", return_value=output):
+            _check_segmented_sync("out.mp4", source)
+
+    def test_accepts_drift_within_one_frame(self):
+        self._check(
+            {"has_audio": True, "video_duration": 900.02, "audio_duration": 900.0},
+            {"video_duration": 900.0, "audio_duration": 900.0},
+        )
+
+    def test_ignores_offset_already_in_source(self):
+        self._check(
+            {"has_audio": True, "video_duration": 900.5, "audio_duration": 900.0},
+            {"video_duration": 900.5, "audio_duration": 900.0},
+        )
+
+    def test_rejects_drift_above_one_frame(self):
+        with self.assertRaisesRegex(Exception, "fora de sincronia"):
+            self._check(
+                {"has_audio": True, "video_duration": 900.1, "audio_duration": 900.0},
+                {"video_duration": 900.0, "audio_duration": 900.0},
+            )
+
+    def test_video_only_compares_with_source(self):
+        with self.assertRaisesRegex(Exception, "fora de sincronia"):
+            self._check({"has_audio": False, "video_duration": 899.8}, {"video_duration": 900.0})
@@ -11,7 +11,7 @@ from .views.stripe_webhook_view import stripe_webhook
 from .views.schedule_views import list_schedules, create_schedule, update_schedule, cancel_schedule
 from .views.integration_views import list_integrations, connect_integration, oauth_callback, disconnect_integration
 from .views.organization_views import create_organization, get_organization, update_organization, get_organization_credits, add_team_member, remove_team_member
-from .views.admin_views import reprocess_job, cancel_job, adjust_credits, get_job_failures, get_step_statistics
+from .views.admin_views import reprocess_job, cancel_job, adjust_credits, get_job_failures, get_step_statistics, get_stage_timings
 from .views.onboarding_views import get_csrf_token, onboarding_view, get_onboarding, update_onboarding
 from .views.team_member_views import list_team_members, invite_team_member, remove_team_member, update_team_member_role
 from .views.webhook_views import create_webhook, list_webhooks, delete_webhook, test_webhook
@@ -123,4 +123,5 @@ urlpatterns = [
     path("admin/organizations/<uuid:organization_id>/unblock/", unblock_organization, name="unblock-organization"),
     path("admin/jobs/failures/", get_job_failures, name="get-job-failures"),
     path("admin/statistics/steps/", get_step_statistics, name="get-step-statistics"),
+    path("admin/statistics/stages/", get_stage_timings, name="get-stage-timings"),
 ]
@@ -3,8 +3,6 @@ Validadores para mídia, URLs externas e quotas.
 """
 
 import os
-import subprocess
-from django.conf import settings
 
 
 class MediaValidator:
@@ -112,8 +110,8 @@ class MediaValidator:
 
     @classmethod
     def _get_video_metadata(cls, file) -> dict:
-        """Extrai metadados do vídeo usando ffprobe."""
-        ffprobe_path = getattr(settings, "FFMPEG_PATH", "ffmpeg").replace("ffmpeg", "ffprobe")
+        """Extrai metadados do vídeo usando ffprobe (uma única chamada via MediaProbeService)."""
+        from .services.media_probe_service import MediaProbeService
 
         # Salva arquivo temporário
         import tempfile
@@ -123,50 +121,14 @@ class MediaValidator:
             tmp_path = tmp.name
 
         try:
-            # Extrai duração
-            cmd_duration = [
-                ffprobe_path,
-                "-v", "error",
-                "-show_entries", "format=duration",
-                "-of", "default=noprint_wrappers=1:nokey=1",
-                tmp_path,
-            ]
-            result = subprocess.run(cmd_duration, capture_output=True, text=True, check=True)
-            duration = float(result.stdout.strip())
-
-            # Extrai resolução e codecs
-            cmd_streams = [
-                ffprobe_path,
-                "-v", "error",
-                "-select_streams", "v:0",
-                "-show_entries", "stream=width,height,codec_name",
-                "-of", "csv=p=0",
-                tmp_path,
-            ]
-            result = subprocess.run(cmd_streams, capture_output=True, text=True, check=True)
-            parts = result.stdout.strip().split(",")
-            width = int(parts[0]) if len(parts) > 0 else 0
-            height = int(parts[1]) if len(parts) > 1 else 0
-            video_codec = parts[2] if len(parts) > 2 else ""
-
-            # Extrai codec de áudio
-            cmd_audio = [
-                ffprobe_path,
-                "-v", "error",
-                "-select_streams", "a:0",
-                "-show_entries", "stream=codec_name",
-                "-of", "default=noprint_wrappers=1:nokey=1",
-                tmp_path,
-            ]
-            result = subprocess.run(cmd_audio, capture_output=True, text=True, check=True)
-            audio_codec = result.stdout.strip()
+            metadata = MediaProbeService.probe(tmp_path)
 
             return {
-                "duration": duration,
-                "width": width,
-                "height": height,
-                "video_codec": video_codec,
-                "audio_codec": audio_codec,
+                "duration": metadata.get("duration") or 0,
+                "width": metadata.get("width") or 0,
+                "height": metadata.get("height") or 0,
+                "video_codec": metadata.get("video_codec") or "",
+                "audio_codec": metadata.get("audio_codec") or "",
             }
 
         finally:
@@ -8,17 +8,21 @@ from rest_framework.response import Response
 from django.utils import timezone
 
 from ..models import Job, Organization, CreditTransaction, Video
-from ..tasks import download_video_task
+from ..tasks.pipeline import resume_pipeline, STEP_TO_STAGE
 
 
 @api_view(["POST"])
 def reprocess_job(request, job_id):
     """
-    Reprocessa um job a partir de uma etapa específica.
+    Reprocessa um job reentrando no pipeline pelas etapas obsoletas.
+    
+    Etapas cujo checkpoint (entradas, config e versão do código) ainda é
+    válido não rodam de novo. `from_step` força o reprocessamento daquela
+    etapa e das que dependem dela.
     
     Body:
     {
-        "from_step": "downloading|normalizing|transcribing|analyzing|...",
+        "from_step": "downloading|normalizing|transcribing|analyzing|...",  (opcional)
         "admin_key": "secret_key"
     }
     
@@ -34,40 +38,40 @@ def reprocess_job(request, job_id):
             )
 
         job = Job.objects.get(job_id=job_id)
-        from_step = request.data.get("from_step", "downloading")
+        from_step = request.data.get("from_step")
+
+        from_stage = None
+        if from_step:
+            from_stage = STEP_TO_STAGE.get(from_step, from_step)
+            if from_stage not in STEP_TO_STAGE.values():
+                return Response(
+                    {"error": f"Unknown step '{from_step}'"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+        video = Video.objects.get(video_id=job.video_id)
 
-        # Reseta job para etapa anterior
+        # Reseta job para reentrada no pipeline
         job.status = "queued"
-        job.current_step = from_step
+        job.current_step = from_step or job.last_successful_step
         job.retry_count = 0
         job.error_code = None
         job.error_message = None
         job.save()
 
-        # Dispara task apropriada
-        video = Video.objects.get(video_id=job.video_id)
+        video.status = "queued"
+        video.error_message = None
+        video.retry_count = 0
+        video.save()
 
-        if from_step == "downloading":
-            task = download_video_task.apply_async(
-                args=[video.id],
-                queue=f"video.download.{job.organization.plan}",
-            )
-        else:
-            # TODO: Implementar para outras etapas
-            return Response(
-                {"error": f"Reprocessing from '{from_step}' not yet implemented"},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
-
-        job.task_id = task.id
-        job.save()
+        resumed_stages = resume_pipeline(str(video.video_id), from_stage=from_stage)
 
         return Response(
             {
                 "job_id": str(job.job_id),
                 "status": "queued",
                 "from_step": from_step,
-                "task_id": task.id,
+                "resumed_stages": resumed_stages,
             },
             status=status.HTTP_200_OK,
         )
@@ -330,6 +334,52 @@ def get_step_statistics(request):
         )
 
 
+@api_view(["GET"])
+def get_stage_timings(request):
+    """
+    Retorna p50/p95 de tempo e recursos por etapa do pipeline (StageRun).
+    
+    Query params:
+    - days: janela em dias (padrão 7)
+    - stage: filtra por etapa (opcional)
+    - organization_id: filtra por organização (opcional)
+    - admin_key: secret_key
+    
+    Requer autenticação de admin.
+    """
+    try:
+        # Valida admin key
+        admin_key = request.query_params.get("admin_key")
+        if not _validate_admin_key(admin_key):
+            return Response(
+                {"error": "Unauthorized"},
+                status=status.HTTP_403_FORBIDDEN,
+            )
+
+        from ..services.stage_metrics_service import StageMetricsService
+
+        days = int(request.query_params.get("days", 7))
+        stages = StageMetricsService.get_stage_percentiles(
+            days=days,
+            organization_id=request.query_params.get("organization_id"),
+            stage=request.query_params.get("stage"),
+        )
+
+        return Response(
+            {
+                "days": days,
+                "stages": stages,
+            },
+            status=status.HTTP_200_OK,
+        )
+
+    except Exception as e:
+        return Response(
+            {"error": str(e)},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+
 def _validate_admin_key(admin_key: str) -> bool:
     """Valida chave de admin."""
     from django.conf import settings
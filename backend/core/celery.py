@@ -1,6 +1,7 @@
 import os
 from celery import Celery
 from celery.schedules import crontab
+from celery.signals import worker_process_init, before_task_publish, task_prerun, task_postrun
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
 
@@ -98,3 +99,39 @@ app.conf.worker_prefetch_multiplier = 1
 
 app.conf.task_time_limit = int(os.getenv("CELERY_TASK_TIME_LIMIT", str(90 * 60)))
 app.conf.task_soft_time_limit = int(os.getenv("CELERY_TASK_SOFT_TIME_LIMIT", str(85 * 60)))
+
+
+@worker_process_init.connect
+def _warm_whisper_models(**kwargs):
+    # Workers das filas video.transcribe.* devem subir com WHISPER_PRELOAD=true
+    # para que o primeiro job já encontre o modelo residente.
+    from django.conf import settings
+
+    if not getattr(settings, "WHISPER_PRELOAD", False):
+        return
+
+    from clips.services.whisper_model_service import WhisperModelService
+    WhisperModelService.warm(getattr(settings, "WHISPER_PRELOAD_MODELS", None))
+
+
+@before_task_publish.connect
+def _mark_task_enqueued(headers=None, **kwargs):
+    from clips.services.stage_metrics_service import StageMetricsService
+    StageMetricsService.mark_enqueued(headers)
+
+
+@task_prerun.connect
+def _start_stage_run(task_id=None, task=None, **kwargs):
+    if not task or not task.name.startswith("clips."):
+        return
+    from clips.services.stage_metrics_service import StageMetricsService
+    StageMetricsService.start(task_id)
+
+
+@task_postrun.connect
+def _finish_stage_run(task_id=None, task=None, args=None, kwargs=None, retval=None, state=None, **extra):
+    # Grava um StageRun por execução (tempo em fila, wall, CPU, RSS, I/O)
+    if not task or not task.name.startswith("clips."):
+        return
+    from clips.services.stage_metrics_service import StageMetricsService
+    StageMetricsService.finish(task, task_id, args, kwargs, state, retval)
@@ -189,11 +189,165 @@ WHISPER_WORD_TIMESTAMPS = os.getenv('WHISPER_WORD_TIMESTAMPS', 'true').lower() =
 WHISPER_BEAM_SIZE = int(os.getenv('WHISPER_BEAM_SIZE', '1'))
 WHISPER_BEST_OF = int(os.getenv('WHISPER_BEST_OF', '1'))
 WHISPER_FP16 = os.getenv('WHISPER_FP16', 'true').lower() == 'true'
+# Cache de modelos residentes por processo (workers video.transcribe.*)
+WHISPER_MAX_RESIDENT_MODELS = int(os.getenv('WHISPER_MAX_RESIDENT_MODELS', '1'))
+WHISPER_PRELOAD = os.getenv('WHISPER_PRELOAD', 'false').lower() == 'true'
+WHISPER_PRELOAD_MODELS = [m.strip() for m in os.getenv('WHISPER_PRELOAD_MODELS', '').split(',') if m.strip()]
+# Extrai o áudio via pipe (stdout do ffmpeg -> buffer float32) em vez de audio_temp.wav
+WHISPER_STREAM_AUDIO = os.getenv('WHISPER_STREAM_AUDIO', 'true').lower() == 'true'
+
+# Transcrição distribuída (shards por silêncio via Celery chord), por plano
+TRANSCRIBE_SHARDING = {
+    'starter': {
+        'enabled': os.getenv('TRANSCRIBE_SHARDING_STARTER', 'true').lower() == 'true',
+        'min_duration': float(os.getenv('TRANSCRIBE_SHARD_MIN_DURATION_STARTER', '1800')),
+        'shard_seconds': float(os.getenv('TRANSCRIBE_SHARD_SECONDS_STARTER', '900')),
+        'max_shards': int(os.getenv('TRANSCRIBE_MAX_SHARDS_STARTER', '4')),
+    },
+    'business': {
+        'enabled': os.getenv('TRANSCRIBE_SHARDING_BUSINESS', 'true').lower() == 'true',
+        'min_duration': float(os.getenv('TRANSCRIBE_SHARD_MIN_DURATION_BUSINESS', '900')),
+        'shard_seconds': float(os.getenv('TRANSCRIBE_SHARD_SECONDS_BUSINESS', '600')),
+        'max_shards': int(os.getenv('TRANSCRIBE_MAX_SHARDS_BUSINESS', '8')),
+    },
+}
 
-# Reframe tuning (optional)
-REFRAME_SAMPLE_EVERY_SECONDS = float(os.getenv('REFRAME_SAMPLE_EVERY_SECONDS', '1.0'))
-REFRAME_MAX_FACE_SAMPLES = int(os.getenv('REFRAME_MAX_FACE_SAMPLES', '240'))
-REFRAME_MIN_SAMPLES_TO_STOP = int(os.getenv('REFRAME_MIN_SAMPLES_TO_STOP', '90'))
+# Reframe tuning (optional): só nas janelas dos clips, com trajetória de recorte suavizada por clip
+REFRAME_SAMPLE_EVERY_SECONDS = float(os.getenv('REFRAME_SAMPLE_EVERY_SECONDS', '0.5'))
+REFRAME_SMOOTHING_SECONDS = float(os.getenv('REFRAME_SMOOTHING_SECONDS', '1.0'))  # sigma do filtro gaussiano
+REFRAME_KEYFRAME_TOLERANCE_PX = float(os.getenv('REFRAME_KEYFRAME_TOLERANCE_PX', '8'))
+REFRAME_MAX_KEYFRAMES = int(os.getenv('REFRAME_MAX_KEYFRAMES', '48'))
+# Detecção de rosto: frames reduzidos antes da inferência; shards da linha do tempo vão para um pool
+# residente do billiard (funciona dentro do prefork). 1 = no próprio processo, 0 = número de CPUs
+REFRAME_DETECT_WORKERS = int(os.getenv('REFRAME_DETECT_WORKERS', '0'))
+REFRAME_DETECT_WIDTH = int(os.getenv('REFRAME_DETECT_WIDTH', '320'))
+REFRAME_MIN_DETECTION_CONFIDENCE = float(os.getenv('REFRAME_MIN_DETECTION_CONFIDENCE', '0.6'))
+
+# Pilha de frames em baixa resolução (memory-map .npy, local ao nó) lida por thumbnail, reframe e thumbnails de clips
+FRAME_CACHE_ENABLED = os.getenv('FRAME_CACHE_ENABLED', 'true').lower() == 'true'
+FRAME_CACHE_FPS = float(os.getenv('FRAME_CACHE_FPS', '2'))
+FRAME_CACHE_WIDTH = int(os.getenv('FRAME_CACHE_WIDTH', '256'))
+FRAME_CACHE_MAX_FRAMES = int(os.getenv('FRAME_CACHE_MAX_FRAMES', '3600'))  # vídeos longos amostram a menos fps
+FRAME_CACHE_WAIT_SECONDS = int(os.getenv('FRAME_CACHE_WAIT_SECONDS', '600'))
+
+# Cortes de cena detectados sobre a pilha de frames (histograma de cor + mediana local)
+SCENE_CUT_THRESHOLD = float(os.getenv('SCENE_CUT_THRESHOLD', '0.35'))  # distância L1 dos histogramas (0-1)
+SCENE_CUT_LOCAL_RATIO = float(os.getenv('SCENE_CUT_LOCAL_RATIO', '2.0'))
+SCENE_CUT_LOCAL_WINDOW = int(os.getenv('SCENE_CUT_LOCAL_WINDOW', '8'))  # frames de cada lado
+SCENE_MIN_SHOT_SECONDS = float(os.getenv('SCENE_MIN_SHOT_SECONDS', '1.0'))
+# Select: bordas dos clips alinhadas a cortes próximos (0 desativa)
+SCENE_SNAP_TOLERANCE_SECONDS = float(os.getenv('SCENE_SNAP_TOLERANCE_SECONDS', '1.5'))
+SCENE_SNAP_FORWARD_SECONDS = float(os.getenv('SCENE_SNAP_FORWARD_SECONDS', '0.3'))
+
+# Thumbnails (vídeo e clips): frames candidatos pontuados por nitidez, exposição e rosto
+THUMBNAIL_CANDIDATES = int(os.getenv('THUMBNAIL_CANDIDATES', '12'))
+
+# Render tuning (optional)
+# Lotes de clips próximos no tempo compartilham um único decode (filter_complex com N saídas)
+CLIP_BATCH_RENDER = os.getenv('CLIP_BATCH_RENDER', 'true').lower() == 'true'
+CLIP_BATCH_MAX_CLIPS = int(os.getenv('CLIP_BATCH_MAX_CLIPS', '8'))
+CLIP_BATCH_MAX_GAP_SECONDS = float(os.getenv('CLIP_BATCH_MAX_GAP_SECONDS', '30'))
+# Encodes simultâneos por fila (limitado por os.cpu_count()) e uploads em paralelo para o R2
+CLIP_RENDER_CONCURRENCY = {
+    'video.clip.starter': int(os.getenv('CLIP_RENDER_CONCURRENCY_STARTER', '2')),
+    'video.clip.business': int(os.getenv('CLIP_RENDER_CONCURRENCY_BUSINESS', '4')),
+}
+CLIP_UPLOAD_WORKERS = int(os.getenv('CLIP_UPLOAD_WORKERS', '4'))
+# Fan-out: um subtask Celery por clip em video.clip.{tier}, decidido por job. Jobs grandes (soma dos
+# clips ou número de clips acima dos limites) espalham os clips entre os workers; os pequenos ficam no
+# render local, que agrupa clips próximos num único decode. false desliga o fan-out
+CLIP_RENDER_FANOUT = os.getenv('CLIP_RENDER_FANOUT', 'true').lower() == 'true'
+CLIP_FANOUT_MIN_CLIP_SECONDS = float(os.getenv('CLIP_FANOUT_MIN_CLIP_SECONDS', '900'))
+CLIP_FANOUT_MIN_CLIPS = int(os.getenv('CLIP_FANOUT_MIN_CLIPS', '12'))
+CLIP_FANOUT_ENCODER_THREADS = int(os.getenv('CLIP_FANOUT_ENCODER_THREADS', '0')) or None
+
+# Perfis do encoder (libx264) por etapa/tier: escada do mais caro ao mais rápido e prazo alvo.
+# Sob backlog na fila, o job desce na escada até o tempo previsto caber no prazo.
+ENCODER_PROFILES = {}  # Sobrescreve/estende os perfis padrão (quality, balanced, fast, express)
+ENCODER_PROFILE_POLICY = {
+    'render': {
+        'starter': {'ladder': ['quality', 'balanced', 'fast', 'express'], 'deadline_seconds': int(os.getenv('RENDER_DEADLINE_STARTER', '900'))},
+        'business': {'ladder': ['quality', 'balanced'], 'deadline_seconds': int(os.getenv('RENDER_DEADLINE_BUSINESS', '600'))},
+    },
+    'normalize': {
+        'starter': {'ladder': ['fast', 'express'], 'deadline_seconds': int(os.getenv('NORMALIZE_DEADLINE_STARTER', '1800'))},
+        'business': {'ladder': ['fast'], 'deadline_seconds': int(os.getenv('NORMALIZE_DEADLINE_BUSINESS', '1200'))},
+    },
+}
+ENCODER_DEFAULT_TASK_SECONDS = int(os.getenv('ENCODER_DEFAULT_TASK_SECONDS', '60'))
+# Processos consumindo cada fila ({"video.clip.starter": 4}); sem valor, vem do inspect dos workers
+ENCODER_QUEUE_CONSUMERS = {}
+
+# Artefatos do pipeline (endereçados por sha256 no R2 + cache LRU local em disco)
+ARTIFACTS_ENABLED = os.getenv('ARTIFACTS_ENABLED', 'true').lower() == 'true'
+ARTIFACT_CACHE_DIR = os.getenv('ARTIFACT_CACHE_DIR') or str(MEDIA_ROOT / 'artifact_cache')
+ARTIFACT_CACHE_MAX_BYTES = int(os.getenv('ARTIFACT_CACHE_MAX_BYTES', str(50 * 1024 ** 3)))
+
+# Métricas por etapa (StageRun) gravadas pelos sinais do Celery
+STAGE_METRICS_ENABLED = os.getenv('STAGE_METRICS_ENABLED', 'true').lower() == 'true'
+
+# ffprobe único por arquivo, cacheado no Redis e em Video.media_info
+MEDIA_PROBE_CACHE_TTL = int(os.getenv('MEDIA_PROBE_CACHE_TTL', str(86400 * 7)))
+MEDIA_PROBE_TIMEOUT = int(os.getenv('MEDIA_PROBE_TIMEOUT', '30'))
+
+# Loudness (EBU R128): medido na extração de áudio da transcrição (sem decode extra) e aplicado no
+# render dos clips; loudnorm só fora da tolerância, em duas passadas
+LOUDNESS_TARGET_I = float(os.getenv('LOUDNESS_TARGET_I', '-16'))
+LOUDNESS_TARGET_TP = float(os.getenv('LOUDNESS_TARGET_TP', '-1.5'))
+LOUDNESS_TARGET_LRA = float(os.getenv('LOUDNESS_TARGET_LRA', '11'))
+LOUDNESS_TOLERANCE_LU = float(os.getenv('LOUDNESS_TOLERANCE_LU', '1.0'))
+
+# Normalização segmentada (vídeos longos fora do fast-path): trechos cortados em keyframes, encodados em paralelo
+NORMALIZE_SEGMENTED = os.getenv('NORMALIZE_SEGMENTED', 'true').lower() == 'true'
+NORMALIZE_SEGMENT_MIN_DURATION = float(os.getenv('NORMALIZE_SEGMENT_MIN_DURATION', '1200'))
+NORMALIZE_SEGMENT_SECONDS = float(os.getenv('NORMALIZE_SEGMENT_SECONDS', '300'))
+NORMALIZE_SEGMENT_CONCURRENCY = int(os.getenv('NORMALIZE_SEGMENT_CONCURRENCY', '0'))  # 0 = metade dos CPUs
+
+# Ingest em streaming: uploads no R2 são lidos com GETs em paralelo direto para o stdin do ffmpeg
+INGEST_STREAMING = os.getenv('INGEST_STREAMING', 'true').lower() == 'true'
+INGEST_STREAM_CHUNK_BYTES = int(os.getenv('INGEST_STREAM_CHUNK_BYTES', str(8 * 1024 * 1024)))
+INGEST_STREAM_READ_AHEAD = int(os.getenv('INGEST_STREAM_READ_AHEAD', '4'))
+
+# Transferências R2: multipart em paralelo (e retomável) acima do threshold, por operação
+R2_TRANSFER_CONFIG = {
+    'default': {
+        'multipart_threshold': int(os.getenv('R2_MULTIPART_THRESHOLD', str(64 * 1024 * 1024))),
+        'part_size': int(os.getenv('R2_MULTIPART_PART_SIZE', str(16 * 1024 * 1024))),
+        'max_concurrency': int(os.getenv('R2_MAX_CONCURRENCY', '8')),
+    },
+    'video': {'part_size': 64 * 1024 * 1024},
+    'download': {'part_size': 32 * 1024 * 1024},
+    'clip': {'max_concurrency': 4},
+}
+
+# Cache de downloads de URLs externas (extractor + media ID do yt-dlp) no R2, compartilhado entre jobs
+SOURCE_CACHE_ENABLED = os.getenv('SOURCE_CACHE_ENABLED', 'true').lower() == 'true'
+SOURCE_CACHE_TTL_HOURS = int(os.getenv('SOURCE_CACHE_TTL_HOURS', '72'))
+
+# URLs externas: baixa só o áudio primeiro e libera a transcrição enquanto o vídeo ainda baixa
+AUDIO_FIRST_ACQUISITION = os.getenv('AUDIO_FIRST_ACQUISITION', 'true').lower() == 'true'
+AUDIO_FIRST_FORMAT = os.getenv('AUDIO_FIRST_FORMAT', 'ba[ext=m4a]/ba')
+
+# Agendador de downloads externos: vagas e inícios/minuto por plataforma (extractor do yt-dlp), pool de proxies
+DOWNLOAD_SCHEDULER_ENABLED = os.getenv('DOWNLOAD_SCHEDULER_ENABLED', 'true').lower() == 'true'
+DOWNLOAD_SCHEDULER_LIMITS = {
+    'default': {
+        'max_concurrent': int(os.getenv('DOWNLOAD_MAX_CONCURRENT', '4')),
+        'per_minute': int(os.getenv('DOWNLOAD_MAX_PER_MINUTE', '20')),
+        'retry_after': int(os.getenv('DOWNLOAD_RETRY_AFTER_SECONDS', '30')),
+    },
+    'youtube': {
+        'max_concurrent': int(os.getenv('DOWNLOAD_MAX_CONCURRENT_YOUTUBE', '8')),
+        'per_minute': int(os.getenv('DOWNLOAD_MAX_PER_MINUTE_YOUTUBE', '30')),
+    },
+}
+DOWNLOAD_SCHEDULER_MAX_WAIT = float(os.getenv('DOWNLOAD_SCHEDULER_MAX_WAIT', '30'))
+DOWNLOAD_SCHEDULER_MAX_DEFERRALS = int(os.getenv('DOWNLOAD_SCHEDULER_MAX_DEFERRALS', '20'))
+DOWNLOAD_SCHEDULER_LEASE_SECONDS = int(os.getenv('DOWNLOAD_SCHEDULER_LEASE_SECONDS', '900'))
+DOWNLOAD_SCHEDULER_RENEW_SECONDS = float(os.getenv('DOWNLOAD_SCHEDULER_RENEW_SECONDS', '60'))
+DOWNLOAD_PROXY_POOL = [p.strip() for p in os.getenv('PROXY_POOL', '').split(',') if p.strip()]
+DOWNLOAD_PROXY_COOLDOWN_SECONDS = int(os.getenv('DOWNLOAD_PROXY_COOLDOWN_SECONDS', '600'))
+DOWNLOAD_MAX_CONCURRENT_FRAGMENTS = int(os.getenv('DOWNLOAD_MAX_CONCURRENT_FRAGMENTS', '8'))
 
 # Redis Cache Configuration
 REDIS_URL = os.getenv('REDIS_URL', 'redis://127.0.0.1:6379/1')